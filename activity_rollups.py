@@ -0,0 +1,192 @@
+"""Series de actividad de subida de evidencias con agregados incrementales.
+
+Los conteos diarios por programa, dimensión y usuario, y los días con
+evidencias de cada criterio, se mantienen en memoria. Como la tabla de
+evidencias está ordenada por fecha (ver ``time_index``), en cada lectura solo
+se agregan las filas posteriores a la última fecha ya contada; las
+eliminaciones hechas desde la aplicación se descuentan con ``remove``. Si la
+tabla cambió de otra forma (edición manual de la hoja, importación masiva con
+fechas antiguas), los agregados se reconstruyen completos.
+"""
+import threading
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from criterios import CRITERIOS_ACREDITACION
+from time_index import TIME_INDEX_NAME, app_timezone, parse_fecha_hora
+
+# Dimensiones por las que se pueden agrupar las series
+GROUP_COLUMNS = ('programa', 'dimension', 'subido_por')
+
+# Ventana (en días) con la que se estima el ritmo de cobertura de criterios
+FORECAST_WINDOW_DAYS = 28
+
+TOTAL_CRITERIOS = sum(
+    len(criterios) for criterios in CRITERIOS_ACREDITACION.values())
+
+
+def _local_days(fechas_utc):
+    """Convierte fechas en UTC a días locales (datetime64 sin zona)"""
+    return fechas_utc.tz_convert(app_timezone()).tz_localize(None).normalize()
+
+
+def _column(evidencias_df, column):
+    if column in evidencias_df.columns:
+        return evidencias_df[column].fillna('').astype(str).to_numpy()
+    return [''] * len(evidencias_df)
+
+
+class ActivityRollups:
+    """Conteos diarios de evidencias, actualizados de forma incremental"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (día, programa, dimensión, subido_por) -> cantidad de evidencias
+        self._daily = Counter()
+        # (programa, criterio) -> {día: cantidad de evidencias}
+        self._coverage = defaultdict(Counter)
+        self._watermark = None  # Última fecha contada (nanosegundos UTC)
+        self._rows = 0  # Filas contadas con fecha <= _watermark
+        self.rebuilds = 0
+
+    def sync(self, evidencias_df):
+        """Incorpora las evidencias nuevas de la tabla ordenada por fecha"""
+        import pandas as pd
+
+        if evidencias_df.index.name != TIME_INDEX_NAME:
+            return
+        nanos = evidencias_df.index.asi8
+        # Las filas sin fecha (NaT) quedan al comienzo y no se cuentan
+        first = int(nanos.searchsorted(pd.NaT.value, side='right'))
+
+        with self._lock:
+            if self._watermark is None:
+                seen = first
+            else:
+                seen = int(nanos.searchsorted(self._watermark, side='right'))
+            if seen - first != self._rows:
+                # Filas eliminadas o agregadas con fechas antiguas fuera de
+                # la aplicación: se reconstruye todo
+                self._daily.clear()
+                self._coverage.clear()
+                self._rows = 0
+                self._watermark = None
+                self.rebuilds += 1
+                seen = first
+            if seen < len(evidencias_df):
+                self._ingest(evidencias_df.iloc[seen:], 1)
+                self._rows += len(evidencias_df) - seen
+                self._watermark = int(nanos[-1])
+
+    def remove(self, evidencias):
+        """Descuenta evidencias eliminadas (lista de diccionarios)"""
+        import pandas as pd
+
+        if not evidencias:
+            return
+        removed = pd.DataFrame(evidencias)
+        fechas = pd.DatetimeIndex(parse_fecha_hora(
+            removed['fecha_hora'])).as_unit('ns')
+        removed.index = fechas
+        removed = removed[fechas.notna()]
+
+        with self._lock:
+            if self._watermark is None:
+                return
+            # Las posteriores a la última fecha contada aún no se contaron
+            removed = removed[removed.index.asi8 <= self._watermark]
+            self._ingest(removed, -1)
+            self._rows -= len(removed)
+
+    def _ingest(self, evidencias_df, sign):
+        """Suma (o resta) las filas a los conteos (con _lock tomado)"""
+        import pandas as pd
+
+        if evidencias_df.empty:
+            return
+        frame = pd.DataFrame({
+            'dia': _local_days(evidencias_df.index),
+            'programa': _column(evidencias_df, 'programa'),
+            'dimension': _column(evidencias_df, 'dimension'),
+            'subido_por': _column(evidencias_df, 'subido_por'),
+            'criterio': _column(evidencias_df, 'criterio'),
+        })
+        for key, count in frame.groupby(
+            ['dia', *GROUP_COLUMNS]).size().items():
+            self._daily[key] += sign * count
+            if self._daily[key] <= 0:
+                del self._daily[key]
+
+        covered = frame[frame['criterio'] != '']
+        for (programa, criterio, dia), count in covered.groupby(
+            ['programa', 'criterio', 'dia']).size().items():
+            days = self._coverage[(programa, criterio)]
+            days[dia] += sign * count
+            if days[dia] <= 0:
+                del days[dia]
+                if not days:
+                    del self._coverage[(programa, criterio)]
+
+    def series(self, group_by='programa', freq='D', programa=None):
+        """Retorna las subidas por período (filas) y grupo (columnas)"""
+        import pandas as pd
+
+        with self._lock:
+            rows = [(dia, programa_key, dimension, subido_por, count)
+                    for (dia, programa_key, dimension, subido_por), count in
+                    self._daily.items()
+                    if programa is None or programa_key == programa]
+        columns = ['dia', *GROUP_COLUMNS, 'evidencias']
+        if not rows:
+            return pd.DataFrame()
+        daily = pd.DataFrame(rows, columns=columns)
+        table = daily.pivot_table(index='dia',
+                                  columns=group_by,
+                                  values='evidencias',
+                                  aggfunc='sum',
+                                  fill_value=0)
+        # Períodos sin subidas cuentan como cero
+        table = table.resample('W-MON' if freq == 'W' else 'D',
+                               label='left',
+                               closed='left').sum()
+        table.index.name = 'semana' if freq == 'W' else 'dia'
+        return table
+
+    def coverage_forecast(self, today=None):
+        """Estima, por programa, cuándo quedarán cubiertos todos los criterios"""
+        import pandas as pd
+
+        today = pd.Timestamp(today or pd.Timestamp.now(app_timezone()).date())
+        window_start = today - timedelta(days=FORECAST_WINDOW_DAYS)
+
+        with self._lock:
+            first_days = defaultdict(list)
+            for (programa, _), days in self._coverage.items():
+                first_days[programa].append(min(days))
+
+        rows = []
+        for programa, days in sorted(first_days.items()):
+            cubiertos = len(days)
+            pendientes = max(TOTAL_CRITERIOS - cubiertos, 0)
+            recientes = sum(1 for day in days if day > window_start)
+            ritmo = recientes / FORECAST_WINDOW_DAYS * 7  # criterios/semana
+            if pendientes == 0:
+                estimada = max(days)
+            elif ritmo > 0:
+                estimada = today + timedelta(weeks=pendientes / ritmo)
+            else:
+                estimada = pd.NaT
+            rows.append({
+                'programa': programa,
+                'criterios_cubiertos': cubiertos,
+                'criterios_pendientes': pendientes,
+                'criterios_por_semana': round(ritmo, 2),
+                'fecha_estimada': estimada,
+            })
+        return pd.DataFrame(rows)
+
+
+# Función para agregar promedios móviles a una serie de actividad
+def rolling_average(series_df, window):
+    """Retorna el promedio móvil de cada columna en ventanas de window períodos"""
+    return series_df.rolling(window, min_periods=1).mean()
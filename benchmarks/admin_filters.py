@@ -0,0 +1,145 @@
+"""Benchmark de los filtros de la vista de evidencias del administrador.
+
+Compara, sobre una tabla sintética ordenada por fecha, la cadena anterior de
+máscaras booleanas (un DataFrame nuevo por filtro y ``pd.Series(...)
+.value_counts()`` para los gráficos) con ``EvidenceFilterIndex`` (una sola
+máscara sobre el rango de fechas y conteos sobre los códigos). Para cada
+cambio de filtro informa el tiempo mediano y la memoria asignada: el máximo
+de ``tracemalloc`` más lo que queda reservado en el pool de Arrow (las
+columnas de texto de pandas usan Arrow, que ``tracemalloc`` no ve). También
+mide la construcción de los códigos, que se hace una vez por lectura de la
+tabla y se reutiliza entre ejecuciones del script.
+
+Uso:
+    python benchmarks/admin_filters.py
+    python benchmarks/admin_filters.py --filas 500000 --repeticiones 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from criterios import CRITERIOS_ACREDITACION  # noqa: E402
+from evidence_filters import EvidenceFilterIndex  # noqa: E402
+from time_index import between_dates, with_time_index  # noqa: E402
+
+DESDE = date(2026, 3, 1)
+HASTA = date(2026, 9, 30)
+
+
+def build_evidencias(filas, programas):
+    """Retorna una tabla sintética de evidencias con índice temporal"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    criterios = [(dimension, criterio)
+                 for dimension, items in CRITERIOS_ACREDITACION.items()
+                 for criterio in items]
+    elegidos = rng.integers(0, len(criterios), filas)
+    fechas = pd.Timestamp("2025-10-01") + pd.to_timedelta(
+        rng.integers(0, 365 * 86400, filas), unit="s")
+    evidencias_df = pd.DataFrame({
+        "programa": [f"Programa {i}" for i in rng.integers(0, programas, filas)],
+        "subido_por": [f"usuario{i}@u.cl" for i in rng.integers(0, 500, filas)],
+        "url_cloudinary": [f"local://p/e{i}.pdf" for i in range(filas)],
+        "fecha_hora": fechas.strftime("%Y-%m-%d %H:%M:%S-0300"),
+        "criterio": [criterios[i][1] for i in elegidos],
+        "dimension": [criterios[i][0] for i in elegidos],
+        "nombre_archivo": [f"e{i}.pdf" for i in range(filas)],
+    })
+    return with_time_index(evidencias_df)
+
+
+def filter_chain(evidencias_df, programa, dimension, criterio, columns):
+    """Ruta anterior: una máscara y un DataFrame nuevo por filtro"""
+    import pandas as pd
+
+    df_filtrado = between_dates(evidencias_df, DESDE, HASTA)
+    if programa is not None:
+        df_filtrado = df_filtrado[df_filtrado['programa'] == programa]
+    if dimension is not None:
+        df_filtrado = df_filtrado[df_filtrado['dimension'] == dimension]
+    if criterio is not None:
+        df_filtrado = df_filtrado[df_filtrado['criterio'] == criterio]
+    table = df_filtrado[columns]
+    programa_counts = pd.Series(df_filtrado['programa']).value_counts()
+    criterio_counts = pd.Series(df_filtrado['criterio']).value_counts()
+    return table, programa_counts, criterio_counts
+
+
+def filter_index(index, programa, dimension, criterio, columns):
+    """Ruta nueva: una sola máscara y conteos sobre los códigos"""
+    vista = index.apply(programa, dimension, criterio, DESDE, HASTA)
+    return vista.rows(columns), vista.counts('programa'), vista.counts(
+        'criterio')
+
+
+def measure(function, repeticiones):
+    """Retorna (mediana en ms, memoria asignada en MB) de function()"""
+    import pyarrow as pa
+
+    times = []
+    for _ in range(repeticiones):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    pool = pa.default_memory_pool()
+    arrow_before = pool.bytes_allocated()
+    tracemalloc.start()
+    result = function()  # noqa: F841 (se mantiene vivo para medir Arrow)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow = max(pool.bytes_allocated() - arrow_before, 0)
+    return statistics.median(times) * 1000, (peak + arrow) / (1024 * 1024)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=200000)
+    parser.add_argument("--programas", type=int, default=40)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    evidencias_df = build_evidencias(args.filas, args.programas)
+    columns = [
+        'programa', 'criterio', 'nombre_archivo', 'subido_por', 'fecha_hora',
+        'url_cloudinary'
+    ]
+    dimension, criterios = next(iter(CRITERIOS_ACREDITACION.items()))
+    criterio = next(iter(criterios))
+    cases = {
+        "solo fechas": (None, None, None),
+        "programa": ("Programa 3", None, None),
+        "programa+dimensión": ("Programa 3", dimension, None),
+        "programa+dim.+criterio": ("Programa 3", dimension, criterio),
+    }
+
+    build_ms, build_mb = measure(lambda: EvidenceFilterIndex(evidencias_df),
+                                 args.repeticiones)
+    index = EvidenceFilterIndex(evidencias_df)
+    print(f"{args.filas} evidencias; construcción de códigos: "
+          f"{build_ms:.1f} ms, {build_mb:.1f} MB (una vez por lectura de la tabla)")
+    print(f"{'filtro':<24}{'antes ms':>10}{'antes MB':>10}"
+          f"{'ahora ms':>10}{'ahora MB':>10}")
+    for name, (programa, dimension_filtro, criterio_filtro) in cases.items():
+        before_ms, before_mb = measure(
+            lambda: filter_chain(evidencias_df, programa, dimension_filtro,
+                                 criterio_filtro, columns), args.repeticiones)
+        after_ms, after_mb = measure(
+            lambda: filter_index(index, programa, dimension_filtro,
+                                 criterio_filtro, columns), args.repeticiones)
+        print(f"{name:<24}{before_ms:>10.1f}{before_mb:>10.1f}"
+              f"{after_ms:>10.1f}{after_mb:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
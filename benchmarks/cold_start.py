@@ -0,0 +1,126 @@
+"""Benchmark de arranque en frío de la aplicación.
+
+Mide, en procesos nuevos, el tiempo de ``import main`` y el de la primera
+ejecución del script (pantalla de login) con ``AppTest``, usando SQLite y
+almacenamiento local para no depender de la red. Verifica además que las
+librerías pesadas no se carguen al importar la aplicación.
+
+Uso:
+    python benchmarks/cold_start.py                      # medir y comparar
+    python benchmarks/cold_start.py --actualizar-linea-base
+
+Si existe una línea base, el comando termina con código 1 cuando alguna
+mediana supera la línea base más la tolerancia.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "cold_start_baseline.json")
+
+# Módulos que no deben cargarse solo por importar la aplicación
+HEAVY_MODULES = ["pandas", "gspread", "google.cloud.storage", "google.oauth2"]
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"segundos": elapsed,
+                  "cargados": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES, )
+
+FIRST_REQUEST_SNIPPET = """
+import json, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("main.py", default_timeout=120)
+at.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({"segundos": elapsed, "errores": len(at.exception)}))
+"""
+
+
+def run_snippet(snippet, env):
+    """Ejecuta el fragmento en un proceso nuevo y retorna su salida JSON"""
+    result = subprocess.run([sys.executable, "-c", snippet],
+                            cwd=ROOT,
+                            env=env,
+                            capture_output=True,
+                            text=True,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(repeticiones):
+    """Retorna las medianas de importación y primera ejecución"""
+    workdir = tempfile.mkdtemp(prefix="cold_start_")
+    env = dict(os.environ,
+               METADATA_BACKEND="sqlite",
+               SQLITE_PATH=os.path.join(workdir, "evidencias.db"),
+               STORAGE_BACKEND="local",
+               LOCAL_STORAGE_DIR=os.path.join(workdir, "archivos"))
+
+    import_times = []
+    loaded = set()
+    for _ in range(repeticiones):
+        sample = run_snippet(IMPORT_SNIPPET, env)
+        import_times.append(sample["segundos"])
+        loaded.update(sample["cargados"])
+
+    first_request_times = []
+    for _ in range(repeticiones):
+        sample = run_snippet(FIRST_REQUEST_SNIPPET, env)
+        if sample["errores"]:
+            raise RuntimeError("La primera ejecución del script falló")
+        first_request_times.append(sample["segundos"])
+
+    return {
+        "import_s": statistics.median(import_times),
+        "primera_ejecucion_s": statistics.median(first_request_times),
+    }, sorted(loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--tolerancia",
+                        type=float,
+                        default=0.25,
+                        help="Aumento relativo permitido sobre la línea base")
+    parser.add_argument("--actualizar-linea-base", action="store_true")
+    args = parser.parse_args(argv)
+
+    results, loaded = measure(args.repeticiones)
+    for name, value in results.items():
+        print(f"{name}: {value * 1000:.0f} ms")
+
+    failed = False
+    if loaded:
+        print(f"ERROR: módulos pesados cargados al importar: {', '.join(loaded)}")
+        failed = True
+
+    if args.actualizar_linea_base:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Línea base guardada en {BASELINE_PATH}")
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+        for name, value in results.items():
+            limit = baseline[name] * (1 + args.tolerancia)
+            if value > limit:
+                print(f"REGRESIÓN: {name} {value * 1000:.0f} ms > "
+                      f"{limit * 1000:.0f} ms")
+                failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""Prueba de carga con sesiones concurrentes de la aplicación.
+
+Simula N sesiones simultáneas en un mismo proceso (como un servidor de
+Streamlit) con ``AppTest``, contra SQLite y almacenamiento local en lugar de
+Google Sheets y Cloud Storage. Cada sesión de usuario inicia sesión, revisa
+"Mis Evidencias" filtrando por dimensión, sube un PDF y elimina una evidencia;
+cada sesión de administrador inicia sesión y filtra la vista general. Para
+cada N se informan los percentiles de latencia por acción, la duración de
+cada ejecución del script y la memoria del proceso.
+
+Uso:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --sesiones 1,4,16 --evidencias 5000
+    python benchmarks/load_test.py --salida resultados_carga.json
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_PATH = os.path.join(ROOT, "main.py")
+PASSWORD = "carga123"
+
+# Cada cuántas sesiones una es de administrador
+ADMIN_EVERY = 4
+
+# PDF mínimo válido (pasa la validación de firma y de %%EOF)
+SAMPLE_PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+              b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\n"
+              b"trailer<</Root 1 0 R>>\n%%EOF\n")
+
+
+def configure_environment(workdir):
+    """Apunta la aplicación a backends locales dentro de workdir"""
+    os.environ.update(
+        METADATA_BACKEND="sqlite",
+        SQLITE_PATH=os.path.join(workdir, "evidencias.db"),
+        STORAGE_BACKEND="local",
+        LOCAL_STORAGE_DIR=os.path.join(workdir, "archivos"),
+        SEARCH_INDEX_PATH=os.path.join(workdir, "indice_busqueda.db"),
+        PREVIEW_CACHE_DIR=os.path.join(workdir, "cache_vistas_previas"),
+        REGISTRO_DIFERIDO_PATH=os.path.join(workdir,
+                                            "registro_pendiente.jsonl"),
+        SNAPSHOT_DIR=os.path.join(workdir, "instantaneas"))
+
+
+def seed(max_sesiones, evidencias_por_usuario, evidencias_extra):
+    """Crea los usuarios de prueba y sus evidencias en la base SQLite"""
+    import pandas as pd
+
+    from criterios import CRITERIOS_ACREDITACION
+    from metadata_store import SQLiteMetadataStore
+    from time_index import now_fecha_hora
+
+    criterios = [(dimension, criterio)
+                 for dimension, items in CRITERIOS_ACREDITACION.items()
+                 for criterio in items]
+    usuarios = [{
+        "correo": "admin@carga.test",
+        "programa": "Administración",
+        "rol": "admin",
+        "contraseña": PASSWORD
+    }]
+    evidencias = []
+    total = max_sesiones * evidencias_por_usuario + evidencias_extra
+    for i in range(total):
+        owner = i % max_sesiones if i < max_sesiones * evidencias_por_usuario \
+            else max_sesiones + i % 10
+        dimension, criterio = criterios[i % len(criterios)]
+        evidencias.append({
+            "programa": f"Programa {owner}",
+            "subido_por": f"usuario{owner}@carga.test",
+            "url_cloudinary": f"local://Programa%20{owner}/e{i}.pdf",
+            "fecha_hora": now_fecha_hora(),
+            "criterio": criterio,
+            "dimension": dimension,
+            "nombre_archivo": f"e{i}.pdf"
+        })
+    for owner in range(max_sesiones):
+        usuarios.append({
+            "correo": f"usuario{owner}@carga.test",
+            "programa": f"Programa {owner}",
+            "rol": "usuario",
+            "contraseña": PASSWORD
+        })
+
+    store = SQLiteMetadataStore(os.environ["SQLITE_PATH"])
+    store.replace_all(pd.DataFrame(usuarios), pd.DataFrame(evidencias))
+
+
+def share_runtime():
+    """Hace que las sesiones de ``AppTest`` compartan un solo runtime.
+
+    ``AppTest`` instala un runtime simulado global durante cada ejecución y lo
+    quita al terminar, y compila main.py en cada ejecución. Para que varias
+    sesiones corran a la vez, como en un servidor real, se comparte un solo
+    runtime y una sola caché del código compilado (compilar en paralelo desde
+    varios hilos falla además en algunas versiones de CPython).
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = app_test.MediaFileManager(
+        app_test.MemoryMediaFileStorage("/mock/media"))
+    shared.dataframe_source_mgr = app_test.DataframeSourceManager()
+    shared.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    shared.bidi_component_registry = app_test.BidiComponentManager()
+    Runtime.instance = classmethod(lambda cls: shared)
+    Runtime.exists = classmethod(lambda cls: True)
+    # Cada ejecución restaura la opción al terminar; fijarla evita que una
+    # sesión la desactive mientras otra sigue corriendo
+    config.set_option("global.appTest", True)
+
+    script_cache = ScriptCache()
+    lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def shared_get_bytecode(self, script_path):
+        with lock:
+            return get_bytecode(script_cache, script_path)
+
+    ScriptCache.get_bytecode = shared_get_bytecode
+
+
+def current_rss_mb():
+    """Retorna la memoria residente actual del proceso, en MB"""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Fuera de Linux solo está disponible el máximo (KB en Linux, B en macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Session:
+    """Sesión simulada que registra la duración de cada ejecución del script"""
+
+    def __init__(self, recorder):
+        from streamlit.testing.v1 import AppTest
+
+        self.recorder = recorder
+        self.at = AppTest.from_file(MAIN_PATH, default_timeout=120)
+
+    def run(self):
+        start = time.perf_counter()
+        self.at.run()
+        self.recorder.add("ejecucion_script", time.perf_counter() - start)
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].value)
+
+    def action(self, name, steps):
+        """Ejecuta los pasos de una acción y registra su latencia total"""
+        start = time.perf_counter()
+        steps()
+        self.recorder.add(name, time.perf_counter() - start)
+
+    def login(self, email):
+        self.run()
+        self.at.text_input[0].input(email)
+        self.at.text_input[1].input(PASSWORD)
+        self.at.button[0].click()
+        self.run()
+        # El login llama a st.rerun(): la siguiente ejecución muestra el panel
+        self.run()
+
+    def select(self, label, option_index):
+        for selectbox in self.at.selectbox:
+            if selectbox.label == label and len(selectbox.options) > 1:
+                selectbox.select_index(option_index % len(selectbox.options))
+                self.run()
+                return
+
+    def upload(self, filename):
+        self.at.file_uploader[0].set_value(
+            (filename, SAMPLE_PDF, "application/pdf"))
+        self.run()
+        for button in self.at.button:
+            if button.label == "Subir Evidencias":
+                button.click()
+                self.run()
+                if not any("subido exitosamente" in message.value
+                           for message in self.at.success):
+                    raise RuntimeError(f"La subida de {filename} falló")
+                return
+        raise RuntimeError("No apareció el botón de subida")
+
+    def delete_first(self):
+        buttons = [
+            button for button in self.at.button
+            if button.key and button.key.startswith("delete_")
+            and not button.key.startswith("delete_old_")
+        ]
+        if not buttons:
+            return
+        evidencia_id = buttons[0].key[len("delete_"):]
+        buttons[0].click()
+        self.run()
+        self.at.button(key=f"confirm_yes_{evidencia_id}").click()
+        self.run()
+
+
+class Recorder:
+    """Acumula duraciones por acción, seguro entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = []
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.samples[name].append(seconds)
+
+    def error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+
+def user_scenario(index, iteration, recorder):
+    session = Session(recorder)
+    session.action("login", lambda: session.login(
+        f"usuario{index}@carga.test"))
+    session.action("mis_evidencias",
+                   lambda: session.select("Filtrar por Dimensión", 1))
+    session.action("subir", lambda: session.upload(
+        f"carga_{index}_{iteration}.pdf"))
+    session.action("eliminar", session.delete_first)
+
+
+def admin_scenario(index, iteration, recorder):
+    session = Session(recorder)
+    session.action("login_admin",
+                   lambda: session.login("admin@carga.test"))
+    session.action("filtrar_admin",
+                   lambda: session.select("Filtrar por Programa",
+                                          index + iteration + 1))
+    session.action("filtrar_admin",
+                   lambda: session.select("Filtrar por Dimensión", 1))
+
+
+def run_level(sesiones, iteraciones):
+    """Ejecuta sesiones concurrentes y retorna las duraciones registradas"""
+    recorder = Recorder()
+    barrier = threading.Barrier(sesiones)
+
+    def worker(index):
+        scenario = admin_scenario if index % ADMIN_EVERY == ADMIN_EVERY - 1 \
+            else user_scenario
+        barrier.wait()
+        for iteration in range(iteraciones):
+            try:
+                scenario(index, iteration, recorder)
+            except Exception as e:
+                recorder.error(f"sesión {index}: {e}")
+
+    threads = [
+        threading.Thread(target=worker, args=(index, ), daemon=True)
+        for index in range(sesiones)
+    ]
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return recorder, elapsed, rss_before, current_rss_mb()
+
+
+def percentiles(values):
+    """Retorna p50, p95 y p99 en milisegundos"""
+    if len(values) == 1:
+        return {p: values[0] * 1000 for p in ("p50", "p95", "p99")}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": statistics.median(values) * 1000,
+        "p95": cuts[94] * 1000,
+        "p99": cuts[98] * 1000
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones",
+                        default="1,2,4,8",
+                        help="Niveles de sesiones concurrentes, separados por coma")
+    parser.add_argument("--iteraciones",
+                        type=int,
+                        default=2,
+                        help="Veces que cada sesión repite su escenario")
+    parser.add_argument("--evidencias",
+                        type=int,
+                        default=2000,
+                        help="Evidencias adicionales de otros programas")
+    parser.add_argument("--evidencias-por-usuario", type=int, default=20)
+    parser.add_argument("--salida", help="Archivo JSON para los resultados")
+    args = parser.parse_args(argv)
+
+    levels = sorted({int(level) for level in args.sesiones.split(",")})
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    configure_environment(workdir)
+    sys.path.insert(0, ROOT)
+    seed(levels[-1], args.evidencias_por_usuario * args.iteraciones,
+         args.evidencias)
+    share_runtime()
+    print(f"Datos de prueba en {workdir}")
+
+    results = []
+    for sesiones in levels:
+        recorder, elapsed, rss_before, rss_after = run_level(
+            sesiones, args.iteraciones)
+        level = {
+            "sesiones": sesiones,
+            "segundos": elapsed,
+            "memoria_mb": rss_after,
+            "memoria_delta_mb": rss_after - rss_before,
+            "errores": recorder.errors,
+            "acciones": {
+                name: dict(percentiles(values), n=len(values))
+                for name, values in sorted(recorder.samples.items())
+            }
+        }
+        results.append(level)
+
+        print(f"\n== {sesiones} sesión(es): {elapsed:.1f} s, "
+              f"memoria {rss_after:.0f} MB ({rss_after - rss_before:+.0f} MB)")
+        print(f"{'acción':<18}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, stats in level["acciones"].items():
+            print(f"{name:<18}{stats['n']:>5}{stats['p50']:>10.0f}"
+                  f"{stats['p95']:>10.0f}{stats['p99']:>10.0f}")
+        for message in recorder.errors[:5]:
+            print(f"ERROR: {message}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+
+    return 1 if any(level["errores"] for level in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""Importación masiva de evidencias desde un árbol de carpetas local.
+
+Estructura esperada::
+
+    <raíz>/<programa>/<dimensión>/<criterio>/<archivos...>
+
+Los nombres de dimensión y criterio se validan contra
+``CRITERIOS_ACREDITACION`` (se acepta el nombre original o el limpiado que se
+usa en el almacenamiento). Los archivos se suben con un pool de hilos usando
+las mismas rutas que ``upload_to_gcs`` y se registran por lotes. El progreso
+se guarda en un archivo de checkpoint para que una nueva ejecución omita lo
+ya completado.
+"""
+import json
+import mimetypes
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from criterios import TIPOS_ARCHIVO_PERMITIDOS, find_criterio, find_dimension
+from previews import store_preview
+from storage_backend import build_object_path, evidence_metadata
+from time_index import now_fecha_hora
+
+CHECKPOINT_NAME = ".importacion_checkpoint.jsonl"
+
+
+@dataclass
+class ImportItem:
+    """Archivo a importar con su clasificación"""
+    relative_path: str
+    full_path: str
+    programa: str
+    dimension: str
+    criterio: str
+
+
+@dataclass
+class ImportPlan:
+    """Archivos válidos y problemas encontrados al recorrer el árbol"""
+    items: list = field(default_factory=list)
+    problems: list = field(default_factory=list)
+
+
+@dataclass
+class ImportResult:
+    """Resumen de una importación"""
+    uploaded: int = 0
+    registered: int = 0
+    skipped: int = 0
+    failed: list = field(default_factory=list)
+
+
+class Checkpoint:
+    """Registro append-only del avance de la importación"""
+
+    def __init__(self, path):
+        self.path = path
+        self.uploaded = {}  # ruta relativa -> URL ya subida
+        self.upload_times = {}  # ruta relativa -> fecha_hora de la subida
+        self.registered = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Línea incompleta por una interrupción
+                    if entry.get("estado") == "registrado":
+                        self.registered.add(entry["ruta"])
+                        self.uploaded.pop(entry["ruta"], None)
+                    elif entry.get("estado") == "subido":
+                        self.uploaded[entry["ruta"]] = entry["url"]
+                        if entry.get("fecha_hora"):
+                            self.upload_times[entry["ruta"]] = entry[
+                                "fecha_hora"]
+
+    def record(self, entries):
+        """Agrega entradas al checkpoint y las persiste en disco"""
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# Función para recorrer el árbol de carpetas
+def scan_tree(root):
+    """Recorre la raíz y clasifica los archivos por programa, dimensión y criterio"""
+    plan = ImportPlan()
+    allowed = {f".{ext}" for ext in TIPOS_ARCHIVO_PERMITIDOS}
+
+    for programa in sorted(os.listdir(root)):
+        programa_dir = os.path.join(root, programa)
+        if programa.startswith(".") or not os.path.isdir(programa_dir):
+            continue
+
+        for dimension_name in sorted(os.listdir(programa_dir)):
+            dimension_dir = os.path.join(programa_dir, dimension_name)
+            if not os.path.isdir(dimension_dir):
+                plan.problems.append(
+                    f"{programa}/{dimension_name}: archivo fuera de una carpeta de criterio")
+                continue
+            dimension = find_dimension(dimension_name)
+            if not dimension:
+                plan.problems.append(
+                    f"{programa}/{dimension_name}: dimensión no reconocida")
+                continue
+
+            for criterio_name in sorted(os.listdir(dimension_dir)):
+                criterio_dir = os.path.join(dimension_dir, criterio_name)
+                if not os.path.isdir(criterio_dir):
+                    plan.problems.append(
+                        f"{programa}/{dimension_name}/{criterio_name}: "
+                        "archivo fuera de una carpeta de criterio")
+                    continue
+                criterio = find_criterio(dimension, criterio_name)
+                if not criterio:
+                    plan.problems.append(
+                        f"{programa}/{dimension_name}/{criterio_name}: "
+                        "criterio no reconocido para la dimensión")
+                    continue
+
+                for dirpath, dirnames, filenames in os.walk(criterio_dir):
+                    dirnames.sort()
+                    for filename in sorted(filenames):
+                        full_path = os.path.join(dirpath, filename)
+                        relative_path = os.path.relpath(full_path,
+                                                        root).replace(
+                                                            os.sep, "/")
+                        if filename.startswith("."):
+                            continue
+                        if os.path.splitext(filename)[1].lower() not in allowed:
+                            plan.problems.append(
+                                f"{relative_path}: tipo de archivo no permitido")
+                            continue
+                        plan.items.append(
+                            ImportItem(relative_path, full_path, programa,
+                                       dimension, criterio))
+    return plan
+
+
+# Función para importar los archivos planificados
+def run_import(plan,
+               store,
+               storage_backend,
+               root,
+               subido_por,
+               workers=8,
+               batch_size=200,
+               progress=None):
+    """Sube y registra los archivos del plan, retomando desde el checkpoint"""
+    checkpoint = Checkpoint(os.path.join(root, CHECKPOINT_NAME))
+    result = ImportResult()
+    pending_rows = []
+
+    def flush_rows():
+        if not pending_rows:
+            return
+        # Una sola escritura en la base de datos por lote
+        store.add_evidencias([row for _, row in pending_rows])
+        checkpoint.record([{
+            "ruta": relative_path,
+            "estado": "registrado"
+        } for relative_path, _ in pending_rows])
+        result.registered += len(pending_rows)
+        pending_rows.clear()
+        if progress:
+            progress(f"{result.registered} evidencia(s) registradas")
+
+    def queue_row(item, url, fecha_hora=None):
+        pending_rows.append((item.relative_path, {
+            'programa': item.programa,
+            'subido_por': subido_por,
+            'url_cloudinary': url,
+            'fecha_hora': fecha_hora or now_fecha_hora(),
+            'criterio': item.criterio,
+            'dimension': item.dimension,
+            'nombre_archivo': os.path.basename(item.full_path)
+        }))
+        if len(pending_rows) >= batch_size:
+            flush_rows()
+
+    def upload(item):
+        # Dentro de la carpeta del criterio, las subcarpetas forman parte del
+        # nombre para que dos archivos homónimos no compartan ruta
+        inner_name = item.relative_path.split("/", 3)[3]
+        file_path = build_object_path(item.programa, inner_name,
+                                      item.dimension, item.criterio)
+        content_type = mimetypes.guess_type(item.full_path)[0]
+        fecha_hora = now_fecha_hora()
+        metadata = evidence_metadata(item.programa, item.dimension,
+                                     item.criterio, subido_por,
+                                     os.path.basename(item.full_path),
+                                     fecha_hora, uuid.uuid4().hex)
+        with open(item.full_path, "rb") as f:
+            url = storage_backend.put(file_path,
+                                      f,
+                                      content_type=content_type,
+                                      metadata=metadata)
+            try:
+                store_preview(storage_backend, file_path, f,
+                              os.path.basename(item.full_path))
+            except Exception:
+                pass  # La miniatura es opcional; el archivo ya quedó subido
+        checkpoint.record([{
+            "ruta": item.relative_path,
+            "estado": "subido",
+            "url": url,
+            "fecha_hora": fecha_hora
+        }])
+        return url, fecha_hora
+
+    to_upload = []
+    for item in plan.items:
+        if item.relative_path in checkpoint.registered:
+            result.skipped += 1
+        elif item.relative_path in checkpoint.uploaded:
+            # Subido en una ejecución anterior pero sin registrar
+            queue_row(item, checkpoint.uploaded[item.relative_path],
+                      checkpoint.upload_times.get(item.relative_path))
+        else:
+            to_upload.append(item)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload, item): item for item in to_upload}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                url, fecha_hora = future.result()
+            except Exception as e:
+                result.failed.append(f"{item.relative_path}: {str(e)}")
+                continue
+            result.uploaded += 1
+            queue_row(item, url, fecha_hora)
+
+    flush_rows()
+    return result
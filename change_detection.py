@@ -0,0 +1,101 @@
+"""Lecturas incrementales de la tabla de evidencias.
+
+Releer la pestaña completa cada vez que vence la caché es costoso y casi
+siempre innecesario: la tabla cambia poco y, cuando cambia, suele ser porque
+se agregaron filas al final. ``IncrementalTable`` guarda la última lectura y,
+antes de volver a leer, consulta un sello barato del repositorio (la versión
+del archivo en Drive):
+
+- si el sello no cambió, se reutiliza la tabla guardada sin leer la hoja;
+- si cambió, se leen solo la última fila conocida y las siguientes; si esa
+  fila sigue igual, las nuevas se agregan a la tabla guardada;
+- en cualquier otro caso (filas eliminadas, encabezados distintos, cambios
+  hechos por este proceso que no son agregados) se lee la tabla completa.
+
+Las ediciones de filas intermedias hechas fuera de la aplicación no se ven en
+el sello de la última fila, así que la tabla se relee completa al menos cada
+``full_read_interval`` segundos.
+"""
+import threading
+import time
+import uuid
+from collections import Counter
+
+# Tiempo máximo entre lecturas completas de la tabla
+DEFAULT_FULL_READ_INTERVAL = 10 * 60
+
+
+class IncrementalTable:
+    """Última lectura completa de evidencias, actualizada con sondeos baratos"""
+
+    def __init__(self, store, full_read_interval=DEFAULT_FULL_READ_INTERVAL):
+        self.store = store
+        self.full_read_interval = full_read_interval
+        # Lecturas por tipo (sin_cambios, agregadas, completas)
+        self.reads = Counter()
+        self.df = None
+        # Identifica el contenido de df; cambia solo cuando df cambia
+        self.lectura = None
+        self._version = None
+        self._rewrites = None
+        self._full_read_at = 0.0
+        self._lock = threading.Lock()
+
+    def read(self):
+        """Retorna la tabla completa de evidencias, leyendo solo lo que cambió.
+
+        La tabla retornada puede ser la misma de la lectura anterior, así que
+        no debe modificarse.
+        """
+        with self._lock:
+            if self.df is None or \
+                    self.store.rewrites != self._rewrites or \
+                    time.monotonic() - self._full_read_at >= \
+                    self.full_read_interval:
+                return self._read_full()
+
+            try:
+                version = self.store.evidencias_version()
+            except Exception:
+                # Sin sello se pasa a revisar la última fila
+                version = None
+            if version is not None and version == self._version:
+                self.reads['sin_cambios'] += 1
+                return self.df
+
+            last_row = self.df.iloc[-1].tolist() if len(self.df) else []
+            added_df = self.store.get_evidencias_after(len(self.df), last_row)
+            if added_df is None or \
+                    list(added_df.columns) != list(self.df.columns):
+                return self._read_full(version)
+            if len(added_df):
+                self._replace(self._append(added_df))
+            self._version = version
+            self.reads['agregadas'] += 1
+            return self.df
+
+    def _read_full(self, version=None):
+        if version is None:
+            try:
+                version = self.store.evidencias_version()
+            except Exception:
+                version = None
+        rewrites = self.store.rewrites
+        df = self.store.get_evidencias()
+        self._replace(df)
+        # El sello se toma antes de leer: un cambio durante la lectura se
+        # detecta en el siguiente sondeo
+        self._version = version
+        self._rewrites = rewrites
+        self._full_read_at = time.monotonic()
+        self.reads['completas'] += 1
+        return self.df
+
+    def _append(self, added_df):
+        import pandas as pd
+
+        return pd.concat([self.df, added_df], ignore_index=True)
+
+    def _replace(self, df):
+        self.df = df
+        self.lectura = uuid.uuid4().hex
@@ -0,0 +1,312 @@
+"""Comandos de administración del sistema de evidencias.
+
+Uso:
+    python cli.py migrar --destino evidencias.db
+    python cli.py reconciliar [--programa NOMBRE ...] [--corregir]
+    python cli.py importar RAIZ --subido-por CORREO [--hilos 8]
+    python cli.py comparar-perfiles ANTES.json DESPUES.json
+    python cli.py reconstruir [--programa NOMBRE ...] [--salida CSV]
+                              [--reemplazar [--forzar]]
+
+Los comandos usan el mismo repositorio de metadatos y backend de
+almacenamiento que la aplicación (METADATA_BACKEND y STORAGE_BACKEND).
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import timedelta
+
+from bulk_import import run_import, scan_tree
+from google_clients import shared_clients
+from metadata_store import (SQLiteMetadataStore, SheetsMetadataStore,
+                            create_metadata_store, migrate_to_sqlite)
+from reconciliation import (apply_fixes, merge_rebuilt, rebuild_evidencias,
+                            reconcile)
+from rerun_profiler import compare_profiles, load_profile
+from storage_backend import create_storage_backend
+
+
+# Función para abrir el repositorio de metadatos configurado
+def open_metadata_store():
+    """Crea el repositorio de metadatos indicado por la configuración"""
+    sheets_client = None
+    if os.getenv("METADATA_BACKEND", "sheets").strip().lower() == "sheets":
+        sheets_client = shared_clients.sheets_client()
+    return create_metadata_store(sheets_client)
+
+
+# Función para abrir el backend de almacenamiento configurado
+def open_storage_backend():
+    """Crea el backend de almacenamiento indicado por la configuración"""
+    gcs_client = None
+    if os.getenv("STORAGE_BACKEND", "gcs").strip().lower() == "gcs":
+        gcs_client = shared_clients.storage_client()
+    return create_storage_backend(gcs_client)
+
+
+# Comando para copiar la hoja de Google Sheets a SQLite
+def cmd_migrar(args):
+    """Copia usuarios y evidencias de Google Sheets a una base SQLite"""
+    source = SheetsMetadataStore(shared_clients.sheets_client())
+    target = SQLiteMetadataStore(args.destino)
+    total_users, total_evidencias = migrate_to_sqlite(source, target)
+    print(f"Migración completada en {args.destino}: {total_users} usuario(s), "
+          f"{total_evidencias} evidencia(s)")
+    return 0
+
+
+# Comando para reconciliar el almacenamiento con la tabla de evidencias
+def cmd_reconciliar(args):
+    """Reporta (y opcionalmente corrige) objetos huérfanos y filas sin archivo"""
+    store = open_metadata_store()
+    storage_backend = open_storage_backend()
+
+    report = reconcile(store,
+                       storage_backend,
+                       programas=args.programa or None,
+                       workers=args.hilos,
+                       min_age=timedelta(minutes=args.antiguedad_minima))
+    print(report.summary())
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "objetos_huerfanos": report.orphan_objects,
+                    "filas_sin_archivo": report.dangling_rows
+                },
+                f,
+                ensure_ascii=False,
+                indent=2)
+        print(f"Reporte guardado en {args.salida}")
+    else:
+        for name in report.orphan_objects:
+            print(f"HUÉRFANO  {name}")
+        for row in report.dangling_rows:
+            print(f"SIN ARCHIVO  {row.get('programa')} | "
+                  f"{row.get('nombre_archivo')} | {row.get('url_cloudinary')}")
+
+    if args.corregir:
+        deleted_objects, deleted_rows = apply_fixes(report,
+                                                    store,
+                                                    storage_backend,
+                                                    batch_size=args.lote,
+                                                    progress=print)
+        print(f"Corrección completada: {deleted_objects} objeto(s) y "
+              f"{deleted_rows} fila(s) eliminados")
+    return 0
+
+
+# Comando para importar un árbol de carpetas de evidencias
+def cmd_importar(args):
+    """Sube y registra los archivos de programa/dimensión/criterio/"""
+    plan = scan_tree(args.raiz)
+    for problem in plan.problems:
+        print(f"OMITIDO  {problem}")
+    print(f"{len(plan.items)} archivo(s) válidos, "
+          f"{len(plan.problems)} problema(s)")
+
+    if args.simular:
+        for item in plan.items:
+            print(f"IMPORTAR  {item.relative_path}")
+        return 0
+
+    store = open_metadata_store()
+    storage_backend = open_storage_backend()
+
+    # Advertir si hay carpetas que no corresponden a programas existentes
+    users_df = store.get_users()
+    if 'programa' in users_df.columns:
+        known = set(users_df['programa'].astype(str))
+        for programa in sorted({item.programa for item in plan.items} - known):
+            print(f"ADVERTENCIA  programa sin usuarios registrados: {programa}")
+
+    result = run_import(plan,
+                        store,
+                        storage_backend,
+                        args.raiz,
+                        args.subido_por,
+                        workers=args.hilos,
+                        batch_size=args.lote,
+                        progress=print)
+    for failure in result.failed:
+        print(f"ERROR  {failure}")
+    print(f"Importación completada: {result.uploaded} subido(s), "
+          f"{result.registered} registrado(s), {result.skipped} ya "
+          f"importado(s), {len(result.failed)} error(es)")
+    return 1 if result.failed else 0
+
+
+# Comando para comparar dos perfiles guardados desde el panel de administrador
+def cmd_comparar_perfiles(args):
+    """Muestra las funciones cuyo porcentaje de tiempo más cambió"""
+    before = load_profile(args.antes)
+    after = load_profile(args.despues)
+    for label, profile in (("Antes", before), ("Después", after)):
+        durations = profile['ejecuciones_s']
+        mean_ms = 1000 * sum(durations) / max(len(durations), 1)
+        version = f" ({profile['version']})" if profile['version'] else ""
+        print(f"{label}: {profile['fecha']}{version} - "
+              f"{len(durations)} ejecución(es), {mean_ms:.0f} ms promedio")
+    print(f"{'antes %':>8} {'después %':>10} {'dif.':>7}  función")
+    for row in compare_profiles(before, after, limit=args.limite):
+        print(f"{row['antes_pct']:8.1f} {row['despues_pct']:10.1f} "
+              f"{row['diferencia_pct']:+7.1f}  {row['funcion']}")
+    return 0
+
+
+# Comando para reconstruir la tabla de evidencias desde el almacenamiento
+def cmd_reconstruir(args):
+    """Regenera la tabla de evidencias con los metadatos de los objetos"""
+    store = open_metadata_store()
+    storage_backend = open_storage_backend()
+
+    # Sin --programa se recorren todas las carpetas del almacenamiento: una
+    # reconstrucción por prefijos de la pestaña de usuarios omitiría los
+    # objetos de otros programas. Los usuarios solo aportan los nombres de
+    # programa de las carpetas
+    known_programas = None
+    if not args.programa:
+        users_df = store.get_users()
+        if 'programa' in users_df.columns:
+            known_programas = sorted(set(users_df['programa'].astype(str)))
+
+    result = rebuild_evidencias(storage_backend,
+                                programas=args.programa,
+                                workers=args.hilos,
+                                known_programas=known_programas)
+    for name in result.unresolved:
+        print(f"SIN CLASIFICAR  {name}")
+    print(result.summary())
+
+    if args.salida:
+        result.evidencias_df.to_csv(args.salida, index=False)
+        print(f"Tabla guardada en {args.salida}")
+    if args.reemplazar:
+        if result.unresolved and not args.forzar:
+            print(f"{len(result.unresolved)} objeto(s) sin clasificar: no se "
+                  "reemplaza la tabla. Revise la lista o use --forzar "
+                  "(sus filas actuales se conservan)")
+            return 1
+        # Se conservan las filas que la reconstrucción no puede regenerar:
+        # otros programas, objetos sin clasificar y enlaces externos
+        evidencias_df = merge_rebuilt(store.get_evidencias(),
+                                      result.evidencias_df,
+                                      storage_backend,
+                                      programas=args.programa,
+                                      unresolved=result.unresolved)
+        # Una sola escritura por lotes; la pestaña de usuarios no se toca
+        store.replace_all(None, evidencias_df)
+        print(f"Tabla de evidencias reemplazada en {store.name}")
+    elif not args.salida:
+        print("Use --salida para revisarla o --reemplazar para escribirla")
+    return 0
+
+
+def build_parser():
+    """Construye el parser de argumentos de los comandos"""
+    parser = argparse.ArgumentParser(
+        description="Administración del sistema de evidencias")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    migrar = subparsers.add_parser(
+        "migrar", help="Copiar la hoja de Google Sheets a SQLite")
+    migrar.add_argument("--destino",
+                        default="evidencias.db",
+                        help="Ruta de la base SQLite de destino")
+    migrar.set_defaults(func=cmd_migrar)
+
+    reconciliar = subparsers.add_parser(
+        "reconciliar",
+        help="Buscar objetos huérfanos y filas sin archivo")
+    reconciliar.add_argument(
+        "--programa",
+        action="append",
+        help="Limitar a un programa (se puede repetir); por defecto todos")
+    reconciliar.add_argument("--hilos",
+                             type=int,
+                             default=16,
+                             help="Listados de prefijos en paralelo")
+    reconciliar.add_argument(
+        "--antiguedad-minima",
+        type=int,
+        default=60,
+        help="Ignorar objetos subidos hace menos de estos minutos")
+    reconciliar.add_argument("--salida",
+                             help="Guardar el reporte en un archivo JSON")
+    reconciliar.add_argument("--corregir",
+                             action="store_true",
+                             help="Eliminar huérfanos y filas sin archivo")
+    reconciliar.add_argument("--lote",
+                             type=int,
+                             default=100,
+                             help="Tamaño de los lotes de corrección")
+    reconciliar.set_defaults(func=cmd_reconciliar)
+
+    importar = subparsers.add_parser(
+        "importar",
+        help="Importar un árbol programa/dimensión/criterio/ de archivos")
+    importar.add_argument("raiz", help="Carpeta raíz con los programas")
+    importar.add_argument("--subido-por",
+                          required=True,
+                          help="Correo que figurará como autor de la subida")
+    importar.add_argument("--hilos",
+                          type=int,
+                          default=8,
+                          help="Subidas en paralelo")
+    importar.add_argument("--lote",
+                          type=int,
+                          default=200,
+                          help="Evidencias registradas por escritura")
+    importar.add_argument("--simular",
+                          action="store_true",
+                          help="Solo validar y listar lo que se importaría")
+    importar.set_defaults(func=cmd_importar)
+
+    comparar = subparsers.add_parser(
+        "comparar-perfiles",
+        help="Comparar dos perfiles de ejecución guardados")
+    comparar.add_argument("antes", help="Perfil JSON de referencia")
+    comparar.add_argument("despues", help="Perfil JSON a comparar")
+    comparar.add_argument("--limite",
+                          type=int,
+                          default=20,
+                          help="Cantidad de funciones a mostrar")
+    comparar.set_defaults(func=cmd_comparar_perfiles)
+
+    reconstruir = subparsers.add_parser(
+        "reconstruir",
+        help="Reconstruir la tabla de evidencias desde el almacenamiento")
+    reconstruir.add_argument(
+        "--programa",
+        action="append",
+        help="Limitar a un programa (se puede repetir); con --reemplazar "
+        "solo se reemplazan sus filas. Por defecto se lista todo el "
+        "almacenamiento")
+    reconstruir.add_argument("--hilos",
+                             type=int,
+                             default=16,
+                             help="Listados de prefijos en paralelo")
+    reconstruir.add_argument("--salida",
+                             help="Guardar la tabla reconstruida en un CSV")
+    reconstruir.add_argument(
+        "--reemplazar",
+        action="store_true",
+        help="Reemplazar la tabla de evidencias con la reconstruida")
+    reconstruir.add_argument(
+        "--forzar",
+        action="store_true",
+        help="Reemplazar aunque haya objetos sin clasificar")
+    reconstruir.set_defaults(func=cmd_reconstruir)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
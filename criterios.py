@@ -0,0 +1,85 @@
+"""Criterios de acreditación y tipos de archivo aceptados como evidencia"""
+
+# Definición de criterios de acreditación
+CRITERIOS_ACREDITACION = {
+    "I. DIMENSIÓN DOCENCIA Y RESULTADOS DEL PROCESO FORMATIVO": {
+        "Criterio 1. Modelo educativo y diseño curricular":
+        "La formulación del modelo educativo define las características y objetivos de los programas. El diseño e implementación curricular se orienta por procedimientos institucionales que guían el desarrollo de los programas conducentes a títulos y grados académicos.",
+        "Criterio 2. Procesos y resultados de enseñanza y aprendizaje":
+        "El diseño e implementación de los programas de enseñanza y aprendizaje provee las condiciones necesarias para el logro del perfil de egreso por parte de los estudiantes, en los distintos niveles, programas y modalidades.",
+        "Criterio 3. Cuerpo académico":
+        "El cuerpo académico cuenta con la dedicación y credenciales académicas y profesionales para el desarrollo del proceso de enseñanza y aprendizaje de toda la oferta educativa.",
+        "Criterio 4. Investigación, innovación docente y mejora del proceso formativo":
+        "La universidad emprende y desarrolla acciones de investigación y/o innovación sobre su experiencia docente que impactan positivamente en el proceso formativo, en lo disciplinar y en lo pedagógico, de acuerdo con el proyecto institucional."
+    },
+    "II. DIMENSIÓN GESTIÓN ESTRATÉGICA Y RECURSOS INSTITUCIONALES": {
+        "Criterio 5. Gobierno y estructura organizacional":
+        "La universidad cuenta con un sistema de gobierno y una estructura organizacional que le permiten gestionar todas las funciones institucionales conforme a su misión, visión, propósitos y tamaño.",
+        "Criterio 6. Gestión y desarrollo de personas":
+        "La universidad posee y aplica mecanismos para los procesos de reclutamiento, selección, inducción, desarrollo profesional, evaluación y retiro.",
+        "Criterio 7. Gestión de la convivencia, equidad de género, diversidad e inclusión":
+        "La universidad promueve el desarrollo integral de su comunidad en todo su quehacer y responde en su gestión a los desafíos en materia de convivencia, equidad de género, respeto a la diversidad e inclusión.",
+        "Criterio 8. Gestión de recursos":
+        "La universidad cuenta con los medios necesarios para el desarrollo de sus actividades, así como con políticas y mecanismos para la gestión de los recursos operativos y económicos."
+    },
+    "III. DIMENSIÓN ASEGURAMIENTO INTERNO DE LA CALIDAD": {
+        "Criterio 9. Gestión y resultados del aseguramiento interno de la calidad":
+        "La universidad define, implementa, monitorea y optimiza su sistema interno de aseguramiento de la calidad.",
+        "Criterio 10. Aseguramiento de la calidad de los programas formativos":
+        "La institución dispone y aplica normativa o procedimientos vigentes para la mejora continua de sus procesos de formación, en todos los programas conducentes a títulos y grados académicos."
+    },
+    "IV. DIMENSIÓN VINCULACIÓN CON EL MEDIO": {
+        "Criterio 11. Política y gestión de la vinculación con el medio":
+        "La función de vinculación con el medio es bidireccional, es decir, una construcción conjunta de la universidad con sus grupos relevantes de interés.",
+        "Criterio 12. Resultados e impacto de la vinculación con el medio":
+        "La universidad realiza acciones de vinculación con el medio que tienen un impacto positivo en su entorno significativo o a nivel nacional, y en la formación de los estudiantes."
+    },
+    "V. DIMENSIÓN INVESTIGACIÓN, CREACIÓN Y/O INNOVACIÓN": {
+        "Criterio 13. Política y gestión de la investigación, creación y/o innovación":
+        "La investigación, creación y/o innovación están presentes de manera explícita en la misión y propósitos declarados por la universidad.",
+        "Criterio 14. Resultados de la investigación, creación y/o innovación":
+        "La universidad obtiene resultados de investigación, creación y/o innovación que generan impacto en el medio interno o externo (académico, cultural, servicios, productivo o social)."
+    }
+}
+
+# Extensiones de archivo aceptadas como evidencia
+TIPOS_ARCHIVO_PERMITIDOS = [
+    'pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx'
+]
+
+
+# Función para normalizar nombres de dimensiones y criterios
+def _normalize_name(name):
+    """Normaliza un nombre para compararlo sin importar mayúsculas ni separadores"""
+    name = str(name).strip().casefold()
+    for char in ("/", "\\", ".", "-", "_"):
+        name = name.replace(char, " ")
+    return " ".join(name.split())
+
+
+_DIMENSIONES_NORMALIZADAS = {
+    _normalize_name(dimension): dimension
+    for dimension in CRITERIOS_ACREDITACION
+}
+
+_CRITERIOS_NORMALIZADOS = {
+    dimension: {_normalize_name(criterio): criterio
+                for criterio in criterios}
+    for dimension, criterios in CRITERIOS_ACREDITACION.items()
+}
+
+
+# Función para encontrar la dimensión oficial a partir de un nombre
+def find_dimension(name):
+    """Retorna la dimensión oficial que corresponde al nombre, o None.
+
+    Acepta el nombre original o la versión limpiada usada como carpeta en el
+    almacenamiento (puntos reemplazados por guiones bajos, etc.).
+    """
+    return _DIMENSIONES_NORMALIZADAS.get(_normalize_name(name))
+
+
+# Función para encontrar el criterio oficial a partir de un nombre
+def find_criterio(dimension, name):
+    """Retorna el criterio oficial de la dimensión que corresponde al nombre, o None"""
+    return _CRITERIOS_NORMALIZADOS.get(dimension, {}).get(_normalize_name(name))
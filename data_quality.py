@@ -0,0 +1,190 @@
+"""Revisión de calidad de la tabla de evidencias.
+
+Detecta las filas que rompen la agrupación y la eliminación: dimensión o
+criterio que no existen en ``CRITERIOS_ACREDITACION``, enlace vacío, fecha
+ilegible o autor que no está en la pestaña de usuarios. Cada columna se
+revisa una sola vez sobre la tabla completa: los nombres de dimensión y
+criterio se evalúan sobre sus valores únicos (``pandas.factorize``) y el
+resultado se propaga a las filas por código; el resto son operaciones de
+pertenencia a conjuntos y de tipo sobre columnas.
+"""
+import time
+from dataclasses import dataclass, field
+
+from criterios import CRITERIOS_ACREDITACION, find_criterio, find_dimension
+from metadata_store import EVIDENCIAS_COLUMNS
+from time_index import TIME_INDEX_NAME, parse_fecha_hora
+
+# Problemas detectados, en el orden en que se muestran
+ISSUE_LABELS = {
+    'dimension_desconocida': "Dimensión que no existe en los criterios",
+    'criterio_desconocido': "Criterio que no corresponde a su dimensión",
+    'sin_enlace': "Sin enlace al archivo",
+    'fecha_ilegible': "Fecha y hora vacía o ilegible",
+    'autor_desconocido': "Autor que no está en la pestaña de usuarios",
+}
+
+# Problemas con corrección en bloque
+CORREGIR_NOMBRES = 'corregir_nombres'
+ELIMINAR_SIN_ENLACE = 'eliminar_sin_enlace'
+
+
+@dataclass
+class QualityReport:
+    """Filas con problemas (posiciones en la tabla) y correcciones posibles"""
+    issues: dict = field(default_factory=dict)
+    # Posiciones con dimensión o criterio reconocibles y sus nombres oficiales
+    name_fixes: dict = field(default_factory=dict)
+    total_rows: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def offending_rows(self):
+        """Cantidad de filas con al menos un problema"""
+        import numpy as np
+
+        if not self.issues:
+            return 0
+        return len(np.unique(np.concatenate(list(self.issues.values()))))
+
+    def summary(self):
+        """Retorna la cantidad de filas por problema"""
+        import pandas as pd
+
+        return pd.DataFrame([{
+            'problema': label,
+            'filas': len(self.issues.get(issue, ())),
+            'corregibles': self._fixable(issue),
+        } for issue, label in ISSUE_LABELS.items()])
+
+    def _fixable(self, issue):
+        if issue in ('dimension_desconocida', 'criterio_desconocido'):
+            import numpy as np
+
+            positions = self.name_fixes.get('posiciones')
+            if positions is None:
+                return 0
+            return int(np.isin(self.issues.get(issue, ()), positions).sum())
+        if issue == 'sin_enlace':
+            return len(self.issues.get(issue, ()))
+        return 0
+
+    def rows(self, evidencias_df, issue):
+        """Retorna las filas con el problema indicado"""
+        return evidencias_df.iloc[self.issues.get(issue, [])]
+
+
+def _text(evidencias_df, column):
+    return evidencias_df[column].fillna('').astype(str).str.strip()
+
+
+def _resolve_names(dimension, criterio):
+    """Dimensión y criterio oficiales para un par de nombres, o (None, None)"""
+    official_dimension = find_dimension(dimension)
+    if official_dimension:
+        official_criterio = find_criterio(official_dimension, criterio)
+        if official_criterio:
+            return official_dimension, official_criterio
+    # El criterio puede estar registrado bajo otra dimensión
+    for candidate in CRITERIOS_ACREDITACION:
+        official_criterio = find_criterio(candidate, criterio)
+        if official_criterio:
+            return candidate, official_criterio
+    return official_dimension, None
+
+
+# Función para revisar la calidad de la tabla de evidencias
+def check_evidencias(evidencias_df, users_df=None):
+    """Retorna el reporte de filas con problemas de la tabla completa"""
+    import numpy as np
+    import pandas as pd
+
+    start = time.perf_counter()
+    report = QualityReport(total_rows=len(evidencias_df))
+    columns = evidencias_df.columns
+
+    if 'dimension' in columns and 'criterio' in columns:
+        # Cada par distinto (pocos) se evalúa una vez y se propaga por código
+        dimension_codes, dimensions = pd.factorize(
+            _text(evidencias_df, 'dimension'))
+        criterio_codes, criterios = pd.factorize(
+            _text(evidencias_df, 'criterio'))
+        pairs, inverse = np.unique(dimension_codes * len(criterios) +
+                                   criterio_codes,
+                                   return_inverse=True)
+        resolved = [
+            _resolve_names(dimensions[pair // len(criterios)],
+                           criterios[pair % len(criterios)]) for pair in pairs
+        ]
+        bad_dimension = np.array([
+            dimension is None or dimensions[pair // len(criterios)] != dimension
+            for pair, (dimension, _) in zip(pairs, resolved)
+        ])
+        bad_criterio = np.array([
+            criterio is None or criterios[pair % len(criterios)] != criterio
+            for pair, (_, criterio) in zip(pairs, resolved)
+        ])
+        fixable = np.array([
+            criterio is not None and (bad_dimension[i] or bad_criterio[i])
+            for i, (_, criterio) in enumerate(resolved)
+        ])
+        report.issues['dimension_desconocida'] = np.flatnonzero(
+            bad_dimension[inverse])
+        report.issues['criterio_desconocido'] = np.flatnonzero(
+            bad_criterio[inverse])
+
+        fix_positions = np.flatnonzero(fixable[inverse])
+        if len(fix_positions):
+            official = np.array(
+                [names if names[1] else ('', '') for names in resolved],
+                dtype=object)
+            report.name_fixes = {
+                'posiciones': fix_positions,
+                'dimension': official[inverse[fix_positions], 0],
+                'criterio': official[inverse[fix_positions], 1],
+            }
+
+    if 'url_cloudinary' in columns:
+        report.issues['sin_enlace'] = np.flatnonzero(
+            _text(evidencias_df, 'url_cloudinary').eq('').to_numpy())
+
+    if evidencias_df.index.name == TIME_INDEX_NAME:
+        # La tabla ya trae las fechas convertidas; NaT son las ilegibles
+        report.issues['fecha_ilegible'] = np.flatnonzero(
+            evidencias_df.index.isna())
+    elif 'fecha_hora' in columns:
+        report.issues['fecha_ilegible'] = np.flatnonzero(
+            parse_fecha_hora(evidencias_df['fecha_hora']).isna().to_numpy())
+
+    if 'subido_por' in columns and users_df is not None and \
+            'correo' in users_df.columns:
+        correos = set(_text(users_df, 'correo').str.lower())
+        report.issues['autor_desconocido'] = np.flatnonzero(
+            ~_text(evidencias_df,
+                   'subido_por').str.lower().isin(correos).to_numpy())
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+# Función para armar las correcciones en bloque de un reporte
+def name_fix_updates(evidencias_df, report):
+    """Retorna (evidencia, cambios) para corregir dimensión y criterio"""
+    if not report.name_fixes:
+        return []
+    present = [c for c in EVIDENCIAS_COLUMNS if c in evidencias_df.columns]
+    records = evidencias_df.iloc[report.name_fixes['posiciones']][
+        present].fillna('').astype(str).to_dict('records')
+    return [(record, {
+        'dimension': dimension,
+        'criterio': criterio
+    }) for record, dimension, criterio in zip(
+        records, report.name_fixes['dimension'], report.name_fixes['criterio'])]
+
+
+# Función para obtener las filas sin enlace de un reporte
+def missing_link_records(evidencias_df, report):
+    """Retorna las evidencias sin enlace como diccionarios para eliminarlas"""
+    present = [c for c in EVIDENCIAS_COLUMNS if c in evidencias_df.columns]
+    return evidencias_df.iloc[report.issues.get('sin_enlace', [])][
+        present].fillna('').astype(str).to_dict('records')
@@ -0,0 +1,388 @@
+"""Servidor HTTP auxiliar para descargas en streaming.
+
+Streamlit entrega las descargas de ``st.download_button`` como un único bloque
+de bytes en memoria. Para exportaciones grandes, la aplicación registra aquí
+solo los filtros de la vista (una entrada por combinación de filtros) y
+muestra un enlace con un ticket firmado; al abrirlo, este servidor (en un
+hilo del mismo proceso, sobre ``EXPORT_SERVER_PORT``) rehace la vista sobre
+la última lectura de la tabla y envía los bloques con codificación chunked a
+medida que se generan.
+
+El mismo servidor entrega los archivos de evidencia sin exponer el
+almacenamiento: la sesión de Streamlit emite para cada enlace un ticket
+firmado con HMAC que indica la ruta, el programa y el rol del usuario, y el
+servidor lo compara con el programa de la evidencia (metadatos del objeto o
+fila de la tabla) antes de leer el objeto por bloques. Se aceptan
+solicitudes de rango (los PDF grandes se abren de forma progresiva) y GET
+condicionales con el ETag de la generación del objeto (las visitas repetidas
+se responden con 304 desde la caché del navegador).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Tiempo durante el que un enlace de descarga sigue siendo válido
+DOWNLOAD_TTL = 15 * 60
+
+EXPORT_ROUTE = "/exportar/"
+FILE_ROUTE = "/archivo/"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+# Exportaciones registradas como máximo al mismo tiempo
+MAX_EXPORTS = 256
+
+
+class _Export:
+
+    def __init__(self, spec, file_name, content_type):
+        self.spec = spec
+        self.file_name = file_name
+        self.content_type = content_type
+        self.expires = time.monotonic() + DOWNLOAD_TTL
+
+
+# Función para interpretar el encabezado Range de una solicitud
+def parse_range(header, size):
+    """Retorna (inicio, fin) inclusivos del rango pedido, None si no hay
+    rango y False si el rango no se puede satisfacer"""
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        # Varios rangos o formato desconocido: se entrega el archivo completo
+        return None
+    first, last = match.groups()
+    if not first:
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class FileTickets:
+    """Tickets firmados que autorizan a abrir un objeto del almacenamiento o una exportación"""
+
+    def __init__(self, secret=None):
+        # Sin un secreto compartido, los tickets solo valen en este proceso
+        self._key = (secret.encode("utf-8")
+                     if secret else secrets.token_bytes(32))
+
+    def _sign(self, payload):
+        return hmac.new(self._key, payload, hashlib.sha256).digest()
+
+    def issue(self, path, programa, rol, expiration):
+        """Retorna el ticket de path para un usuario, válido expiration segundos"""
+        return self.sign({
+            "ruta": path,
+            "programa": programa,
+            "rol": rol
+        }, expiration)
+
+    def sign(self, data, expiration):
+        """Retorna un ticket con el contenido data, válido expiration segundos"""
+        payload = json.dumps(dict(data,
+                                  vence=int(time.time() + expiration)),
+                             separators=(",", ":")).encode("utf-8")
+        return (base64.urlsafe_b64encode(payload).rstrip(b"=") + b"." +
+                base64.urlsafe_b64encode(self._sign(payload)).rstrip(b"=")
+                ).decode("ascii")
+
+    def verify(self, ticket):
+        """Retorna el contenido del ticket si la firma es válida y no venció"""
+        try:
+            encoded, signature = ticket.split(".")
+            payload = base64.urlsafe_b64decode(encoded + "=" *
+                                               (-len(encoded) % 4))
+            signature = base64.urlsafe_b64decode(signature + "=" *
+                                                 (-len(signature) % 4))
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        data = json.loads(payload)
+        if data["vence"] < time.time():
+            return None
+        return data
+
+
+# Función para verificar el acceso de un usuario a un objeto
+def can_read(ticket_data, programa):
+    """Los administradores leen todo; el resto, solo las evidencias de su programa.
+
+    programa es el de la evidencia (metadatos del objeto o fila de la tabla),
+    no el nombre de carpeta limpiado, que puede coincidir entre programas.
+    """
+    if ticket_data.get("rol") == "admin":
+        return True
+    user_programa = (ticket_data.get("programa") or "").strip()
+    return bool(user_programa) and user_programa == (programa or "").strip()
+
+
+class _DownloadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "Evidencias"
+
+    def do_HEAD(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path.startswith(FILE_ROUTE):
+            self._send_file(path[len(FILE_ROUTE):], head=True)
+        else:
+            self.send_error(405)
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path.startswith(FILE_ROUTE):
+            self._send_file(path[len(FILE_ROUTE):])
+            return
+        if not path.startswith(EXPORT_ROUTE):
+            self.send_error(404)
+            return
+        tickets = self.server.tickets
+        data = tickets.verify(path[len(EXPORT_ROUTE):]) if tickets else None
+        if data is None or "exportacion" not in data:
+            self.send_error(403, "Enlace de descarga vencido o inválido")
+            return
+        if data.get("rol") != "admin":
+            self.send_error(403, "Sin acceso a esta exportación")
+            return
+        export = self.server.downloads.lookup(data["exportacion"])
+        producer = self.server.export_producer
+        if export is None or producer is None:
+            self.send_error(404, "Enlace de descarga vencido o inválido")
+            return
+
+        quoted_name = urllib.parse.quote(export.file_name)
+        self.send_response(200)
+        self.send_header("Content-Type", export.content_type)
+        self.send_header("Content-Disposition",
+                         f"attachment; filename*=UTF-8''{quoted_name}")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # La vista se rehace con la lectura vigente de la tabla
+        chunks = producer(export.spec)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # El navegador canceló la descarga
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+
+    def _send_file(self, ticket, head=False):
+        storage_backend = self.server.storage_backend
+        tickets = self.server.tickets
+        data = tickets.verify(ticket) if tickets else None
+        if storage_backend is None or data is None or "ruta" not in data:
+            self.send_error(403, "Enlace vencido o inválido")
+            return
+        stored = storage_backend.stat(data["ruta"])
+        programa = stored.metadata.get("programa") if stored else None
+        if stored and not programa and self.server.programa_of:
+            # Objeto anterior a los metadatos: se usa la fila de la evidencia
+            programa = self.server.programa_of(data["ruta"])
+        if not can_read(data, programa):
+            self.send_error(403, "Sin acceso a este archivo")
+            return
+        if stored is None:
+            self.send_error(404, "El archivo no existe")
+            return
+
+        etag = f'"{stored.generation}"'
+        # El navegador guarda el archivo y lo revalida con el ETag
+        cache_headers = (("ETag", etag), ("Cache-Control",
+                                          "private, max-age=0, must-revalidate"),
+                         ("Accept-Ranges", "bytes"))
+        if_none_match = self.headers.get("If-None-Match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")
+                    ] or if_none_match.strip() == "*":
+            self.send_response(304)
+            for name, value in cache_headers:
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        requested = parse_range(self.headers.get("Range"), stored.size)
+        if_range = self.headers.get("If-Range")
+        if requested and if_range and if_range.strip() != etag:
+            requested = None  # El objeto cambió: se entrega completo
+        if requested is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{stored.size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = requested or (0, stored.size - 1)
+        self.send_response(206 if requested else 200)
+        for name, value in cache_headers:
+            self.send_header(name, value)
+        if requested:
+            self.send_header("Content-Range",
+                             f"bytes {start}-{end}/{stored.size}")
+        self.send_header("Content-Type", stored.content_type or
+                         "application/octet-stream")
+        file_name = urllib.parse.quote(os.path.basename(data["ruta"]))
+        self.send_header("Content-Disposition",
+                         f"inline; filename*=UTF-8''{file_name}")
+        self.send_header("Content-Length", str(max(end - start + 1, 0)))
+        self.end_headers()
+        if head or stored.size == 0:
+            return
+        try:
+            for chunk in storage_backend.open_read(data["ruta"], start, end):
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # El navegador cerró la conexión
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DownloadRegistry:
+    """Exportaciones registradas por el hash de sus filtros, con vencimiento"""
+
+    def __init__(self, max_entries=MAX_EXPORTS):
+        self._lock = threading.Lock()
+        self._exports = {}
+        self.max_entries = max_entries
+
+    def register(self, spec, file_name, content_type):
+        """Registra spec (los filtros de la vista, serializables en JSON) y retorna su clave.
+
+        Los mismos filtros reutilizan la entrada vigente (y renuevan su
+        vencimiento) en lugar de registrar otra en cada ejecución del script.
+        """
+        key = hashlib.sha256(
+            json.dumps(spec, sort_keys=True,
+                       default=str).encode("utf-8")).hexdigest()[:32]
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            export = self._exports.pop(key, None)
+            if export is None:
+                export = _Export(spec, file_name, content_type)
+            export.expires = now + DOWNLOAD_TTL
+            self._exports[key] = export
+            while len(self._exports) > self.max_entries:
+                # Se descarta la entrada usada hace más tiempo
+                del self._exports[next(iter(self._exports))]
+            return key
+
+    def lookup(self, key):
+        with self._lock:
+            self._purge(time.monotonic())
+            return self._exports.get(key)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._exports)
+
+    def _purge(self, now):
+        expired = [k for k, e in self._exports.items() if e.expires < now]
+        for key in expired:
+            del self._exports[key]
+
+
+class DownloadServer:
+    """Servidor de descargas en un hilo de fondo"""
+
+    def __init__(self,
+                 port,
+                 host="127.0.0.1",
+                 base_url=None,
+                 storage_backend=None,
+                 tickets=None,
+                 export_producer=None,
+                 programa_of=None):
+        self.downloads = DownloadRegistry()
+        self.tickets = tickets or FileTickets()
+        self._server = ThreadingHTTPServer((host, port), _DownloadHandler)
+        self._server.daemon_threads = True
+        self._server.downloads = self.downloads
+        self._server.tickets = self.tickets
+        self._server.storage_backend = storage_backend
+        self._server.export_producer = export_producer
+        self._server.programa_of = programa_of
+        self.base_url = (base_url or
+                         f"http://localhost:{self._server.server_port}").rstrip("/")
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="servidor-descargas",
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def serves_exports(self):
+        return self._server.export_producer is not None
+
+    @property
+    def serves_files(self):
+        return self._server.storage_backend is not None
+
+    def file_url(self, path, programa, rol, expiration):
+        """Retorna el enlace al objeto para un usuario, válido expiration segundos"""
+        ticket = self.tickets.issue(path, programa, rol, expiration)
+        return f"{self.base_url}{FILE_ROUTE}{ticket}"
+
+    def export_url(self, spec, file_name, content_type, correo, rol):
+        """Registra la exportación y retorna el enlace firmado para el navegador"""
+        key = self.downloads.register(spec, file_name, content_type)
+        ticket = self.tickets.sign({
+            "exportacion": key,
+            "correo": correo,
+            "rol": rol
+        }, DOWNLOAD_TTL)
+        return f"{self.base_url}{EXPORT_ROUTE}{ticket}"
+
+
+# Función para crear el servidor de descargas configurado
+def create_download_server(config,
+                           storage_backend=None,
+                           export_producer=None,
+                           programa_of=None):
+    """Inicia el servidor si EXPORT_SERVER_PORT está definido; si no, retorna None.
+
+    export_producer recibe los filtros registrados de una exportación y
+    retorna sus bloques de bytes. Con storage_backend, el servidor también
+    entrega los archivos de evidencia; programa_of(ruta) retorna el programa
+    de la fila de un objeto sin metadatos. Los tickets se firman con
+    DOWNLOAD_SECRET.
+    """
+    port = config.get("EXPORT_SERVER_PORT")
+    if not port:
+        return None
+    return DownloadServer(
+        int(port),
+        host=config.get("EXPORT_SERVER_HOST", "127.0.0.1"),
+        base_url=config.get("EXPORT_BASE_URL"),
+        storage_backend=storage_backend,
+        tickets=FileTickets(config.get("DOWNLOAD_SECRET")),
+        export_producer=export_producer,
+        programa_of=programa_of).start()
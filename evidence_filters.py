@@ -0,0 +1,179 @@
+"""Filtros de la vista de evidencias del administrador sin copias intermedias.
+
+Las columnas de categoría (programa, dimensión, criterio) se codifican una vez
+con ``pandas.factorize``: cada fila queda con un entero por columna y las
+opciones de los selectores salen de los valores únicos de esa misma pasada. Al
+cambiar un filtro, el rango de fechas se resuelve con búsqueda binaria sobre
+el índice temporal y los demás predicados se combinan en una sola máscara
+sobre ese rango; la tabla se materializa con una única selección y los gráficos
+se cuentan con ``numpy.bincount`` sobre los códigos, sin crear DataFrames.
+"""
+from time_index import date_bounds
+
+CATEGORY_COLUMNS = ('programa', 'dimension', 'criterio')
+
+# Filas por bloque al recorrer una vista para exportarla
+EXPORT_CHUNK_ROWS = 5000
+
+
+class FilteredView:
+    """Resultado de un filtro: posiciones de las filas seleccionadas.
+
+    ``positions`` es un arreglo de posiciones o, si solo se filtró por fechas,
+    un ``slice`` del rango (la tabla se obtiene entonces sin copiar filas).
+    """
+
+    def __init__(self, index, positions):
+        self._index = index
+        self.positions = positions
+
+    def __len__(self):
+        if isinstance(self.positions, slice):
+            return self.positions.stop - self.positions.start
+        return len(self.positions)
+
+    def rows(self, columns=None):
+        """Retorna las filas seleccionadas (solo las columnas indicadas) en una sola copia"""
+        evidencias_df = self._index.evidencias_df
+        if columns is None:
+            return evidencias_df.iloc[self.positions]
+        return evidencias_df.iloc[self.positions,
+                                  evidencias_df.columns.get_indexer(columns)]
+
+    def chunks(self, columns, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Genera las filas seleccionadas en bloques de hasta chunk_rows filas.
+
+        Cada bloque es una selección nueva sobre la tabla original, así que
+        recorrer la vista completa no arma una segunda copia de la tabla.
+        """
+        import numpy as np
+
+        evidencias_df = self._index.evidencias_df
+        positions = self.positions
+        if isinstance(positions, slice):
+            positions = np.arange(positions.start, positions.stop)
+        indexer = evidencias_df.columns.get_indexer(columns)
+        for start in range(0, len(positions), chunk_rows):
+            yield evidencias_df.iloc[positions[start:start + chunk_rows],
+                                     indexer]
+
+    def counts(self, column):
+        """Retorna la cantidad de filas por valor, de mayor a menor"""
+        import numpy as np
+        import pandas as pd
+
+        codes, uniques = self._index.categories[column]
+        selected = codes[self.positions]
+        # Los valores vacíos (código -1) no se cuentan, como en value_counts
+        counts = np.bincount(selected[selected >= 0], minlength=len(uniques))
+        present = np.flatnonzero(counts)
+        order = present[np.argsort(-counts[present], kind="stable")]
+        return pd.Series(counts[order],
+                         index=pd.Index(uniques[order], name=column),
+                         name='count')
+
+    def coverage(self):
+        """Retorna la cantidad de evidencias por programa, dimensión y criterio"""
+        import numpy as np
+        import pandas as pd
+
+        columns = [c for c in CATEGORY_COLUMNS if c in self._index.categories]
+        if not columns:
+            return pd.DataFrame(columns=['evidencias'])
+        selected = np.column_stack([
+            self._index.categories[column][0][self.positions]
+            for column in columns
+        ])
+        combinations, counts = np.unique(selected, axis=0, return_counts=True)
+        coverage_df = pd.DataFrame({
+            column: [
+                '' if code < 0 else self._index.categories[column][1][code]
+                for code in combinations[:, i]
+            ]
+            for i, column in enumerate(columns)
+        })
+        coverage_df['evidencias'] = counts
+        return coverage_df.sort_values(columns, ignore_index=True)
+
+
+class EvidenceFilterIndex:
+    """Códigos por categoría de una tabla de evidencias ordenada por fecha"""
+
+    def __init__(self, evidencias_df):
+        import pandas as pd
+
+        self.evidencias_df = evidencias_df
+        self.categories = {}
+        for column in CATEGORY_COLUMNS:
+            if column in evidencias_df.columns:
+                codes, uniques = pd.factorize(evidencias_df[column],
+                                              use_na_sentinel=True)
+                self.categories[column] = (codes, uniques)
+
+    def options(self, column, **filters):
+        """Retorna los valores ordenados de column en las filas que cumplen los filtros"""
+        import numpy as np
+
+        if column not in self.categories:
+            return []
+        codes, uniques = self.categories[column]
+        mask = self._category_mask(0, len(codes), filters)
+        if mask is None:
+            return []
+        if mask is not True:
+            codes = codes[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        return sorted(uniques[np.flatnonzero(counts)].tolist())
+
+    def _code(self, column, value):
+        """Retorna el código de value en column, o None si no aparece"""
+        uniques = self.categories[column][1]
+        matches = uniques.get_indexer([value])
+        return None if matches[0] < 0 else int(matches[0])
+
+    def _category_mask(self, lo, hi, filters):
+        """Máscara de las filas [lo, hi) que cumplen los filtros.
+
+        Retorna None si ninguna fila puede cumplirlos y True si no hay
+        filtros activos.
+        """
+        import numpy as np
+
+        mask = None
+        scratch = None
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column not in self.categories:
+                return None
+            code = self._code(column, value)
+            if code is None:
+                return None
+            codes = self.categories[column][0][lo:hi]
+            if mask is None:
+                mask = codes == code
+                scratch = np.empty_like(mask)
+            else:
+                np.equal(codes, code, out=scratch)
+                mask &= scratch
+        return True if mask is None else mask
+
+    def apply(self, programa=None, dimension=None, criterio=None,
+              fecha_desde=None, fecha_hasta=None):
+        """Retorna la vista con las filas que cumplen todos los filtros"""
+        import numpy as np
+
+        lo, hi = 0, len(self.evidencias_df)
+        if fecha_desde is not None and fecha_hasta is not None:
+            lo, hi = date_bounds(self.evidencias_df, fecha_desde, fecha_hasta)
+
+        mask = self._category_mask(lo, hi, {
+            'programa': programa,
+            'dimension': dimension,
+            'criterio': criterio
+        })
+        if mask is None:
+            return FilteredView(self, np.empty(0, dtype=np.intp))
+        if mask is True:
+            return FilteredView(self, slice(lo, hi))
+        return FilteredView(self, np.flatnonzero(mask) + lo)
@@ -0,0 +1,139 @@
+"""Creación de clientes de Google a partir de las credenciales de los secrets.
+
+Estas funciones no dependen de Streamlit. ``shared_clients`` guarda las
+credenciales y los clientes del proceso: se empiezan a crear en segundo plano
+al importar el módulo, de modo que la primera sesión (y los comandos de
+cli.py) los encuentran listos; la aplicación web los envuelve con
+``st.cache_resource``. Las librerías de Google se importan dentro de cada
+función para no cargarlas en las ejecuciones que no las necesitan.
+"""
+import json
+import os
+import threading
+
+# Scopes necesarios para Google Sheets
+SHEETS_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Scopes necesarios para Google Cloud Storage
+STORAGE_SCOPES = [
+    "https://www.googleapis.com/auth/cloud-platform",
+    "https://www.googleapis.com/auth/devstorage.full_control"
+]
+
+# Una sola credencial con todos los scopes sirve a ambos clientes, de modo que
+# el JSON se parsea una vez y se comparte el mismo token de acceso
+GOOGLE_SCOPES = SHEETS_SCOPES + STORAGE_SCOPES
+
+
+# Función para leer las credenciales de la cuenta de servicio
+def load_credentials_info(env_var="GOOGLE_SHEETS_CREDENTIALS"):
+    """Retorna el diccionario de credenciales de la cuenta de servicio"""
+    google_credentials = os.getenv(env_var)
+    if not google_credentials:
+        raise RuntimeError(
+            "No se encontraron las credenciales de Google en los secrets")
+    return json.loads(google_credentials)
+
+
+# Función para crear las credenciales compartidas
+def create_credentials(creds_dict=None):
+    """Crea las credenciales de la cuenta de servicio con todos los scopes"""
+    from google.oauth2.service_account import Credentials
+
+    creds_dict = creds_dict or load_credentials_info()
+    return Credentials.from_service_account_info(creds_dict,
+                                                 scopes=GOOGLE_SCOPES)
+
+
+# Función para crear el cliente de Google Sheets
+def create_sheets_client(credentials=None):
+    """Crea un cliente de gspread autorizado con la cuenta de servicio"""
+    import gspread
+
+    return gspread.authorize(credentials or create_credentials())
+
+
+# Función para crear el cliente de Google Cloud Storage
+def create_storage_client(credentials=None):
+    """Crea un cliente de Google Cloud Storage con la cuenta de servicio"""
+    from google.cloud import storage
+
+    credentials = credentials or create_credentials()
+    return storage.Client(credentials=credentials,
+                          project=credentials.project_id)
+
+
+class GoogleClients:
+    """Credenciales y clientes de Google del proceso, creados una sola vez.
+
+    Si la creación falla no se guarda nada: la siguiente llamada lo intenta
+    de nuevo y el error llega a quien la hizo.
+    """
+
+    def __init__(self):
+        self.last_error = None
+        self._credentials = None
+        self._sheets_client = None
+        self._storage_client = None
+        self._lock = threading.RLock()
+        self._prewarm_thread = None
+
+    def credentials(self):
+        """Retorna las credenciales compartidas"""
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = create_credentials()
+            return self._credentials
+
+    def sheets_client(self):
+        """Retorna el cliente de Google Sheets compartido"""
+        with self._lock:
+            if self._sheets_client is None:
+                self._sheets_client = create_sheets_client(self.credentials())
+            return self._sheets_client
+
+    def storage_client(self):
+        """Retorna el cliente de Google Cloud Storage compartido"""
+        with self._lock:
+            if self._storage_client is None:
+                self._storage_client = create_storage_client(
+                    self.credentials())
+            return self._storage_client
+
+    def prewarm(self, config=None):
+        """Crea en segundo plano los clientes que usan los backends configurados"""
+        config = os.environ if config is None else config
+        uses_sheets = config.get("METADATA_BACKEND",
+                                 "sheets").strip().lower() == "sheets"
+        uses_gcs = config.get("STORAGE_BACKEND", "gcs").strip().lower() == "gcs"
+        if not (uses_sheets or uses_gcs) or \
+                not config.get("GOOGLE_SHEETS_CREDENTIALS"):
+            return None
+
+        def run():
+            try:
+                if uses_sheets:
+                    self.sheets_client()
+                if uses_gcs:
+                    self.storage_client()
+                self.last_error = None
+            except Exception as e:
+                # La primera sesión lo reintenta y muestra el error
+                self.last_error = str(e)
+
+        with self._lock:
+            if self._prewarm_thread is None:
+                self._prewarm_thread = threading.Thread(
+                    target=run, name="prewarm-clients", daemon=True)
+                self._prewarm_thread.start()
+            return self._prewarm_thread
+
+
+# Clientes compartidos del proceso; se importan una sola vez por servidor
+# (Streamlit reejecuta main.py, no sus módulos), así que la creación comienza
+# antes de que la primera sesión los pida
+shared_clients = GoogleClients()
+shared_clients.prewarm()
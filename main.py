@@ -1,55 +1,45 @@
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
-from google.cloud import storage
-import pandas as pd
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
+import atexit
 import os
-import io
-import urllib.parse
-
-# Definición de criterios de acreditación
-CRITERIOS_ACREDITACION = {
-    "I. DIMENSIÓN DOCENCIA Y RESULTADOS DEL PROCESO FORMATIVO": {
-        "Criterio 1. Modelo educativo y diseño curricular":
-        "La formulación del modelo educativo define las características y objetivos de los programas. El diseño e implementación curricular se orienta por procedimientos institucionales que guían el desarrollo de los programas conducentes a títulos y grados académicos.",
-        "Criterio 2. Procesos y resultados de enseñanza y aprendizaje":
-        "El diseño e implementación de los programas de enseñanza y aprendizaje provee las condiciones necesarias para el logro del perfil de egreso por parte de los estudiantes, en los distintos niveles, programas y modalidades.",
-        "Criterio 3. Cuerpo académico":
-        "El cuerpo académico cuenta con la dedicación y credenciales académicas y profesionales para el desarrollo del proceso de enseñanza y aprendizaje de toda la oferta educativa.",
-        "Criterio 4. Investigación, innovación docente y mejora del proceso formativo":
-        "La universidad emprende y desarrolla acciones de investigación y/o innovación sobre su experiencia docente que impactan positivamente en el proceso formativo, en lo disciplinar y en lo pedagógico, de acuerdo con el proyecto institucional."
-    },
-    "II. DIMENSIÓN GESTIÓN ESTRATÉGICA Y RECURSOS INSTITUCIONALES": {
-        "Criterio 5. Gobierno y estructura organizacional":
-        "La universidad cuenta con un sistema de gobierno y una estructura organizacional que le permiten gestionar todas las funciones institucionales conforme a su misión, visión, propósitos y tamaño.",
-        "Criterio 6. Gestión y desarrollo de personas":
-        "La universidad posee y aplica mecanismos para los procesos de reclutamiento, selección, inducción, desarrollo profesional, evaluación y retiro.",
-        "Criterio 7. Gestión de la convivencia, equidad de género, diversidad e inclusión":
-        "La universidad promueve el desarrollo integral de su comunidad en todo su quehacer y responde en su gestión a los desafíos en materia de convivencia, equidad de género, respeto a la diversidad e inclusión.",
-        "Criterio 8. Gestión de recursos":
-        "La universidad cuenta con los medios necesarios para el desarrollo de sus actividades, así como con políticas y mecanismos para la gestión de los recursos operativos y económicos."
-    },
-    "III. DIMENSIÓN ASEGURAMIENTO INTERNO DE LA CALIDAD": {
-        "Criterio 9. Gestión y resultados del aseguramiento interno de la calidad":
-        "La universidad define, implementa, monitorea y optimiza su sistema interno de aseguramiento de la calidad.",
-        "Criterio 10. Aseguramiento de la calidad de los programas formativos":
-        "La institución dispone y aplica normativa o procedimientos vigentes para la mejora continua de sus procesos de formación, en todos los programas conducentes a títulos y grados académicos."
-    },
-    "IV. DIMENSIÓN VINCULACIÓN CON EL MEDIO": {
-        "Criterio 11. Política y gestión de la vinculación con el medio":
-        "La función de vinculación con el medio es bidireccional, es decir, una construcción conjunta de la universidad con sus grupos relevantes de interés.",
-        "Criterio 12. Resultados e impacto de la vinculación con el medio":
-        "La universidad realiza acciones de vinculación con el medio que tienen un impacto positivo en su entorno significativo o a nivel nacional, y en la formación de los estudiantes."
-    },
-    "V. DIMENSIÓN INVESTIGACIÓN, CREACIÓN Y/O INNOVACIÓN": {
-        "Criterio 13. Política y gestión de la investigación, creación y/o innovación":
-        "La investigación, creación y/o innovación están presentes de manera explícita en la misión y propósitos declarados por la universidad.",
-        "Criterio 14. Resultados de la investigación, creación y/o innovación":
-        "La universidad obtiene resultados de investigación, creación y/o innovación que generan impacto en el medio interno o externo (académico, cultural, servicios, productivo o social)."
-    }
-}
+import threading
+import time
+import uuid
+
+# Las librerías pesadas (pandas, gspread, google-cloud-storage) se importan
+# dentro de las funciones que las usan para que la pantalla de login se
+# muestre sin esperar a cargarlas
+from activity_rollups import GROUP_COLUMNS, ActivityRollups, rolling_average
+from change_detection import IncrementalTable
+from criterios import CRITERIOS_ACREDITACION, TIPOS_ARCHIVO_PERMITIDOS
+from data_quality import (CORREGIR_NOMBRES, ELIMINAR_SIN_ENLACE, ISSUE_LABELS,
+                          check_evidencias, missing_link_records,
+                          name_fix_updates)
+from download_server import create_download_server
+from evidence_filters import EvidenceFilterIndex
+from google_clients import shared_clients
+from metadata_store import MetadataError, create_metadata_store
+from previews import PreviewCache, get_previews, preview_path, store_preview
+from rerun_profiler import (RerunProfile, SamplingProfiler, flame_rows,
+                            hot_spots, save_profile)
+from search_index import SearchIndex
+from session_actions import (CORREGIR, ELIMINAR, ELIMINAR_SELECCION,
+                             EVIDENCIA_ID_COLUMN, PendingActions,
+                             evidence_records, with_evidence_ids)
+from snapshot import SnapshotStore, WarmStartCache
+from storage_backend import (StorageError, build_object_path,
+                             create_storage_backend, evidence_metadata)
+from table_export import (CSV_CONTENT_TYPE, XLSX_CONTENT_TYPE, iter_csv,
+                          iter_xlsx)
+from time_index import (app_timezone, count_since, now_fecha_hora,
+                        with_time_index)
+from upload_validation import validate_uploads
+from write_behind import RegistrationJournal
+
+# Vigencia de las URLs firmadas y margen para renovarlas antes de que expiren
+SIGNED_URL_EXPIRATION = timedelta(hours=1)
+SIGNED_URL_REFRESH_MARGIN = timedelta(minutes=10)
+SIGNED_URL_CACHE_MAX_ENTRIES = 50000
 
 # Configuración de la página
 st.set_page_config(
@@ -58,36 +48,23 @@ st.set_page_config(
     layout="wide")
 
 
-# Función para inicializar Google Sheets
+# Función para cargar las credenciales compartidas de Google
 @st.cache_resource
-def init_google_sheets():
-    """Inicializa la conexión con Google Sheets usando las credenciales de los secrets"""
+def init_google_credentials():
+    """Retorna las credenciales del proceso (ver google_clients)"""
     try:
-        # Obtener credenciales desde los secrets de Replit
-        google_credentials = os.getenv("GOOGLE_SHEETS_CREDENTIALS")
-        if not google_credentials:
-            st.error(
-                "No se encontraron las credenciales de Google Sheets en los secrets"
-            )
-            return None
-
-        # Parsear las credenciales JSON
-        creds_dict = json.loads(google_credentials)
-
-        # Configurar los scopes necesarios
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
-
-        # Crear las credenciales
-        credentials = Credentials.from_service_account_info(creds_dict,
-                                                            scopes=scopes)
+        return shared_clients.credentials()
+    except Exception as e:
+        st.error(f"Error al cargar las credenciales de Google: {str(e)}")
+        return None
 
-        # Inicializar el cliente de gspread
-        client = gspread.authorize(credentials)
 
-        return client
+# Función para inicializar Google Sheets
+@st.cache_resource
+def init_google_sheets():
+    """Retorna el cliente de Google Sheets del proceso (ver google_clients)"""
+    try:
+        return shared_clients.sheets_client()
     except Exception as e:
         st.error(f"Error al inicializar Google Sheets: {str(e)}")
         return None
@@ -96,148 +73,371 @@ def init_google_sheets():
 # Función para inicializar Google Cloud Storage
 @st.cache_resource
 def init_google_cloud_storage():
-    """Inicializa la conexión con Google Cloud Storage usando las credenciales de los secrets"""
+    """Retorna el cliente de Google Cloud Storage del proceso (ver google_clients)"""
     try:
-        # Usar las mismas credenciales que Google Sheets
-        google_credentials = os.getenv("GOOGLE_SHEETS_CREDENTIALS")
-        if not google_credentials:
-            st.error(
-                "No se encontraron las credenciales de Google en los secrets")
-            return None
+        return shared_clients.storage_client()
+    except Exception as e:
+        st.error(f"Error al inicializar Google Cloud Storage: {str(e)}")
+        return None
 
-        # Parsear las credenciales JSON
-        creds_dict = json.loads(google_credentials)
 
-        # Configurar los scopes necesarios para Storage
-        scopes = [
-            "https://www.googleapis.com/auth/cloud-platform",
-            "https://www.googleapis.com/auth/devstorage.full_control"
-        ]
+# Función para inicializar el repositorio de metadatos configurado
+@st.cache_resource
+def init_metadata_store():
+    """Inicializa el repositorio de metadatos indicado por METADATA_BACKEND"""
+    sheets_client = None
+    if os.getenv("METADATA_BACKEND", "sheets").strip().lower() == "sheets":
+        sheets_client = init_google_sheets()
+        if not sheets_client:
+            return None
 
-        # Crear las credenciales con los scopes correctos
-        credentials = Credentials.from_service_account_info(creds_dict,
-                                                            scopes=scopes)
+    try:
+        return create_metadata_store(sheets_client)
+    except (MetadataError, OSError) as e:
+        st.error(f"Error al inicializar la base de datos: {str(e)}")
+        return None
 
-        # Inicializar el cliente de Google Cloud Storage con credenciales explícitas
-        client = storage.Client(credentials=credentials,
-                                project=creds_dict.get('project_id'))
 
-        return client
-    except Exception as e:
-        st.error(f"Error al inicializar Google Cloud Storage: {str(e)}")
+# Función para inicializar las instantáneas en disco de las tablas
+@st.cache_resource
+def init_snapshot_cache():
+    """Inicializa las instantáneas que se sirven tras un reinicio del servidor"""
+    try:
+        return WarmStartCache(SnapshotStore(
+            os.getenv("SNAPSHOT_DIR", "instantaneas")),
+                              on_refresh=_clear_snapshot_caches)
+    except OSError:
+        # Sin instantáneas las tablas se leen siempre del repositorio
         return None
 
 
-# Función para obtener usuarios desde Google Sheets
-@st.cache_data(ttl=300)  # Cache por 5 minutos
-def get_users_data(_client):
-    """Obtiene los datos de usuarios desde la hoja de Google Sheets"""
+# Función para inicializar las lecturas incrementales de evidencias
+@st.cache_resource
+def init_incremental_table(_store):
+    """Inicializa la última lectura de evidencias compartida por las sesiones"""
+    return IncrementalTable(
+        _store,
+        full_read_interval=float(
+            os.getenv("EVIDENCIAS_FULL_READ_MINUTES", "10")) * 60)
+
+
+# Función para generar los bloques de una exportación
+def export_chunks(vista, columns, formato):
+    """Retorna los bloques de bytes de la vista como CSV o XLSX"""
+    if formato == "CSV":
+        return iter_csv(columns, vista.chunks(columns))
+    coverage_df = vista.coverage()
+    return iter_xlsx([
+        ("Evidencias", columns, vista.chunks(columns)),
+        ("Cobertura", list(coverage_df.columns), [coverage_df]),
+    ])
+
+
+def _export_from_table(table, spec):
+    """Rehace la vista registrada en spec sobre la última lectura de la tabla"""
+    from datetime import date
+
+    evidencias_df = with_time_index(table.read())
+    filtros = spec["filtros"]
+    vista = EvidenceFilterIndex(evidencias_df).apply(
+        programa=filtros["programa"],
+        dimension=filtros["dimension"],
+        criterio=filtros["criterio"],
+        fecha_desde=date.fromisoformat(filtros["fecha_desde"]),
+        fecha_hasta=date.fromisoformat(filtros["fecha_hasta"]))
+    columns = [
+        column for column in spec["columnas"]
+        if column in evidencias_df.columns
+    ]
+    return export_chunks(vista, columns, spec["formato"])
+
+
+def _programa_lookup(table, storage_backend):
+    """Retorna la función que busca el programa de la fila de un objeto"""
+    lock = threading.Lock()
+    state = {'df': None, 'programas': {}}
+
+    def programa_of(path):
+        evidencias_df = table.read()
+        with lock:
+            # El mapa se arma una vez por lectura de la tabla
+            if state['df'] is not evidencias_df:
+                programas = {}
+                if {'url_cloudinary', 'programa'} <= set(evidencias_df.columns):
+                    for url, programa in zip(evidencias_df['url_cloudinary'],
+                                             evidencias_df['programa']):
+                        row_path = storage_backend.path_from_url(
+                            str(url or ''))
+                        if row_path:
+                            programas[row_path] = str(programa or '')
+                state['df'], state['programas'] = evidencias_df, programas
+            return state['programas'].get(path)
+
+    return programa_of
+
+
+# Función para inicializar el servidor de descargas en streaming
+@st.cache_resource
+def init_download_server():
+    """Inicia el servidor de exportaciones y archivos si EXPORT_SERVER_PORT está definido"""
+    store = init_metadata_store()
+    table = init_incremental_table(store) if store is not None else None
+    storage_backend = init_storage_backend()
     try:
-        # Abrir la hoja de cálculo
-        sheet = _client.open("sistema_evidencias")
+        return create_download_server(
+            os.environ,
+            storage_backend,
+            export_producer=(lambda spec: _export_from_table(table, spec))
+            if table is not None else None,
+            programa_of=_programa_lookup(table, storage_backend)
+            if table is not None and storage_backend else None)
+    except OSError as e:
+        st.warning(f"El servidor de descargas no está disponible: {str(e)}")
+        return None
+
 
-        # Obtener la pestaña de usuarios
-        usuarios_worksheet = sheet.worksheet("usuarios")
+# Función para mostrar la descarga de la vista filtrada
+def show_export_controls(vista, columns, filtros):
+    """Ofrece la vista filtrada y su cobertura como CSV o XLSX"""
+    formato = st.radio("Formato de exportación", ["CSV", "XLSX"],
+                       horizontal=True,
+                       key="formato_exportacion")
+    stamp = datetime.now(app_timezone()).strftime("%Y%m%d_%H%M")
 
-        # Obtener todos los datos
-        data = usuarios_worksheet.get_all_records()
+    if formato == "CSV":
+        file_name = f"evidencias_{stamp}.csv"
+        content_type = CSV_CONTENT_TYPE
+    else:
+        file_name = f"evidencias_{stamp}.xlsx"
+        content_type = XLSX_CONTENT_TYPE
+
+    col1, col2 = st.columns(2)
+    with col1:
+        server = init_download_server()
+        user_data = st.session_state.get('user_data') or {}
+        if server and server.serves_exports:
+            # Se registran solo los filtros; el servidor rehace la vista y
+            # genera las filas por bloques mientras el navegador descarga
+            spec = {"filtros": filtros, "columnas": columns, "formato": formato}
+            st.link_button(
+                f"⬇️ Descargar {formato}",
+                server.export_url(spec, file_name, content_type,
+                                  user_data.get('correo', ''),
+                                  user_data.get('rol', '')))
+        else:
+            # Sin servidor de descargas, Streamlit arma el archivo completo
+            # al hacer clic (sin copiar la tabla)
+            st.download_button(
+                f"⬇️ Descargar {formato}",
+                data=lambda: b"".join(export_chunks(vista, columns, formato)),
+                file_name=file_name,
+                mime=content_type,
+                key="descargar_exportacion")
+    with col2:
+        if formato == "CSV":
+            st.download_button(
+                "⬇️ Descargar cobertura (CSV)",
+                data=lambda: vista.coverage().to_csv(index=False).encode(
+                    "utf-8-sig"),
+                file_name=f"cobertura_{stamp}.csv",
+                mime=CSV_CONTENT_TYPE,
+                key="descargar_cobertura")
 
-        return pd.DataFrame(data)
+
+# Función para obtener usuarios desde el repositorio de metadatos
+@st.cache_data(ttl=300)  # Cache por 5 minutos
+def get_users_data(_store):
+    """Obtiene los datos de usuarios desde el repositorio de metadatos"""
+    import pandas as pd
+
+    try:
+        snapshots = init_snapshot_cache()
+        if snapshots:
+            return snapshots.read("usuarios", _store.get_users)
+        return _store.get_users()
     except Exception as e:
         st.error(f"Error al obtener datos de usuarios: {str(e)}")
         return pd.DataFrame()
 
 
-# Función para obtener evidencias desde Google Sheets
-@st.cache_data(ttl=60)  # Cache por 1 minuto
-def get_evidencias_data(_client):
-    """Obtiene los datos de evidencias desde la hoja de Google Sheets"""
-    try:
-        # Abrir la hoja de cálculo
-        sheet = _client.open("sistema_evidencias")
+def _snapshot_view(programa, columns):
+    """Retorna la función que obtiene una lectura parcial desde la instantánea"""
+
+    def view(evidencias_df):
+        if programa is not None and 'programa' in evidencias_df.columns:
+            evidencias_df = evidencias_df[evidencias_df['programa'] ==
+                                          programa].reset_index(drop=True)
+        if columns:
+            evidencias_df = evidencias_df[[
+                column for column in columns
+                if column in evidencias_df.columns
+            ]]
+        return evidencias_df
+
+    return view
+
 
-        # Obtener la pestaña de evidencias
-        evidencias_worksheet = sheet.worksheet("evidencias")
+# Función para obtener evidencias desde el repositorio de metadatos
+@st.cache_data(ttl=60)  # Cache por 1 minuto (una entrada por programa y columnas)
+def get_evidencias_data(_store, programa=None, columns=None):
+    """Obtiene las evidencias (todas o las de un programa) ordenadas por fecha.
 
-        # Obtener todos los datos
-        data = evidencias_worksheet.get_all_records()
+    columns limita la lectura a las columnas indicadas (todas si es None).
+    """
+    import pandas as pd
 
-        return pd.DataFrame(data)
+    columns = list(columns) if columns else None
+    try:
+        # La tabla completa solo se relee si el sondeo de cambios lo indica
+        table = init_incremental_table(_store)
+        partial = programa is not None or columns is not None
+        snapshots = init_snapshot_cache()
+        if snapshots:
+            evidencias_df = snapshots.read(
+                "evidencias",
+                table.read,
+                fetch=(lambda: _store.get_evidencias(programa, columns=columns))
+                if partial else None,
+                view=_snapshot_view(programa, columns) if partial else None)
+        elif partial:
+            evidencias_df = _store.get_evidencias(programa, columns=columns)
+        else:
+            evidencias_df = table.read()
+        # Una tabla sin cambios conserva su identificador de lectura
+        lectura = table.lectura if evidencias_df is table.df else \
+            uuid.uuid4().hex
+        # El índice se construye una vez por lectura y queda en la caché
+        evidencias_df = with_time_index(evidencias_df)
+        # Identifica esta lectura para reutilizar lo que se calcule sobre ella
+        # (st.cache_data entrega una copia nueva en cada ejecución)
+        evidencias_df.attrs['lectura'] = lectura
+        return evidencias_df
     except Exception as e:
         st.error(f"Error al obtener datos de evidencias: {str(e)}")
         return pd.DataFrame()
 
 
-# Función para agregar nueva evidencia
-def add_evidencia(client, programa, subido_por, url_cloudinary, criterio,
-                  dimension, nombre_archivo):
-    """Agrega una nueva evidencia a la hoja de Google Sheets"""
-    try:
-        # Abrir la hoja de cálculo
-        sheet = client.open("sistema_evidencias")
+@st.cache_resource(max_entries=8)
+def _build_filter_index(lectura, filas, _evidencias_df):
+    """Codifica las categorías una sola vez por lectura de la tabla"""
+    return EvidenceFilterIndex(_evidencias_df)
 
-        # Obtener la pestaña de evidencias
-        evidencias_worksheet = sheet.worksheet("evidencias")
 
-        # Crear nueva fila con los datos
-        fecha_hora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        new_row = [
-            programa, subido_por, url_cloudinary, fecha_hora, criterio,
-            dimension, nombre_archivo
-        ]
+@st.cache_resource(max_entries=4)
+def _build_quality_report(lectura, filas, correos, _evidencias_df, _users_df):
+    """Revisa la tabla una sola vez por lectura de evidencias y usuarios"""
+    return check_evidencias(_evidencias_df, _users_df)
 
-        # Agregar la fila
-        evidencias_worksheet.append_row(new_row)
 
-        return True
+# Función para obtener la revisión de calidad de una lectura de evidencias
+def get_quality_report(evidencias_df, users_df):
+    """Retorna el reporte de calidad de la tabla leída con get_evidencias_data"""
+    lectura = evidencias_df.attrs.get('lectura')
+    if lectura is None:
+        return check_evidencias(evidencias_df, users_df)
+    correos = tuple(users_df['correo'].astype(str)) if 'correo' in \
+        users_df.columns else ()
+    return _build_quality_report(lectura, len(evidencias_df), correos,
+                                 evidencias_df, users_df)
+
+
+# Función para obtener los códigos de filtro de una lectura de evidencias
+def get_filter_index(evidencias_df):
+    """Retorna los códigos de filtro de la tabla leída con get_evidencias_data"""
+    lectura = evidencias_df.attrs.get('lectura')
+    if lectura is None:
+        return EvidenceFilterIndex(evidencias_df)
+    # Las tablas derivadas heredan attrs; el número de filas las distingue
+    return _build_filter_index(lectura, len(evidencias_df), evidencias_df)
+
+
+def _clear_snapshot_caches(name):
+    """Invalida la caché de la tabla cuya instantánea quedó desactualizada"""
+    if name == "usuarios":
+        get_users_data.clear()
+    else:
+        get_evidencias_data.clear()
+
+
+# Función para inicializar la cola de registro diferido de evidencias
+@st.cache_resource
+def init_registration_journal():
+    """Inicializa el diario de registro diferido y su hilo de escritura"""
+    store = init_metadata_store()
+    if not store:
+        return None
+    journal = RegistrationJournal(
+        os.getenv("REGISTRO_DIFERIDO_PATH", "registro_pendiente.jsonl"),
+        store,
+        on_flush=get_evidencias_data.clear)
+    atexit.register(journal.close)
+    return journal
+
+
+# Función para agregar nueva evidencia
+def add_evidencia(store,
+                  programa,
+                  subido_por,
+                  url_cloudinary,
+                  criterio,
+                  dimension,
+                  nombre_archivo,
+                  fecha_hora=None):
+    """Agrega una nueva evidencia (vía la cola diferida) y retorna la fila (o None)"""
+    try:
+        # Crear nueva fila con los datos; la fecha es la misma que quedó en los
+        # metadatos del objeto, si se indica
+        fecha_hora = fecha_hora or now_fecha_hora()
+        evidencia = {
+            'programa': programa,
+            'subido_por': subido_por,
+            'url_cloudinary': url_cloudinary,
+            'fecha_hora': fecha_hora,
+            'criterio': criterio,
+            'dimension': dimension,
+            'nombre_archivo': nombre_archivo
+        }
+        # La cola la guarda en disco y responde de inmediato; el repositorio
+        # se actualiza por lotes en segundo plano
+        journal = init_registration_journal()
+        if journal:
+            journal.submit(evidencia)
+        else:
+            store.add_evidencia(evidencia)
+
+        return evidencia
     except Exception as e:
         st.error(f"Error al agregar evidencia: {str(e)}")
-        return False
+        return None
 
 
-def upload_to_gcs(file,
-                  folder_name,
-                  gcs_client,
-                  dimension=None,
-                  criterio=None,
-                  bucket_name=None):
-    """Sube un archivo a Google Cloud Storage y retorna la URL pública"""
+# Función para inicializar el índice de búsqueda de texto completo
+@st.cache_resource
+def init_search_index():
+    """Inicializa el índice de búsqueda local (SQLite FTS5)"""
     try:
-        # Lista de buckets a intentar (en orden de preferencia)
-        bucket_options = []
-
-        if bucket_name:
-            bucket_options.append(bucket_name)
-
-        # Opciones de nombres de bucket basados en el proyecto
-        project_id = gcs_client.project
-        bucket_options.extend([
-            "mi-bucket-proyecto",
-            "n8n-integracion-gdrive-evidencias",
-            f"{project_id}-evidencias",
-            f"{project_id}-storage",
-            f"evidencias-{project_id}",
-        ])
-
-        # Intentar encontrar un bucket que exista
-        working_bucket = None
-        for bucket_name_attempt in bucket_options:
-            try:
-                bucket = gcs_client.bucket(bucket_name_attempt)
-                # Verificar si existe haciendo una operación simple
-                bucket.reload()
-                working_bucket = bucket
-                actual_bucket_name = bucket_name_attempt
-                st.success(f"✅ Usando bucket: {actual_bucket_name}")
-                break
-            except Exception as e:
-                st.warning(
-                    f"Bucket {bucket_name_attempt} no disponible: {str(e)}")
-                continue
+        return SearchIndex(os.getenv("SEARCH_INDEX_PATH", "indice_busqueda.db"))
+    except Exception as e:
+        st.warning(f"La búsqueda de evidencias no está disponible: {str(e)}")
+        return None
+
 
-        if not working_bucket:
+# Función para inicializar el backend de almacenamiento configurado
+@st.cache_resource
+def init_storage_backend():
+    """Inicializa el backend de almacenamiento indicado por STORAGE_BACKEND"""
+    gcs_client = None
+    if os.getenv("STORAGE_BACKEND", "gcs").strip().lower() == "gcs":
+        gcs_client = init_google_cloud_storage()
+        if not gcs_client:
+            return None
+
+    try:
+        return create_storage_backend(gcs_client)
+    except StorageError as e:
+        st.error(str(e))
+        if gcs_client:
             # Listar buckets disponibles para ayudar al usuario
-            st.error("No se encontró ningún bucket disponible")
             try:
                 buckets = list(gcs_client.list_buckets())
                 if buckets:
@@ -245,7 +445,7 @@ def upload_to_gcs(file,
                     for b in buckets:
                         st.write(f"- {b.name}")
                     st.info(
-                        "Puedes usar uno de estos buckets modificando el código"
+                        "Puedes indicar uno de estos buckets en la variable GCS_BUCKET"
                     )
                 else:
                     st.error(
@@ -256,54 +456,51 @@ def upload_to_gcs(file,
                     )
             except Exception as list_error:
                 st.error(f"Error al listar buckets: {str(list_error)}")
-            return None
+        return None
 
-        # Crear la ruta del archivo con estructura de carpetas
-        # Limpiar nombres para que sean compatibles con GCS
-        clean_dimension = dimension.replace("/", "-").replace(
-            "\\", "-").replace(".", "_") if dimension else ""
-        clean_criterio = criterio.replace("/", "-").replace("\\", "-").replace(
-            ".", "_") if criterio else ""
-        clean_folder = folder_name.replace("/",
-                                           "-").replace("\\",
-                                                        "-").replace(".", "_")
 
+def upload_to_gcs(file,
+                  folder_name,
+                  storage_backend,
+                  dimension=None,
+                  criterio=None,
+                  metadata=None):
+    """Sube un archivo al backend de almacenamiento y retorna su URL canónica"""
+    try:
         # Crear la ruta: programa/dimension/criterio/archivo
-        if dimension and criterio:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_name_clean = file.name.replace(" ",
-                                                "_").replace("/", "-").replace(
-                                                    "\\", "-")
-            file_path = f"{clean_folder}/{clean_dimension}/{clean_criterio}/{timestamp}_{file_name_clean}"
-        else:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_name_clean = file.name.replace(" ",
-                                                "_").replace("/", "-").replace(
-                                                    "\\", "-")
-            file_path = f"{clean_folder}/{timestamp}_{file_name_clean}"
-
-        # Crear el blob (archivo en GCS)
-        blob = working_bucket.blob(file_path)
-
-        # Subir el archivo
-        file.seek(0)  # Resetear el puntero del archivo
-        blob.upload_from_file(file, content_type=file.type)
+        file_path = build_object_path(folder_name, file.name, dimension,
+                                      criterio)
+
+        upload_bar = st.progress(0.0, text=f"Subiendo {file.name}...")
+
+        def report_progress(sent, total):
+            if total:
+                upload_bar.progress(
+                    min(sent / total, 1.0),
+                    text=f"Subiendo {file.name}: {sent / (1024 * 1024):.1f} "
+                    f"de {total / (1024 * 1024):.1f} MB")
+
+        # Subir el archivo en streaming. Se guarda la URL canónica del objeto
+        # (se construye localmente, sin llamadas a la API); el acceso se
+        # entrega con URLs firmadas, por lo que no es necesario hacerlo público.
+        try:
+            url = storage_backend.put(file_path,
+                                      file,
+                                      content_type=file.type,
+                                      metadata=metadata,
+                                      progress=report_progress)
+        finally:
+            upload_bar.empty()
         st.success(f"Archivo subido exitosamente: {file_path}")
 
-        # Generar URL pública
+        # La miniatura se guarda junto al objeto; si falla, la subida sigue válida
         try:
-            # Intentar hacer el archivo público
-            blob.make_public()
-            st.success(f"Archivo hecho público exitosamente. URL: {blob.public_url}")
-            return blob.public_url
-            
+            store_preview(storage_backend, file_path, file, file.name,
+                          get_preview_cache())
         except Exception as e:
-            # Si make_public() falla por cualquier razón, ahora lo sabremos
-            st.error(f"❌ No se pudo hacer el archivo público. Causa: {str(e)}")
-            st.warning("El archivo fue subido, pero no se pudo generar un enlace público.")
-            st.info("Verifica la configuración de 'Acceso detallado' en los permisos del bucket.")
-            # Devolvemos None porque no pudimos generar la URL que queríamos
-            return None
+            st.warning(
+                f"No se pudo generar la vista previa de {file.name}: {str(e)}")
+        return url
 
     except Exception as e:
         st.error(f"Error al subir {file.name}: {str(e)}")
@@ -350,13 +547,13 @@ def show_login():
                     "Por favor ingrese su correo electrónico y contraseña")
                 return
 
-            # Inicializar Google Sheets
-            client = init_google_sheets()
-            if not client:
+            # Inicializar la base de datos
+            store = init_metadata_store()
+            if not store:
                 return
 
             # Obtener datos de usuarios
-            users_df = get_users_data(client)
+            users_df = get_users_data(store)
             if users_df.empty:
                 st.error("No se pudieron cargar los datos de usuarios")
                 return
@@ -399,14 +596,14 @@ def change_password_page():
                     "La nueva contraseña debe tener al menos 6 caracteres")
                 return
 
-            # Inicializar Google Sheets
-            client = init_google_sheets()
-            if not client:
+            # Inicializar la base de datos
+            store = init_metadata_store()
+            if not store:
                 st.error("Error al conectar con la base de datos")
                 return
 
             # Obtener datos de usuarios
-            users_df = get_users_data(client)
+            users_df = get_users_data(store)
             if users_df.empty:
                 st.error("No se pudieron cargar los datos de usuarios")
                 return
@@ -420,35 +617,14 @@ def change_password_page():
                 st.error("Contraseña actual incorrecta")
                 return
 
-            # Actualizar contraseña en Google Sheets
+            # Actualizar contraseña en la base de datos
             try:
-                worksheet = client.open("sistema_evidencias").worksheet(
-                    "usuarios")
-                all_records = worksheet.get_all_records()
-
-                # Encontrar la fila del usuario
-                for i, record in enumerate(all_records):
-                    if str(record['correo']).lower() == user_email.lower():
-                        row_num = i + 2  # +2 porque las filas empiezan en 1 y hay encabezado
-
-                        # Verificar si existe la columna contraseña
-                        headers = worksheet.row_values(1)
-                        if 'contraseña' not in headers:
-                            # Agregar columna contraseña si no existe
-                            worksheet.update_cell(1,
-                                                  len(headers) + 1,
-                                                  'contraseña')
-                            col_num = len(headers) + 1
-                        else:
-                            col_num = headers.index('contraseña') + 1
+                if store.update_password(user_email, new_password):
+                    st.success("✅ Contraseña actualizada exitosamente")
 
-                        # Actualizar contraseña
-                        worksheet.update_cell(row_num, col_num, new_password)
-                        st.success("✅ Contraseña actualizada exitosamente")
-
-                        # Limpiar cache para recargar datos
-                        get_users_data.clear()
-                        return
+                    # Limpiar cache para recargar datos
+                    get_users_data.clear()
+                    return
 
                 st.error("Usuario no encontrado")
 
@@ -456,155 +632,290 @@ def change_password_page():
                 st.error(f"Error al actualizar contraseña: {str(e)}")
 
 
-# Función mejorada para eliminar archivo de Google Cloud Storage
-def delete_from_gcs(file_url,
-                    gcs_client,
-                    bucket_name="n8n-integracion-gdrive-evidencias"):
-    """Elimina un archivo de Google Cloud Storage usando su URL"""
+class SignedUrlCache:
+    """Caché con expiración de URLs de acceso firmadas, indexada por objeto"""
+
+    def __init__(self,
+                 expiration=SIGNED_URL_EXPIRATION,
+                 refresh_margin=SIGNED_URL_REFRESH_MARGIN,
+                 max_entries=SIGNED_URL_CACHE_MAX_ENTRIES):
+        self.expiration = expiration
+        # La entrada se descarta antes de que la URL expire para que el
+        # enlace mostrado siga siendo válido mientras el usuario lo abre
+        self.ttl = (expiration - refresh_margin).total_seconds()
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, storage_backend, file_urls, signer=None, scope=None):
+        """Retorna la URL firmada de cada URL almacenada (misma posición).
+
+        signer(ruta, vigencia) reemplaza a la firma del backend; las URLs se
+        guardan por separado para cada scope (por ejemplo, cada usuario).
+        """
+        signer = signer or storage_backend.signed_url
+        now = time.monotonic()
+        resolved = {}
+        pending = []
+
+        with self._lock:
+            for file_url in set(file_urls):
+                file_path = storage_backend.path_from_url(file_url)
+                if not file_path:
+                    # URLs que no son del backend se muestran tal cual
+                    resolved[file_url] = file_url
+                    continue
+                key = (storage_backend.name, scope, file_path)
+                entry = self._entries.get(key)
+                if entry and entry[1] > now:
+                    resolved[file_url] = entry[0]
+                else:
+                    pending.append((file_url, key))
+
+        # La firma se calcula localmente (sin llamadas de red por cada URL)
+        signed = []
+        for file_url, key in pending:
+            try:
+                url = signer(key[2], self.expiration)
+            except Exception:
+                url = file_url
+            resolved[file_url] = url
+            signed.append((key, url))
+
+        if signed:
+            with self._lock:
+                if len(self._entries) + len(signed) > self.max_entries:
+                    self._evict(now)
+                for key, url in signed:
+                    self._entries[key] = (url, now + self.ttl)
+
+        return [resolved[file_url] for file_url in file_urls]
+
+    def _evict(self, now):
+        """Elimina entradas expiradas y, si no basta, las más antiguas"""
+        self._entries = {
+            key: entry
+            for key, entry in self._entries.items() if entry[1] > now
+        }
+        overflow = len(self._entries) - self.max_entries // 2
+        if overflow > 0:
+            for key in list(self._entries)[:overflow]:
+                del self._entries[key]
+
+
+# Caché de URLs firmadas compartida por todas las sesiones
+@st.cache_resource
+def get_signed_url_cache():
+    """Retorna la caché de URLs firmadas del proceso"""
+    return SignedUrlCache()
+
+
+# Función para reemplazar las URLs almacenadas por URLs firmadas
+def with_signed_urls(df, storage_backend, column='url_cloudinary'):
+    """Retorna una copia del DataFrame con enlaces firmados en la columna de URL"""
+    if df.empty or column not in df.columns or not storage_backend:
+        return df
+
+    urls = df[column].fillna('').astype(str).tolist()
+    server = init_download_server()
+    user_data = st.session_state.get('user_data')
+    if server and server.serves_files and user_data:
+        # Los enlaces pasan por el servidor de descargas, que verifica el
+        # programa y el rol del usuario antes de leer el archivo
+        programa, rol = user_data.get('programa', ''), user_data.get('rol', '')
+        signed_urls = get_signed_url_cache().get_many(
+            storage_backend,
+            urls,
+            signer=lambda path, expiration: server.file_url(
+                path, programa, rol, expiration.total_seconds()),
+            scope=(programa, rol))
+    else:
+        signed_urls = get_signed_url_cache().get_many(storage_backend, urls)
+    return df.assign(**{column: signed_urls})
+
+
+# Caché de miniaturas en disco compartida por todas las sesiones
+@st.cache_resource
+def get_preview_cache():
+    """Retorna la caché LRU de vistas previas del proceso"""
+    return PreviewCache(
+        os.getenv("PREVIEW_CACHE_DIR", "cache_vistas_previas"),
+        max_bytes=int(os.getenv("PREVIEW_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+
+# Agregados de actividad compartidos por todas las sesiones
+@st.cache_resource
+def get_activity_rollups():
+    """Retorna los conteos de subidas del proceso, actualizados por incrementos"""
+    return ActivityRollups()
+
+
+# Función para mostrar las series de actividad de subida
+def show_activity(evidencias_df):
+    """Muestra las subidas por período, su promedio móvil y el pronóstico de cobertura"""
+    rollups = get_activity_rollups()
+    rollups.sync(evidencias_df)
+
+    group_labels = {
+        'programa': 'Programa',
+        'dimension': 'Dimensión',
+        'subido_por': 'Usuario'
+    }
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        group_by = st.selectbox("Agrupar por",
+                                GROUP_COLUMNS,
+                                format_func=group_labels.get,
+                                key="actividad_grupo")
+    with col2:
+        freq = st.radio("Período", ["D", "W"],
+                        format_func={
+                            "D": "Diario",
+                            "W": "Semanal"
+                        }.get,
+                        horizontal=True,
+                        key="actividad_periodo")
+    with col3:
+        programas = ['Todos'] + sorted(
+            evidencias_df['programa'].dropna().astype(str).unique().tolist())
+        programa = st.selectbox("Programa",
+                                programas,
+                                key="actividad_programa")
+
+    series_df = rollups.series(group_by,
+                               freq,
+                               programa=None if programa == 'Todos' else programa)
+    if series_df.empty:
+        st.info("No hay subidas con fecha válida para mostrar.")
+    else:
+        window = st.slider("Promedio móvil (períodos)",
+                           1,
+                           12,
+                           7 if freq == "D" else 4,
+                           key=f"actividad_ventana_{freq}")
+        st.subheader("📈 Subidas por período")
+        st.line_chart(series_df)
+        st.subheader("📉 Promedio móvil")
+        st.line_chart(rolling_average(series_df, window))
+
+    st.subheader("🎯 Pronóstico de cobertura de criterios")
+    forecast_df = rollups.coverage_forecast()
+    if forecast_df.empty:
+        st.info("Aún no hay criterios cubiertos.")
+    else:
+        st.caption("Ritmo de nuevos criterios cubiertos en las últimas 4 "
+                   "semanas, extrapolado a los criterios pendientes.")
+        st.dataframe(forecast_df,
+                     column_config={
+                         'programa':
+                         'Programa',
+                         'criterios_cubiertos':
+                         'Criterios cubiertos',
+                         'criterios_pendientes':
+                         'Criterios pendientes',
+                         'criterios_por_semana':
+                         'Criterios por semana',
+                         'fecha_estimada':
+                         st.column_config.DateColumn('Fecha estimada')
+                     },
+                     use_container_width=True,
+                     hide_index=True)
+
+
+# Función para mostrar las miniaturas de un grupo de evidencias
+def show_previews(evidencias_df, storage_backend, columns_per_row=4):
+    """Muestra en una grilla las vistas previas disponibles de las evidencias"""
+    paths = {}
+    for _, row in evidencias_df.iterrows():
+        file_path = storage_backend.path_from_url(
+            str(row.get('url_cloudinary', '')))
+        if file_path:
+            paths[file_path] = row.get('nombre_archivo', 'archivo')
+
+    previews = get_previews(storage_backend, list(paths), get_preview_cache())
+    if not previews:
+        st.caption("No hay vistas previas disponibles para estos archivos.")
+        return
+
+    items = list(previews.items())
+    for i in range(0, len(items), columns_per_row):
+        for column, (file_path, data) in zip(st.columns(columns_per_row),
+                                             items[i:i + columns_per_row]):
+            with column:
+                st.image(data, caption=paths[file_path], use_container_width=True)
+
+
+# Función mejorada para eliminar archivo del almacenamiento
+def delete_from_gcs(file_url, storage_backend):
+    """Elimina un archivo del backend de almacenamiento usando su URL"""
+    file_path = None
     try:
         if not file_url:
             st.warning("URL del archivo vacía")
             return False
 
-        # Múltiples métodos para extraer el path del archivo
-        file_path = None
-
-        # Método 1: URL de la API de Storage
-        if "/storage/v1/b/" in file_url:
-            try:
-                parts = file_url.split("/storage/v1/b/")[1].split("/o/")
-                if len(parts) > 1:
-                    file_path = parts[1].split("?")[0]
-                    file_path = urllib.parse.unquote(file_path)
-            except:
-                pass
-
-        # Método 2: URL pública googleapis.com
-        if not file_path and "googleapis.com" in file_url:
-            try:
-                if f"storage.googleapis.com/{bucket_name}/" in file_url:
-                    file_path = file_url.split(
-                        f"storage.googleapis.com/{bucket_name}/")[1].split(
-                            "?")[0]
-                    file_path = urllib.parse.unquote(file_path)
-            except:
-                pass
-
-        # Método 3: URL con patrón /bucket/file
-        if not file_path and bucket_name in file_url:
-            try:
-                # Buscar el bucket en la URL y extraer lo que viene después
-                bucket_index = file_url.find(bucket_name)
-                if bucket_index != -1:
-                    remaining = file_url[bucket_index + len(bucket_name):]
-                    if remaining.startswith("/"):
-                        remaining = remaining[1:]  # Quitar el slash inicial
-                    file_path = remaining.split("?")[
-                        0]  # Quitar parámetros de query
-                    file_path = urllib.parse.unquote(file_path)
-            except:
-                pass
-
-        # Método 4: URL firmada (signed URL)
-        if not file_path and "/o/" in file_url:
-            try:
-                o_index = file_url.find("/o/")
-                if o_index != -1:
-                    remaining = file_url[o_index + 3:]  # +3 para "/o/"
-                    file_path = remaining.split("?")[0]
-                    file_path = urllib.parse.unquote(file_path)
-            except:
-                pass
+        file_path = storage_backend.path_from_url(file_url)
 
         if not file_path:
             st.error(
                 f"No se pudo extraer la ruta del archivo desde la URL: {file_url}"
             )
             st.error(
-                "Patrones buscados: /storage/v1/b/, googleapis.com, bucket name, /o/"
+                "Patrones buscados: /storage/v1/b/, googleapis.com, bucket name, /o/, local://"
             )
             return False
 
         st.info(f"Intentando eliminar archivo: {file_path}")
 
-        # Obtener el bucket y eliminar el archivo
-        bucket = gcs_client.bucket(bucket_name)
-        blob = bucket.blob(file_path)
-
-        if blob.exists():
-            blob.delete()
-            st.success(
-                f"Archivo eliminado de Google Cloud Storage: {file_path}")
-            return True
+        if storage_backend.delete(file_path):
+            st.success(f"Archivo eliminado del almacenamiento: {file_path}")
         else:
-            st.warning(
-                f"El archivo no existe en Google Cloud Storage: {file_path}")
-            return True  # Consideramos esto como éxito ya que el objetivo es que no exista
+            st.warning(f"El archivo no existe en el almacenamiento: {file_path}")
+
+        # Eliminar también la miniatura, si existe
+        storage_backend.delete(preview_path(file_path))
+        get_preview_cache().discard(storage_backend.name,
+                                    preview_path(file_path))
+        # Si no existía también es éxito: el objetivo es que no exista
+        return True
 
     except Exception as e:
-        st.error(
-            f"Error al eliminar archivo de Google Cloud Storage: {str(e)}")
+        st.error(f"Error al eliminar archivo del almacenamiento: {str(e)}")
         st.error(f"URL problemática: {file_url}")
-        st.error(
-            f"Path extraído: {file_path if 'file_path' in locals() else 'No se pudo extraer'}"
-        )
+        st.error(f"Path extraído: {file_path or 'No se pudo extraer'}")
         return False
 
 
 # Agrega esta función temporal a tu código para ver qué buckets existen
-def debug_list_buckets(gcs_client):
-    """Lista todos los buckets disponibles en el proyecto"""
+def debug_list_buckets(storage_backend):
+    """Muestra la información del backend de almacenamiento en uso"""
     try:
-        buckets = list(gcs_client.list_buckets())
-        st.write("### Buckets disponibles en el proyecto:")
-        if buckets:
-            for bucket in buckets:
-                st.write(f"- {bucket.name}")
-                st.write(f"  Ubicación: {bucket.location}")
-                st.write(f"  Clase de almacenamiento: {bucket.storage_class}")
-                st.write("---")
-        else:
-            st.write("No se encontraron buckets en el proyecto")
-
-        # Información del proyecto
-        st.write(f"**Proyecto actual:** {gcs_client.project}")
-
+        for line in storage_backend.describe():
+            st.write(line)
     except Exception as e:
         st.error(f"Error al listar buckets: {str(e)}")
 
 
 # Llama a esta función en tu main() para debug:
-# En la función donde inicializas gcs_client, agrega:
-# debug_list_buckets(gcs_client)
+# En la función donde inicializas storage_backend, agrega:
+# debug_list_buckets(storage_backend)
 
 
-# Función mejorada para eliminar evidencia de Google Sheets
-def delete_evidencia(client, evidencia_data):
-    """Elimina una evidencia específica de Google Sheets usando un identificador único"""
+# Función mejorada para eliminar evidencia de la base de datos
+def delete_evidencia(store, evidencia_data):
+    """Elimina una evidencia específica de la base de datos usando sus campos"""
     try:
-        sheet = client.open("sistema_evidencias")
-        evidencias_worksheet = sheet.worksheet("evidencias")
-
-        # Obtener todos los registros
-        all_records = evidencias_worksheet.get_all_records()
-
-        # Buscar la fila que coincida con todos los campos
-        for i, record in enumerate(all_records):
-            match = True
-            for key, value in evidencia_data.items():
-                if str(record.get(key, '')).strip() != str(value).strip():
-                    match = False
-                    break
-
-            if match:
-                # Eliminar la fila (i + 2 porque las filas empiezan en 1 y hay encabezado)
-                evidencias_worksheet.delete_rows(i + 2)
-
-                # Limpiar cache
-                get_evidencias_data.clear()
-
-                st.success("Evidencia eliminada de la base de datos")
-                return True
+        # Una evidencia aún en el diario no debe escribirse después de borrada
+        journal = init_registration_journal()
+        canceled = journal.cancel(evidencia_data.get(
+            'url_cloudinary', '')) if journal else 0
+        if store.delete_evidencia(evidencia_data) or canceled:
+            # Limpiar cache
+            get_evidencias_data.clear()
+            get_activity_rollups().remove([evidencia_data])
+
+            st.success("Evidencia eliminada de la base de datos")
+            return True
 
         st.error(
             "No se encontró la evidencia para eliminar en la base de datos")
@@ -616,7 +927,7 @@ def delete_evidencia(client, evidencia_data):
 
 
 # Función para eliminar múltiples archivos (nueva funcionalidad)
-def delete_multiple_files(selected_files, client, gcs_client):
+def delete_multiple_files(selected_files, store, storage_backend):
     """Elimina múltiples archivos seleccionados"""
     if not selected_files:
         st.warning("No hay archivos seleccionados para eliminar")
@@ -624,6 +935,7 @@ def delete_multiple_files(selected_files, client, gcs_client):
 
     success_count = 0
     error_count = 0
+    paths_to_delete = []
 
     progress_bar = st.progress(0)
     total_files = len(selected_files)
@@ -634,18 +946,42 @@ def delete_multiple_files(selected_files, client, gcs_client):
         with st.spinner(
                 f"Eliminando {file_data.get('nombre_archivo', 'archivo')}..."):
             # Eliminar de Google Sheets
-            sheets_success = delete_evidencia(client, file_data)
-
-            # Eliminar de Google Cloud Storage
-            gcs_success = True
-            if file_data.get('url_cloudinary'):
-                gcs_success = delete_from_gcs(file_data['url_cloudinary'],
-                                              gcs_client)
+            if not delete_evidencia(store, file_data):
+                error_count += 1
+                continue
 
-            if sheets_success and gcs_success:
-                success_count += 1
-            else:
+            file_path = storage_backend.path_from_url(
+                file_data.get('url_cloudinary', ''))
+            if file_path:
+                paths_to_delete.append(file_path)
+            elif file_data.get('url_cloudinary'):
+                st.error(
+                    f"No se pudo extraer la ruta del archivo desde la URL: {file_data['url_cloudinary']}"
+                )
                 error_count += 1
+            else:
+                success_count += 1
+
+    # Eliminar del almacenamiento (con sus miniaturas) en una sola operación por lotes
+    if paths_to_delete:
+        with st.spinner("Eliminando archivos del almacenamiento..."):
+            try:
+                previews = [preview_path(path) for path in paths_to_delete]
+                existed = storage_backend.delete_many(paths_to_delete +
+                                                      previews)
+                preview_cache = get_preview_cache()
+                for path in previews:
+                    preview_cache.discard(storage_backend.name, path)
+                success_count += len(paths_to_delete)
+                missing = sum(1 for path in paths_to_delete
+                              if not existed.get(path))
+                if missing:
+                    st.warning(
+                        f"{missing} archivo(s) ya no estaban en el almacenamiento")
+            except Exception as e:
+                st.error(
+                    f"Error al eliminar archivos del almacenamiento: {str(e)}")
+                error_count += len(paths_to_delete)
 
     if success_count > 0:
         st.success(f"✅ {success_count} archivo(s) eliminado(s) exitosamente")
@@ -658,9 +994,82 @@ def delete_multiple_files(selected_files, client, gcs_client):
     progress_bar.empty()
 
 
+# Función para obtener las acciones pendientes de la sesión
+def get_pending_actions():
+    """Retorna el registro de acciones pendientes de confirmación de la sesión"""
+    if 'acciones_pendientes' not in st.session_state:
+        st.session_state.acciones_pendientes = PendingActions()
+    return st.session_state.acciones_pendientes
+
+
+# Función para mostrar la búsqueda de evidencias
+def show_search_box(evidencias_df, storage_backend, programa=None):
+    """Muestra la caja de búsqueda de texto completo y sus resultados"""
+    import pandas as pd
+
+    search_index = init_search_index()
+    if not search_index:
+        return
+
+    # Alinear el índice con los datos recién leídos (solo cambia si hubo altas
+    # o bajas); las evidencias en cola de registro conservan su contenido
+    journal = init_registration_journal()
+    search_index.sync(
+        evidencias_df,
+        programa=programa,
+        keep_urls=[
+            evidencia.get('url_cloudinary', '')
+            for evidencia in journal.pending()
+        ] if journal else ())
+
+    query = st.text_input(
+        "🔎 Buscar evidencias",
+        key=f"search_query_{programa or 'admin'}",
+        placeholder="Nombre del archivo, autor, criterio o contenido del documento")
+    if not query:
+        return
+
+    start = time.perf_counter()
+    results = search_index.search(query, programa=programa)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if not results:
+        st.info("No se encontraron evidencias para la búsqueda.")
+        return
+
+    st.caption(f"{len(results)} resultado(s) en {elapsed_ms:.0f} ms")
+    columns_to_show = ['nombre_archivo', 'criterio', 'subido_por',
+                       'fecha_hora', 'fragmento', 'url_cloudinary']
+    if programa is None:
+        columns_to_show.insert(0, 'programa')
+    st.dataframe(with_signed_urls(
+        pd.DataFrame(results)[columns_to_show], storage_backend),
+                 column_config={
+                     'programa':
+                     'Programa',
+                     'nombre_archivo':
+                     'Nombre del Archivo',
+                     'criterio':
+                     'Criterio',
+                     'subido_por':
+                     'Subido por',
+                     'fecha_hora':
+                     'Fecha y Hora',
+                     'fragmento':
+                     'Coincidencia',
+                     'url_cloudinary':
+                     st.column_config.LinkColumn('Enlace al Archivo',
+                                                 display_text="Ver Archivo")
+                 },
+                 use_container_width=True,
+                 hide_index=True)
+
+
 # Función para mostrar panel de usuario con eliminación mejorada
 def show_user_panel():
     """Muestra el panel para usuarios regulares con funcionalidad de eliminación mejorada"""
+    import pandas as pd
+
     user_data = st.session_state.user_data
 
     st.title(f"📋 Panel de Usuario - {user_data['programa']}")
@@ -692,10 +1101,10 @@ def show_user_panel():
         return
 
     # Inicializar servicios
-    client = init_google_sheets()
-    gcs_client = init_google_cloud_storage()
+    store = init_metadata_store()
+    storage_backend = init_storage_backend()
 
-    if not client or not gcs_client:
+    if not store or not storage_backend:
         st.error("Error al inicializar los servicios necesarios")
         return
 
@@ -727,10 +1136,7 @@ def show_user_panel():
         # Subida de múltiples archivos
         uploaded_files = st.file_uploader(
             f"Seleccione los archivos para {criterio_seleccionado}",
-            type=[
-                'pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx', 'xls', 'xlsx',
-                'ppt', 'pptx'
-            ],
+            type=TIPOS_ARCHIVO_PERMITIDOS,
             help="Formatos permitidos: PDF, imágenes, documentos de Office",
             accept_multiple_files=True)
 
@@ -740,32 +1146,80 @@ def show_user_panel():
                 st.write(f"• {file.name} ({file.size / 1024:.2f} KB)")
 
             if st.button("Subir Evidencias", type="primary"):
+                # Validar todos los archivos antes de cualquier subida o registro
+                with st.spinner("Validando archivos..."):
+                    validations = validate_uploads(uploaded_files)
+                rejected = [v for v in validations if not v.valido]
+                if rejected:
+                    st.error(
+                        f"❌ {len(rejected)} archivo(s) rechazado(s) por la validación:"
+                    )
+                    for validation in rejected:
+                        st.write(f"• **{validation.nombre}**: {validation.motivo}")
+
+                valid_files = [
+                    (uploaded_file, validation)
+                    for uploaded_file, validation in zip(uploaded_files,
+                                                         validations)
+                    if validation.valido
+                ]
                 progress_bar = st.progress(0)
-                total_files = len(uploaded_files)
+                total_files = max(len(valid_files), 1)
 
-                for i, uploaded_file in enumerate(uploaded_files):
+                for i, (uploaded_file, validation) in enumerate(valid_files):
                     progress_bar.progress((i + 1) / total_files)
 
                     with st.spinner(f"Subiendo {uploaded_file.name}..."):
+                        # El objeto lleva los datos de la evidencia en sus
+                        # metadatos para poder reconstruir la tabla
+                        fecha_hora = now_fecha_hora()
+                        metadata = evidence_metadata(
+                            user_data['programa'],
+                            dimension_seleccionada,
+                            criterio_seleccionado,
+                            user_data['correo'],
+                            uploaded_file.name,
+                            fecha_hora,
+                            uuid.uuid4().hex,
+                            sha256=validation.sha256)
+
                         # Subir a Google Cloud Storage
                         url_drive = upload_to_gcs(uploaded_file,
                                                   user_data['programa'],
-                                                  gcs_client,
+                                                  storage_backend,
                                                   dimension_seleccionada,
-                                                  criterio_seleccionado)
+                                                  criterio_seleccionado,
+                                                  metadata=metadata)
 
                         if url_drive:
                             # Registrar en Google Sheets
-                            success = add_evidencia(
-                                client, user_data['programa'],
-                                user_data['correo'], url_drive,
-                                criterio_seleccionado, dimension_seleccionada,
-                                uploaded_file.name)
-
-                            if success:
+                            evidencia = add_evidencia(
+                                store,
+                                user_data['programa'],
+                                user_data['correo'],
+                                url_drive,
+                                criterio_seleccionado,
+                                dimension_seleccionada,
+                                uploaded_file.name,
+                                fecha_hora=fecha_hora)
+
+                            if evidencia:
                                 st.success(
                                     f"✅ {uploaded_file.name} subido exitosamente!"
                                 )
+
+                                # Indexar para la búsqueda; el texto del
+                                # documento se extrae en segundo plano
+                                search_index = init_search_index()
+                                if search_index:
+                                    try:
+                                        search_index.index_upload(
+                                            url_drive, uploaded_file,
+                                            uploaded_file.name, evidencia)
+                                    except Exception as e:
+                                        st.warning(
+                                            f"No se pudo indexar {uploaded_file.name} para la búsqueda: {str(e)}"
+                                        )
                             else:
                                 st.error(
                                     f"❌ Error al registrar {uploaded_file.name} en la base de datos"
@@ -774,24 +1228,45 @@ def show_user_panel():
                             st.error(f"❌ Error al subir {uploaded_file.name}")
 
                 # Limpiar cache para mostrar datos actualizados
-                st.cache_data.clear()
-                st.balloons()
-                st.success(
-                    f"🎉 Proceso completado! {total_files} archivo(s) procesado(s)"
-                )
+                if valid_files:
+                    st.cache_data.clear()
+                    st.balloons()
+                    st.success(
+                        f"🎉 Proceso completado! {len(valid_files)} archivo(s) procesado(s)"
+                        + (f", {len(rejected)} rechazado(s)" if rejected else ""))
 
     with tab2:
         st.header("Mis Evidencias por Criterios")
 
-        # Obtener evidencias del usuario
-        evidencias_df = get_evidencias_data(client)
+        # Evidencias subidas que todavía esperan su registro
+        journal = init_registration_journal()
+        if journal:
+            en_cola = [
+                evidencia for evidencia in journal.pending()
+                if evidencia.get('programa') == user_data['programa']
+            ]
+            if en_cola:
+                st.info(
+                    f"⏳ {len(en_cola)} evidencia(s) en cola de registro; aparecerán en unos segundos."
+                )
+                if journal.last_error:
+                    st.warning(
+                        f"El registro se reintentará automáticamente: {journal.last_error}"
+                    )
+
+        # Obtener solo las evidencias del programa del usuario
+        evidencias_df = get_evidencias_data(store, user_data['programa'])
 
-        if not evidencias_df.empty:
-            # Filtrar por programa del usuario
-            user_evidencias = evidencias_df[evidencias_df['programa'] ==
-                                            user_data['programa']]
+        # Un DataFrame sin columnas indica que la lectura falló
+        if len(evidencias_df.columns) > 0:
+            user_evidencias = with_evidence_ids(evidencias_df)
+            pending = get_pending_actions()
 
             if not user_evidencias.empty:
+                # Búsqueda de texto completo dentro del programa
+                show_search_box(user_evidencias, storage_backend,
+                                programa=user_data['programa'])
+
                 # Mostrar estadísticas
                 col1, col2 = st.columns(2)
                 with col1:
@@ -830,55 +1305,47 @@ def show_user_panel():
                             "Seleccione los archivos que desea eliminar y use el botón 'Eliminar Seleccionados'"
                         )
 
-                        # Crear lista de archivos para selección múltiple
-                        files_to_select = []
-                        selected_files = []
-
-                        for idx, row in df_mostrar.iterrows():
-                            file_info = {
-                                'nombre_archivo':
-                                row.get('nombre_archivo', 'Sin nombre'),
-                                'criterio':
-                                row.get('criterio', ''),
-                                'fecha_hora':
-                                row.get('fecha_hora', ''),
-                                'programa':
-                                row.get('programa', user_data['programa']),
-                                'subido_por':
-                                row.get('subido_por', user_data['correo']),
-                                'url_cloudinary':
-                                row.get('url_cloudinary', ''),
-                                'dimension':
-                                row.get('dimension', '')
-                            }
-
-                            file_display_name = f"{file_info['nombre_archivo']} - {file_info['criterio']} ({file_info['fecha_hora']})"
-
-                            if st.checkbox(file_display_name,
-                                           key=f"select_file_{idx}"):
-                                selected_files.append(file_info)
+                        # Selección de filas en una sola tabla (un solo
+                        # estado de widget en lugar de una clave por fila)
+                        seleccion = st.dataframe(
+                            df_mostrar[[
+                                'nombre_archivo', 'criterio', 'fecha_hora'
+                            ]],
+                            column_config={
+                                'nombre_archivo': 'Nombre del Archivo',
+                                'criterio': 'Criterio',
+                                'fecha_hora': 'Fecha y Hora'
+                            },
+                            on_select="rerun",
+                            selection_mode="multi-row",
+                            key="seleccion_eliminar_usuario",
+                            use_container_width=True,
+                            hide_index=True)
+                        selected_ids = df_mostrar[EVIDENCIA_ID_COLUMN].iloc[
+                            seleccion.selection.rows].tolist()
 
                         # Botón para eliminar archivos seleccionados
                         col1, col2 = st.columns([1, 3])
                         with col1:
                             if st.button("🗑️ Eliminar Seleccionados",
                                          type="primary",
-                                         disabled=len(selected_files) == 0):
-                                if selected_files:
-                                    st.session_state[
-                                        'confirm_delete_multiple'] = selected_files
-                                    st.rerun()
+                                         disabled=len(selected_ids) == 0):
+                                pending.request(ELIMINAR_SELECCION, 'usuario',
+                                                selected_ids)
+                                st.rerun()
 
                         with col2:
-                            if selected_files:
+                            if selected_ids:
                                 st.info(
-                                    f"{len(selected_files)} archivo(s) seleccionado(s)"
+                                    f"{len(selected_ids)} archivo(s) seleccionado(s)"
                                 )
 
                         # Confirmación de eliminación múltiple
-                        if st.session_state.get('confirm_delete_multiple'):
-                            files_to_delete = st.session_state[
-                                'confirm_delete_multiple']
+                        action = pending.get(ELIMINAR_SELECCION, 'usuario')
+                        if action:
+                            # Solo evidencias del programa del usuario
+                            files_to_delete = evidence_records(
+                                user_evidencias, action.evidence_ids)
                             st.error(
                                 f"¿Estás seguro de eliminar {len(files_to_delete)} archivo(s)?"
                             )
@@ -887,17 +1354,15 @@ def show_user_panel():
                             with col_yes:
                                 if st.button("✅ Sí, eliminar todos",
                                              key="confirm_multiple_yes"):
+                                    pending.pop(ELIMINAR_SELECCION, 'usuario')
                                     delete_multiple_files(
-                                        files_to_delete, client, gcs_client)
-                                    del st.session_state[
-                                        'confirm_delete_multiple']
+                                        files_to_delete, store, storage_backend)
                                     st.rerun()
 
                             with col_no:
                                 if st.button("❌ Cancelar",
                                              key="confirm_multiple_no"):
-                                    del st.session_state[
-                                        'confirm_delete_multiple']
+                                    pending.pop(ELIMINAR_SELECCION, 'usuario')
                                     st.rerun()
 
                     # Mostrar evidencias agrupadas por criterio
@@ -914,19 +1379,10 @@ def show_user_panel():
                             if expander_key not in st.session_state:
                                 st.session_state[expander_key] = False
 
-                            # Verificar si hay alguna confirmación pendiente para este criterio
-                            has_pending_confirmation = False
-                            for idx, row in criterio_evidencias.iterrows():
-                                file_name = row.get('nombre_archivo',
-                                                    'archivo')
-                                unique_key = f"{row.get('programa', user_data['programa'])}_{row.get('subido_por', user_data['correo'])}_{file_name}_{idx}".replace(
-                                    " ", "_").replace("/",
-                                                      "_").replace(".", "_")
-                                if st.session_state.get(
-                                        f'confirm_delete_{unique_key}'):
-                                    has_pending_confirmation = True
-                                    st.session_state[expander_key] = True
-                                    break
+                            # Abrir el criterio si tiene una confirmación pendiente
+                            if criterio_evidencias[EVIDENCIA_ID_COLUMN].isin(
+                                    pending.pending_keys(ELIMINAR)).any():
+                                st.session_state[expander_key] = True
 
                             with st.expander(
                                     f"{criterio} ({len(criterio_evidencias)} archivo(s))",
@@ -947,7 +1403,9 @@ def show_user_panel():
                                     ]
 
                                 st.dataframe(
-                                    criterio_evidencias[available_columns],
+                                    with_signed_urls(
+                                        criterio_evidencias[available_columns],
+                                        storage_backend),
                                     column_config={
                                         'nombre_archivo':
                                         'Nombre del Archivo',
@@ -961,6 +1419,12 @@ def show_user_panel():
                                     use_container_width=True,
                                     hide_index=True)
 
+                                # Las miniaturas se descargan solo al pedirlas
+                                if st.toggle("🖼️ Vistas previas",
+                                             key=f"previews_{expander_key}"):
+                                    show_previews(criterio_evidencias,
+                                                  storage_backend)
+
                                 # Solo mostrar botones individuales si no está en modo eliminación múltiple
                                 if not multiple_delete_mode:
                                     st.subheader("🔧 Acciones Individuales")
@@ -969,32 +1433,8 @@ def show_user_panel():
                                     ):
                                         file_name = row.get(
                                             'nombre_archivo', 'archivo')
-                                        file_url = row.get(
-                                            'url_cloudinary', '')
-
-                                        # Crear datos completos para eliminación
-                                        evidencia_data = {
-                                            'programa':
-                                            row.get('programa',
-                                                    user_data['programa']),
-                                            'subido_por':
-                                            row.get('subido_por',
-                                                    user_data['correo']),
-                                            'url_cloudinary':
-                                            file_url,
-                                            'criterio':
-                                            row.get('criterio', ''),
-                                            'dimension':
-                                            row.get('dimension', ''),
-                                            'nombre_archivo':
-                                            file_name
-                                        }
-
-                                        # Crear key único basado en el contenido del archivo
-                                        unique_key = f"{evidencia_data['programa']}_{evidencia_data['subido_por']}_{file_name}_{idx}".replace(
-                                            " ", "_").replace("/",
-                                                              "_").replace(
-                                                                  ".", "_")
+                                        evidencia_id = row[
+                                            EVIDENCIA_ID_COLUMN]
 
                                         # Contenedor para cada archivo
                                         file_container = st.container()
@@ -1010,22 +1450,24 @@ def show_user_panel():
                                                 if st.button(
                                                         f"🗑️",
                                                         key=
-                                                        f"delete_{unique_key}",
+                                                        f"delete_{evidencia_id}",
                                                         help="Eliminar archivo"
                                                 ):
-                                                    st.session_state[
-                                                        f'confirm_delete_{unique_key}'] = evidencia_data
+                                                    pending.request(
+                                                        ELIMINAR, evidencia_id,
+                                                        [evidencia_id])
                                                     # Mantener el expander abierto
                                                     st.session_state[
                                                         expander_key] = True
                                                     st.rerun()
 
                                             # Confirmación de eliminación individual
-                                            if st.session_state.get(
-                                                    f'confirm_delete_{unique_key}'
-                                            ):
-                                                delete_info = st.session_state[
-                                                    f'confirm_delete_{unique_key}']
+                                            if pending.get(
+                                                    ELIMINAR, evidencia_id):
+                                                delete_info = row.drop(
+                                                    EVIDENCIA_ID_COLUMN
+                                                ).fillna('').astype(
+                                                    str).to_dict()
 
                                                 st.warning(
                                                     f"¿Estás seguro de eliminar **{delete_info['nombre_archivo']}**?"
@@ -1040,14 +1482,14 @@ def show_user_panel():
                                                     if st.button(
                                                             "✅ Sí, eliminar",
                                                             key=
-                                                            f"confirm_yes_{unique_key}",
+                                                            f"confirm_yes_{evidencia_id}",
                                                             type="primary"):
                                                         with st.spinner(
                                                                 f"Eliminando {delete_info['nombre_archivo']}..."
                                                         ):
                                                             # Eliminar de Google Sheets
                                                             success_sheets = delete_evidencia(
-                                                                client,
+                                                                store,
                                                                 delete_info)
 
                                                             # Eliminar de GCS
@@ -1057,7 +1499,7 @@ def show_user_panel():
                                                                 success_gcs = delete_from_gcs(
                                                                     delete_info[
                                                                         'url_cloudinary'],
-                                                                    gcs_client)
+                                                                    storage_backend)
 
                                                             if success_sheets and success_gcs:
                                                                 st.success(
@@ -1080,18 +1522,20 @@ def show_user_panel():
                                                                     expander_key] = True
 
                                                             # Limpiar confirmación
-                                                            del st.session_state[
-                                                                f'confirm_delete_{unique_key}']
+                                                            pending.pop(
+                                                                ELIMINAR,
+                                                                evidencia_id)
                                                             st.rerun()
 
                                                 with col_no:
                                                     if st.button(
                                                             "❌ Cancelar",
                                                             key=
-                                                            f"confirm_no_{unique_key}"
+                                                            f"confirm_no_{evidencia_id}"
                                                     ):
-                                                        del st.session_state[
-                                                            f'confirm_delete_{unique_key}']
+                                                        pending.pop(
+                                                            ELIMINAR,
+                                                            evidencia_id)
                                                         # Mantener expander abierto al cancelar
                                                         st.session_state[
                                                             expander_key] = True
@@ -1117,7 +1561,8 @@ def show_user_panel():
                         if col in user_evidencias.columns
                     ]
 
-                    st.dataframe(user_evidencias[available_columns],
+                    st.dataframe(with_signed_urls(
+                        user_evidencias[available_columns], storage_backend),
                                  column_config={
                                      'fecha_hora':
                                      'Fecha y Hora',
@@ -1128,36 +1573,37 @@ def show_user_panel():
                                          'Enlace al Archivo',
                                          display_text="Ver Archivo")
                                  },
-                                 use_container_width=True)
+                                 use_container_width=True,
+                                 hide_index=True)
 
                     # Botones de eliminación para formato antiguo
                     st.subheader("🔧 Eliminar Archivos")
-                    for idx, row in user_evidencias.iterrows():
+                    for _, row in user_evidencias.iterrows():
+                        evidencia_id = row[EVIDENCIA_ID_COLUMN]
                         col1, col2 = st.columns([3, 1])
                         with col1:
                             st.write(
                                 f"📄 Archivo del {row.get('fecha_hora', 'fecha desconocida')}"
                             )
                         with col2:
-                            if st.button(f"🗑️", key=f"delete_old_{idx}"):
-                                evidencia_data = {
-                                    'programa':
-                                    row.get('programa', user_data['programa']),
-                                    'subido_por':
-                                    row.get('subido_por', user_data['correo']),
-                                    'url_cloudinary':
-                                    row.get('url_cloudinary', ''),
-                                    'fecha_hora':
-                                    row.get('fecha_hora', '')
-                                }
-                                st.session_state[
-                                    f'confirm_delete_old_{idx}'] = evidencia_data
+                            if st.button(f"🗑️",
+                                         key=f"delete_old_{evidencia_id}"):
+                                pending.request(ELIMINAR, evidencia_id,
+                                                [evidencia_id])
                                 st.rerun()
 
                         # Confirmación para formato antiguo
-                        if st.session_state.get(f'confirm_delete_old_{idx}'):
-                            delete_info = st.session_state[
-                                f'confirm_delete_old_{idx}']
+                        if pending.get(ELIMINAR, evidencia_id):
+                            delete_info = {
+                                'programa':
+                                row.get('programa', user_data['programa']),
+                                'subido_por':
+                                row.get('subido_por', user_data['correo']),
+                                'url_cloudinary':
+                                row.get('url_cloudinary', ''),
+                                'fecha_hora':
+                                row.get('fecha_hora', '')
+                            }
                             st.warning(
                                 f"¿Eliminar archivo del {delete_info.get('fecha_hora', 'fecha desconocida')}?"
                             )
@@ -1165,16 +1611,16 @@ def show_user_panel():
 
                             with col_yes:
                                 if st.button("✅ Sí",
-                                             key=f"confirm_old_yes_{idx}"):
+                                             key=f"confirm_old_yes_{evidencia_id}"):
                                     with st.spinner("Eliminando archivo..."):
                                         success_sheets = delete_evidencia(
-                                            client, delete_info)
+                                            store, delete_info)
                                         success_gcs = True
 
                                         if delete_info.get('url_cloudinary'):
                                             success_gcs = delete_from_gcs(
                                                 delete_info['url_cloudinary'],
-                                                gcs_client)
+                                                storage_backend)
 
                                         if success_sheets and success_gcs:
                                             st.success(
@@ -1185,15 +1631,13 @@ def show_user_panel():
                                                 "❌ Error al eliminar el archivo"
                                             )
 
-                                        del st.session_state[
-                                            f'confirm_delete_old_{idx}']
+                                        pending.pop(ELIMINAR, evidencia_id)
                                         st.rerun()
 
                             with col_no:
                                 if st.button("❌ No",
-                                             key=f"confirm_old_no_{idx}"):
-                                    del st.session_state[
-                                        f'confirm_delete_old_{idx}']
+                                             key=f"confirm_old_no_{evidencia_id}"):
+                                    pending.pop(ELIMINAR, evidencia_id)
                                     st.rerun()
             else:
                 st.info("No hay evidencias registradas para tu programa aún.")
@@ -1204,6 +1648,8 @@ def show_user_panel():
 # Función para mostrar panel de admin con eliminación mejorada
 def show_admin_panel():
     """Muestra el panel para administradores con funcionalidad de eliminación"""
+    import pandas as pd
+
     user_data = st.session_state.user_data
 
     st.title("👨‍💼 Panel de Administrador")
@@ -1216,6 +1662,9 @@ def show_admin_panel():
         st.write(f"**Programa:** {user_data['programa']}")
         st.write(f"**Rol:** {user_data['rol']}")
 
+        with st.expander("⏱️ Perfilador"):
+            show_profiler_controls()
+
         if st.button("🔐 Cambiar Contraseña", key="admin_change_password"):
             st.session_state.show_change_password = True
             st.rerun()
@@ -1235,16 +1684,16 @@ def show_admin_panel():
         return
 
     # Inicializar servicios
-    client = init_google_sheets()
-    gcs_client = init_google_cloud_storage()
+    store = init_metadata_store()
+    storage_backend = init_storage_backend()
 
-    if not client:
-        st.error("Error al inicializar Google Sheets")
+    if not store:
+        st.error("Error al inicializar la base de datos")
         return
 
     # Obtener datos
-    evidencias_df = get_evidencias_data(client)
-    users_df = get_users_data(client)
+    evidencias_df = get_evidencias_data(store)
+    users_df = get_users_data(store)
 
     if evidencias_df.empty:
         st.info("No hay evidencias registradas en el sistema.")
@@ -1268,51 +1717,56 @@ def show_admin_panel():
 
     with col4:
         # Evidencias del último mes
-        today = datetime.now()
-        evidencias_df['fecha_hora'] = pd.to_datetime(
-            evidencias_df['fecha_hora'], errors='coerce')
-        recent_evidencias = evidencias_df[evidencias_df['fecha_hora'] > (
-            today - pd.Timedelta(days=30))]
-        st.metric("Evidencias (30 días)", len(recent_evidencias))
+        today = datetime.now(app_timezone())
+        st.metric("Evidencias (30 días)",
+                  count_since(evidencias_df, today - timedelta(days=30)))
 
     # Pestañas para organizar funcionalidades de admin
-    tab1, tab2 = st.tabs(["📋 Visualizar Evidencias", "🗑️ Gestión de Archivos"])
+    tab1, tab2, tab3, tab4 = st.tabs([
+        "📋 Visualizar Evidencias", "🗑️ Gestión de Archivos", "📈 Actividad",
+        "🩺 Calidad de Datos"
+    ])
 
     with tab1:
+        # Búsqueda de texto completo en todas las evidencias
+        st.header("🔎 Buscar Evidencias")
+        show_search_box(evidencias_df, storage_backend)
+
         # Filtros
         st.header("🔍 Filtrar Evidencias")
 
         # Verificar si existen las nuevas columnas
         has_new_columns = 'criterio' in evidencias_df.columns and 'dimension' in evidencias_df.columns
 
+        # Códigos por categoría: las opciones de los selectores y los
+        # filtros se resuelven sobre ellos sin copiar la tabla
+        filter_index = get_filter_index(evidencias_df)
+
         if has_new_columns:
             col1, col2, col3 = st.columns(3)
 
             with col1:
                 # Filtro por programa
-                programas_disponibles = ['Todos'] + sorted(
-                    evidencias_df['programa'].unique().tolist())
+                programas_disponibles = ['Todos'] + filter_index.options(
+                    'programa')
                 programa_seleccionado = st.selectbox("Filtrar por Programa",
                                                      programas_disponibles)
 
             with col2:
                 # Filtro por dimensión
-                dimensiones_disponibles = ['Todas'] + sorted(
-                    pd.Series(evidencias_df['dimension']).unique().tolist())
+                dimensiones_disponibles = ['Todas'] + filter_index.options(
+                    'dimension')
                 dimension_seleccionada = st.selectbox("Filtrar por Dimensión",
                                                       dimensiones_disponibles)
 
             with col3:
                 # Filtro por criterio
                 if dimension_seleccionada != 'Todas':
-                    criterios_filtrados = pd.Series(evidencias_df[
-                        evidencias_df['dimension'] == dimension_seleccionada]
-                                                    ['criterio']).unique()
-                    criterios_disponibles = ['Todos'] + sorted(
-                        criterios_filtrados.tolist())
+                    criterios_disponibles = ['Todos'] + filter_index.options(
+                        'criterio', dimension=dimension_seleccionada)
                 else:
-                    criterios_disponibles = ['Todos'] + sorted(
-                        pd.Series(evidencias_df['criterio']).unique().tolist())
+                    criterios_disponibles = ['Todos'] + filter_index.options(
+                        'criterio')
                 criterio_seleccionado = st.selectbox("Filtrar por Criterio",
                                                      criterios_disponibles)
         else:
@@ -1320,8 +1774,8 @@ def show_admin_panel():
 
             with col1:
                 # Filtro por programa
-                programas_disponibles = ['Todos'] + sorted(
-                    evidencias_df['programa'].unique().tolist())
+                programas_disponibles = ['Todos'] + filter_index.options(
+                    'programa')
                 programa_seleccionado = st.selectbox("Filtrar por Programa",
                                                      programas_disponibles)
 
@@ -1339,37 +1793,29 @@ def show_admin_panel():
         with col2:
             fecha_hasta = st.date_input("Hasta", value=today.date())
 
-        # Aplicar filtros
-        df_filtrado = evidencias_df.copy()
-
-        if programa_seleccionado != 'Todos':
-            df_filtrado = df_filtrado[df_filtrado['programa'] ==
-                                      programa_seleccionado]
-
-        if has_new_columns:
-            if dimension_seleccionada != 'Todas':
-                df_filtrado = df_filtrado[df_filtrado['dimension'] ==
-                                          dimension_seleccionada]
-
-            if criterio_seleccionado != 'Todos':
-                df_filtrado = df_filtrado[df_filtrado['criterio'] ==
-                                          criterio_seleccionado]
-
-        # Filtrar por fecha
-        if len(df_filtrado) > 0 and 'fecha_hora' in df_filtrado.columns:
-            fecha_serie = pd.to_datetime(df_filtrado['fecha_hora'],
-                                         errors='coerce')
-            df_filtrado = df_filtrado[(fecha_serie.dt.date >= fecha_desde)
-                                      & (fecha_serie.dt.date <= fecha_hasta)]
+        # Aplicar filtros: el rango de fechas se resuelve con búsqueda
+        # binaria y el resto con una sola máscara sobre ese rango
+        filtros = {
+            'programa':
+            None if programa_seleccionado == 'Todos' else programa_seleccionado,
+            'dimension':
+            None
+            if dimension_seleccionada == 'Todas' else dimension_seleccionada,
+            'criterio':
+            None if criterio_seleccionado == 'Todos' else criterio_seleccionado
+        }
+        vista = filter_index.apply(**filtros,
+                                   fecha_desde=fecha_desde,
+                                   fecha_hasta=fecha_hasta)
 
         # Mostrar resultados
         st.header("📋 Evidencias Filtradas")
 
-        if len(df_filtrado) > 0:
-            st.write(f"Mostrando {len(df_filtrado)} evidencias")
+        if len(vista) > 0:
+            st.write(f"Mostrando {len(vista)} evidencias")
 
             # Determinar columnas a mostrar basándose en las disponibles
-            if has_new_columns and 'nombre_archivo' in df_filtrado.columns:
+            if has_new_columns and 'nombre_archivo' in evidencias_df.columns:
                 columns_to_show = [
                     'programa', 'criterio', 'nombre_archivo', 'subido_por',
                     'fecha_hora', 'url_cloudinary'
@@ -1408,29 +1854,34 @@ def show_admin_panel():
 
             # Filtrar solo las columnas que existen
             available_columns = [
-                col for col in columns_to_show if col in df_filtrado.columns
+                col for col in columns_to_show if col in evidencias_df.columns
             ]
 
             # Tabla con todas las evidencias
-            st.dataframe(df_filtrado[available_columns],
+            st.dataframe(with_signed_urls(vista.rows(available_columns),
+                                          storage_backend),
                          column_config=column_config,
-                         use_container_width=True)
+                         use_container_width=True,
+                         hide_index=True)
+
+            # Exportar la vista filtrada (con las URLs canónicas, que no vencen)
+            show_export_controls(
+                vista, available_columns,
+                dict(filtros,
+                     fecha_desde=fecha_desde.isoformat(),
+                     fecha_hasta=fecha_hasta.isoformat()))
 
             # Gráficos de distribución
             col1, col2 = st.columns(2)
 
             with col1:
                 st.subheader("📈 Distribución por Programa")
-                programa_counts = pd.Series(
-                    df_filtrado['programa']).value_counts()
-                st.bar_chart(programa_counts)
+                st.bar_chart(vista.counts('programa'))
 
             if has_new_columns:
                 with col2:
                     st.subheader("📊 Distribución por Criterio")
-                    criterio_counts = pd.Series(
-                        df_filtrado['criterio']).value_counts()
-                    st.bar_chart(criterio_counts)
+                    st.bar_chart(vista.counts('criterio'))
         else:
             st.info("No se encontraron evidencias con los filtros aplicados.")
 
@@ -1440,7 +1891,7 @@ def show_admin_panel():
             "⚠️ Esta sección permite eliminar archivos de cualquier programa. Use con precaución."
         )
 
-        if gcs_client:
+        if storage_backend:
             # Mostrar funcionalidad de eliminación para administradores
             admin_delete_mode = st.checkbox(
                 "Activar modo eliminación de administrador")
@@ -1452,84 +1903,261 @@ def show_admin_panel():
 
                 # Selector de evidencias para eliminar
                 if len(evidencias_df) > 0:
-                    # Crear lista de archivos para selección múltiple por administrador
-                    selected_admin_files = []
+                    pending = get_pending_actions()
+                    evidencias_con_id = with_evidence_ids(evidencias_df)
+                    selected_ids = []
 
                     st.subheader("Seleccionar archivos para eliminar:")
 
-                    # Agrupar por programa para mejor organización
-                    for programa in sorted(evidencias_df['programa'].unique()):
+                    # Agrupar por programa; cada tabla guarda su selección
+                    # en un único estado de widget
+                    for programa in sorted(evidencias_con_id['programa'].unique()):
                         with st.expander(f"📁 {programa}"):
-                            programa_files = evidencias_df[
-                                evidencias_df['programa'] == programa]
-
-                            for idx, row in programa_files.iterrows():
-                                file_info = {
-                                    'programa':
-                                    row.get('programa', ''),
-                                    'subido_por':
-                                    row.get('subido_por', ''),
-                                    'url_cloudinary':
-                                    row.get('url_cloudinary', ''),
-                                    'fecha_hora':
-                                    row.get('fecha_hora', ''),
-                                    'criterio':
-                                    row.get('criterio', ''),
-                                    'dimension':
-                                    row.get('dimension', ''),
-                                    'nombre_archivo':
-                                    row.get('nombre_archivo', 'Sin nombre')
-                                }
-
-                                file_display = f"{file_info['nombre_archivo']} - {file_info['subido_por']} ({file_info['fecha_hora']})"
-
-                                if st.checkbox(file_display,
-                                               key=f"admin_select_{idx}"):
-                                    selected_admin_files.append(file_info)
+                            programa_files = evidencias_con_id[
+                                evidencias_con_id['programa'] == programa]
+                            columns_to_show = [
+                                col for col in [
+                                    'nombre_archivo', 'subido_por',
+                                    'fecha_hora', 'criterio'
+                                ] if col in programa_files.columns
+                            ]
+                            seleccion = st.dataframe(
+                                programa_files[columns_to_show],
+                                column_config={
+                                    'nombre_archivo': 'Nombre del Archivo',
+                                    'subido_por': 'Subido por',
+                                    'fecha_hora': 'Fecha y Hora',
+                                    'criterio': 'Criterio'
+                                },
+                                on_select="rerun",
+                                selection_mode="multi-row",
+                                key=f"admin_seleccion_{programa}",
+                                use_container_width=True,
+                                hide_index=True)
+                            selected_ids.extend(
+                                programa_files[EVIDENCIA_ID_COLUMN].iloc[
+                                    seleccion.selection.rows])
 
                     # Botón de eliminación para administrador
-                    if selected_admin_files:
+                    if selected_ids:
                         st.error(
-                            f"⚠️ {len(selected_admin_files)} archivo(s) seleccionado(s) para eliminación"
+                            f"⚠️ {len(selected_ids)} archivo(s) seleccionado(s) para eliminación"
                         )
 
                         if st.button("🗑️ ELIMINAR ARCHIVOS SELECCIONADOS",
                                      type="primary"):
-                            st.session_state[
-                                'admin_confirm_delete'] = selected_admin_files
+                            pending.request(ELIMINAR_SELECCION, 'admin',
+                                            selected_ids)
                             st.rerun()
 
-                        # Confirmación de eliminación de administrador
-                        if st.session_state.get('admin_confirm_delete'):
-                            files_to_delete = st.session_state[
-                                'admin_confirm_delete']
-                            st.error(
-                                f"🚨 CONFIRMACIÓN REQUERIDA: ¿Eliminar {len(files_to_delete)} archivo(s)?"
-                            )
-                            st.write("Esta acción NO se puede deshacer.")
+                    # Confirmación de eliminación de administrador
+                    action = pending.get(ELIMINAR_SELECCION, 'admin')
+                    if action:
+                        files_to_delete = evidence_records(
+                            evidencias_con_id, action.evidence_ids)
+                        st.error(
+                            f"🚨 CONFIRMACIÓN REQUERIDA: ¿Eliminar {len(files_to_delete)} archivo(s)?"
+                        )
+                        st.write("Esta acción NO se puede deshacer.")
 
-                            col_confirm, col_cancel = st.columns(2)
+                        col_confirm, col_cancel = st.columns(2)
 
-                            with col_confirm:
-                                if st.button("✅ CONFIRMAR ELIMINACIÓN",
-                                             key="admin_confirm_yes"):
-                                    delete_multiple_files(
-                                        files_to_delete, client, gcs_client)
-                                    del st.session_state[
-                                        'admin_confirm_delete']
-                                    st.rerun()
+                        with col_confirm:
+                            if st.button("✅ CONFIRMAR ELIMINACIÓN",
+                                         key="admin_confirm_yes"):
+                                pending.pop(ELIMINAR_SELECCION, 'admin')
+                                delete_multiple_files(files_to_delete, store,
+                                                      storage_backend)
+                                st.rerun()
 
-                            with col_cancel:
-                                if st.button("❌ CANCELAR",
-                                             key="admin_confirm_no"):
-                                    del st.session_state[
-                                        'admin_confirm_delete']
-                                    st.rerun()
+                        with col_cancel:
+                            if st.button("❌ CANCELAR",
+                                         key="admin_confirm_no"):
+                                pending.pop(ELIMINAR_SELECCION, 'admin')
+                                st.rerun()
                 else:
                     st.info("No hay archivos para gestionar")
         else:
             st.error("Error al conectar con el sistema de almacenamiento")
 
+    with tab3:
+        st.header("📈 Actividad de Subida")
+        show_activity(evidencias_df)
+
+    with tab4:
+        st.header("🩺 Calidad de Datos")
+        show_data_quality(evidencias_df, users_df, store)
+
+
+# Función para mostrar la revisión de calidad de las evidencias
+def show_data_quality(evidencias_df, users_df, store):
+    """Muestra las filas con problemas y las correcciones en bloque"""
+    report = get_quality_report(evidencias_df, users_df)
+    st.caption(f"{report.total_rows} fila(s) revisadas en "
+               f"{report.elapsed * 1000:.0f} ms; {report.offending_rows} con "
+               "al menos un problema.")
+    st.dataframe(report.summary(),
+                 column_config={
+                     'problema': 'Problema',
+                     'filas': 'Filas',
+                     'corregibles': 'Corregibles en bloque'
+                 },
+                 hide_index=True)
+    if not report.offending_rows:
+        st.success("✅ La tabla de evidencias no tiene problemas detectados")
+        return
+
+    issues = [issue for issue in ISSUE_LABELS if len(report.issues.get(issue, ()))]
+    issue = st.selectbox("Ver filas con el problema",
+                         issues,
+                         format_func=ISSUE_LABELS.get,
+                         key="calidad_problema")
+    rows_df = report.rows(evidencias_df, issue)
+    st.dataframe(rows_df.head(1000), hide_index=True)
+    if len(rows_df) > 1000:
+        st.caption(f"Se muestran 1000 de {len(rows_df)} filas.")
+    if issue == 'autor_desconocido':
+        st.info("Agregue a estos autores en la pestaña de usuarios; las "
+                "filas no se modifican.")
+
+    pending = get_pending_actions()
+    fixes = {
+        CORREGIR_NOMBRES:
+        (f"🩹 Corregir dimensión y criterio ({len(report.name_fixes.get('posiciones', ()))})",
+         bool(report.name_fixes)),
+        ELIMINAR_SIN_ENLACE:
+        (f"🗑️ Eliminar filas sin enlace ({len(report.issues.get('sin_enlace', ()))})",
+         len(report.issues.get('sin_enlace', ())) > 0),
+    }
+    columns = st.columns(len(fixes))
+    for column, (fix, (label, available)) in zip(columns, fixes.items()):
+        with column:
+            if st.button(label, disabled=not available, key=f"calidad_{fix}"):
+                pending.request(CORREGIR, fix, ())
+                st.rerun()
+
+    for fix in fixes:
+        if not pending.get(CORREGIR, fix):
+            continue
+        st.warning(f"¿Confirmar: {fixes[fix][0]}? Se escribe en un solo lote.")
+        col_confirm, col_cancel = st.columns(2)
+        with col_confirm:
+            if st.button("✅ Confirmar", key=f"calidad_{fix}_si"):
+                pending.pop(CORREGIR, fix)
+                try:
+                    if fix == CORREGIR_NOMBRES:
+                        changed = store.update_evidencias(
+                            name_fix_updates(evidencias_df, report))
+                        st.success(f"✅ {changed} fila(s) corregidas")
+                    else:
+                        changed = store.delete_evidencias(
+                            missing_link_records(evidencias_df, report))
+                        st.success(f"✅ {changed} fila(s) eliminadas")
+                except Exception as e:
+                    st.error(f"Error al aplicar la corrección: {str(e)}")
+                get_evidencias_data.clear()
+                # Los conteos de actividad se recalculan con los nuevos nombres
+                get_activity_rollups.clear()
+                st.rerun()
+        with col_cancel:
+            if st.button("❌ Cancelar", key=f"calidad_{fix}_no"):
+                pending.pop(CORREGIR, fix)
+                st.rerun()
+
+
+# Función para mostrar el perfilador en la barra lateral del administrador
+def show_profiler_controls():
+    """Permite perfilar las próximas ejecuciones de la sesión y ver el resultado"""
+    profile = st.session_state.get('perfil_en_curso')
+    st.number_input("Ejecuciones a perfilar",
+                    min_value=1,
+                    max_value=20,
+                    value=3,
+                    key="perfil_ejecuciones",
+                    disabled=profile is not None)
+    st.toggle("Perfilar próximas ejecuciones", key="perfilar_ejecuciones")
+    if profile is not None:
+        st.caption(f"Perfilando... quedan {profile.remaining} ejecución(es).")
+
+    resultado = st.session_state.get('perfil_resultado')
+    if resultado:
+        show_profile_results(*resultado)
+
+
+# Función para mostrar un perfil terminado
+def show_profile_results(profile, path):
+    """Muestra las funciones más costosas y el árbol de llamadas del perfil"""
+    import pandas as pd
+
+    total_ms = sum(profile.durations) * 1000
+    st.caption(f"{len(profile.durations)} ejecución(es), {total_ms:.0f} ms, "
+               f"{sum(profile.stacks.values())} muestras. Guardado en "
+               f"`{path}`")
+    spots = hot_spots(profile.stacks, limit=10)
+    if not spots:
+        st.info("Las ejecuciones fueron demasiado breves para tomar muestras.")
+        return
+    st.dataframe(pd.DataFrame(spots),
+                 column_config={
+                     'funcion':
+                     'Función',
+                     'propio_pct':
+                     st.column_config.NumberColumn('Propio %', format="%.1f"),
+                     'total_pct':
+                     st.column_config.NumberColumn('Total %', format="%.1f")
+                 },
+                 hide_index=True)
+    # Desglose tipo flame graph: cada nivel sangrado bajo su llamador
+    st.code("\n".join(
+        f"{'  ' * depth}{'█' * max(1, round(share * 20)):<20} "
+        f"{share * 100:5.1f}%  {frame.split(' (')[0]}"
+        for depth, frame, share in flame_rows(profile.stacks)),
+            language=None)
+
+
+# Función para iniciar el perfilado de la ejecución actual
+def start_rerun_profiling():
+    """Inicia el muestreo si un administrador pidió perfilar esta ejecución"""
+    state = st.session_state
+    if state.get('user_data', {}).get('rol') != 'admin':
+        return None
+    if state.pop('perfil_terminado', False):
+        # El interruptor se apaga antes de dibujarse en esta ejecución
+        state['perfilar_ejecuciones'] = False
+        return None
+    if not state.get('perfilar_ejecuciones'):
+        state.pop('perfil_en_curso', None)
+        return None
+    if state.get('perfil_en_curso') is None:
+        state['perfil_en_curso'] = RerunProfile(
+            state.get('perfil_ejecuciones', 3))
+    return SamplingProfiler(root_file=os.path.abspath(__file__)).start()
+
+
+# Función para terminar el perfilado de la ejecución actual
+def stop_rerun_profiling(sampler):
+    """Suma las muestras de la ejecución y guarda el perfil al completarse"""
+    if sampler is None:
+        return
+    state = st.session_state
+    stacks = sampler.stop()
+    profile = state.get('perfil_en_curso')
+    if profile is None:
+        return
+    profile.add(stacks, sampler.elapsed)
+    if profile.remaining > 0:
+        return
+
+    label = state['user_data']['correo'].split('@')[0]
+    try:
+        path = save_profile(os.getenv("PROFILE_DIR", "perfiles"), profile,
+                            label)
+    except OSError as e:
+        path = f"no se pudo guardar: {e}"
+    state['perfil_resultado'] = (profile, path)
+    state['perfil_terminado'] = True
+    del state['perfil_en_curso']
+
 
 # Función principal
 def main():
@@ -1539,23 +2167,33 @@ def main():
     if 'logged_in' not in st.session_state:
         st.session_state.logged_in = False
 
-    # Verificar si el usuario está logueado
-    if not st.session_state.logged_in:
-        show_login()
-    else:
-        # Mostrar panel según el rol
-        user_role = st.session_state.user_data.get('rol', '')
-
-        if user_role == 'admin':
-            show_admin_panel()
-        elif user_role == 'usuario':
-            show_user_panel()
+    # Perfilado pedido por un administrador desde la barra lateral
+    sampler = start_rerun_profiling()
+    try:
+        # Verificar si el usuario está logueado
+        if not st.session_state.logged_in:
+            show_login()
         else:
-            st.error("Rol de usuario no reconocido")
-            # Limpiar session state
-            for key in st.session_state.keys():
-                del st.session_state[key]
-            st.rerun()
+            # Mostrar panel según el rol
+            user_role = st.session_state.user_data.get('rol', '')
+
+            if user_role == 'admin':
+                show_admin_panel()
+            elif user_role == 'usuario':
+                show_user_panel()
+            else:
+                st.error("Rol de usuario no reconocido")
+                # Limpiar session state
+                for key in st.session_state.keys():
+                    del st.session_state[key]
+                st.rerun()
+    finally:
+        stop_rerun_profiling(sampler)
+
+    # El perfil se completó en esta ejecución: mostrarlo sin esperar otra
+    if sampler is not None and st.session_state.get('perfil_terminado'):
+        with st.sidebar:
+            show_profile_results(*st.session_state['perfil_resultado'])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,579 @@
+"""Repositorios de metadatos de usuarios y evidencias.
+
+La aplicación trabaja contra la interfaz ``MetadataStore``; la implementación
+concreta (Google Sheets o SQLite embebido) se elige por configuración con la
+variable de entorno ``METADATA_BACKEND``. pandas se importa dentro de los
+métodos de lectura para no cargarlo en las ejecuciones que no lo necesitan.
+"""
+import abc
+import os
+import sqlite3
+import threading
+
+# Nombre de la hoja de cálculo en Google Sheets
+SPREADSHEET_NAME = "sistema_evidencias"
+
+# Columnas de la pestaña "evidencias", en el orden de la hoja
+EVIDENCIAS_COLUMNS = [
+    'programa', 'subido_por', 'url_cloudinary', 'fecha_hora', 'criterio',
+    'dimension', 'nombre_archivo'
+]
+
+# Columnas de la pestaña "usuarios", en el orden de la hoja
+USUARIOS_COLUMNS = ['correo', 'programa', 'rol', 'contraseña']
+
+
+class MetadataError(Exception):
+    """Error de configuración u operación del repositorio de metadatos"""
+
+
+# Función para ubicar varias evidencias en una lista de registros
+def match_rows(records, evidencias_data):
+    """Retorna, para cada diccionario, la posición del primer registro que
+    coincide en todos sus campos (comparados como texto sin espacios en los
+    extremos) y que no fue elegido antes, o None si no hay.
+
+    Los registros se indexan una vez por cada conjunto de campos consultado,
+    de modo que ubicar n evidencias en m filas cuesta O(n + m) y no O(n × m).
+    """
+    from collections import deque
+
+    indexes = {}
+    chosen = set()
+    positions = []
+    for evidencia_data in evidencias_data:
+        fields = tuple(sorted(evidencia_data))
+        index = indexes.get(fields)
+        if index is None:
+            index = {}
+            for position, record in enumerate(records):
+                key = tuple(
+                    str(record.get(field, '')).strip() for field in fields)
+                index.setdefault(key, deque()).append(position)
+            indexes[fields] = index
+        candidates = index.get(
+            tuple(str(evidencia_data[field]).strip() for field in fields),
+            ())
+        # Las filas ya elegidas con otro conjunto de campos se saltan
+        while candidates and candidates[0] in chosen:
+            candidates.popleft()
+        position = candidates.popleft() if candidates else None
+        if position is not None:
+            chosen.add(position)
+        positions.append(position)
+    return positions
+
+
+# Función para normalizar filas de evidencias
+def evidencia_row(evidencia):
+    """Retorna la fila de una evidencia en el orden de EVIDENCIAS_COLUMNS"""
+    return [evidencia.get(column, '') for column in EVIDENCIAS_COLUMNS]
+
+
+class MetadataStore(abc.ABC):
+    """Interfaz común de los repositorios de usuarios y evidencias"""
+
+    name = ""
+
+    # Cambios hechos por este proceso que no son agregados al final de la
+    # tabla de evidencias (una lectura incremental no los vería)
+    rewrites = 0
+
+    @abc.abstractmethod
+    def get_users(self):
+        """Retorna un DataFrame con todos los usuarios"""
+
+    @abc.abstractmethod
+    def get_evidencias(self, programa=None, columns=None):
+        """Retorna un DataFrame con las evidencias (solo las del programa, si se
+        indica) y solo con las columnas pedidas (todas si columns es None)"""
+
+    def evidencias_version(self):
+        """Retorna un sello barato que cambia con cada modificación de las
+        evidencias, o None si el repositorio no lo ofrece"""
+        return None
+
+    def get_evidencias_after(self, known_rows, last_row):
+        """Retorna las evidencias agregadas después de las primeras known_rows.
+
+        last_row son los valores de la fila known_rows de la lectura anterior;
+        si ya no coincide (se eliminaron o movieron filas) retorna None y
+        corresponde una lectura completa. También retorna None si el
+        repositorio no permite lecturas incrementales.
+        """
+        return None
+
+    @abc.abstractmethod
+    def add_evidencias(self, evidencias):
+        """Agrega varias evidencias (diccionarios) en una sola escritura"""
+
+    def add_evidencia(self, evidencia):
+        """Agrega una evidencia"""
+        self.add_evidencias([evidencia])
+
+    @abc.abstractmethod
+    def delete_evidencias(self, evidencias_data):
+        """Elimina la primera fila que coincide con cada diccionario; retorna
+        la cantidad de filas eliminadas"""
+
+    def delete_evidencia(self, evidencia_data):
+        """Elimina la primera fila que coincide; retorna True si existía"""
+        return self.delete_evidencias([evidencia_data]) == 1
+
+    @abc.abstractmethod
+    def update_evidencias(self, updates):
+        """Aplica cada par (evidencia, cambios) a la primera fila que coincide
+        con la evidencia; retorna la cantidad de filas actualizadas"""
+
+    @abc.abstractmethod
+    def replace_all(self, users_df, evidencias_df):
+        """Reemplaza el contenido completo de usuarios y evidencias"""
+
+    @abc.abstractmethod
+    def update_password(self, correo, new_password):
+        """Actualiza la contraseña del usuario; retorna False si no existe"""
+
+
+class SheetsMetadataStore(MetadataStore):
+    """Repositorio sobre la hoja de cálculo de Google Sheets"""
+
+    name = "sheets"
+
+    # Metadatos del archivo en Drive: la versión cambia con cada edición
+    DRIVE_FILE_URL = "https://www.googleapis.com/drive/v3/files/{id}"
+
+    def __init__(self, client, spreadsheet_name=SPREADSHEET_NAME):
+        self.client = client
+        self.spreadsheet_name = spreadsheet_name
+        self._spreadsheet_handle = None
+        self._evidencias_headers = None
+
+    def _spreadsheet(self):
+        # Abrir por nombre requiere una búsqueda en Drive; se hace una vez
+        if self._spreadsheet_handle is None:
+            self._spreadsheet_handle = self.client.open(self.spreadsheet_name)
+        return self._spreadsheet_handle
+
+    def _worksheet(self, name):
+        return self._spreadsheet().worksheet(name)
+
+    def _headers(self):
+        """Encabezados de la pestaña evidencias (se leen una vez)"""
+        if self._evidencias_headers is None:
+            response = self._spreadsheet().values_get("evidencias!1:1")
+            self._evidencias_headers = (response.get("values") or [[]])[0]
+        return self._evidencias_headers
+
+    @staticmethod
+    def _column_letter(position):
+        from gspread.utils import rowcol_to_a1
+
+        return rowcol_to_a1(1, position + 1).rstrip("0123456789")
+
+    def _projection(self, columns):
+        """Columnas pedidas que existen en la hoja (todas si columns es None)"""
+        headers = self._headers()
+        if columns is None:
+            return [header for header in headers if header]
+        return [column for column in columns if column in headers]
+
+    def _read_columns(self, columns=None):
+        """Lee solo las columnas indicadas con un único batch_get por columnas"""
+        import pandas as pd
+
+        wanted = self._projection(columns)
+        headers = self._headers()
+        if not wanted:
+            return pd.DataFrame(columns=wanted)
+        ranges = []
+        for column in wanted:
+            letter = self._column_letter(headers.index(column))
+            ranges.append(f"evidencias!{letter}1:{letter}")
+        response = self._spreadsheet().values_batch_get(
+            ranges, params={"majorDimension": "COLUMNS"})
+
+        arrays = []
+        for column, value_range in zip(wanted, response.get("valueRanges", [])):
+            values = (value_range.get("values") or [[]])[0]
+            if not values or values[0] != column:
+                # Alguien movió columnas: releer encabezados la próxima vez
+                self._evidencias_headers = None
+                raise MetadataError("Los encabezados de la hoja cambiaron")
+            arrays.append(values[1:])
+
+        # La API omite las celdas vacías al final de cada columna
+        length = max(len(values) for values in arrays)
+        return pd.DataFrame(
+            {
+                column: values + [''] * (length - len(values))
+                for column, values in zip(wanted, arrays)
+            },
+            columns=wanted)
+
+    def get_users(self):
+        import pandas as pd
+
+        return pd.DataFrame(self._worksheet("usuarios").get_all_records())
+
+    def get_evidencias(self, programa=None, columns=None):
+        # Sheets no filtra filas en la API de valores: se leen solo las
+        # columnas necesarias (con la del programa) y se filtra aquí
+        read_columns = columns
+        if programa is not None and columns is not None:
+            read_columns = list(dict.fromkeys(['programa'] + list(columns)))
+        try:
+            df = self._read_columns(read_columns)
+        except MetadataError:
+            df = self._read_columns(read_columns)  # Encabezados releídos
+
+        if programa is not None and 'programa' in df.columns:
+            df = df[df['programa'] == programa].reset_index(drop=True)
+        if columns is not None:
+            df = df[[column for column in columns if column in df.columns]]
+        return df
+
+    def evidencias_version(self):
+        # Una consulta a Drive no cuenta en la cuota de lectura de Sheets; la
+        # versión es la de todo el libro (incluye la pestaña de usuarios)
+        response = self.client.http_client.request(
+            "get",
+            self.DRIVE_FILE_URL.format(id=self._spreadsheet().id),
+            params={
+                "fields": "version",
+                "supportsAllDrives": "true"
+            })
+        return response.json().get("version")
+
+    def get_evidencias_after(self, known_rows, last_row):
+        import pandas as pd
+
+        wanted = self._projection(None)
+        if not known_rows or not wanted:
+            return None
+        headers = self._headers()
+        last = self._column_letter(len(headers) - 1)
+        known_end = known_rows + 1  # La fila 1 es el encabezado
+        # Encabezados, última fila conocida y filas nuevas en una sola llamada
+        response = self._spreadsheet().values_batch_get([
+            f"evidencias!A1:{last}1",
+            f"evidencias!A{known_end}:{last}{known_end}",
+            f"evidencias!A{known_end + 1}:{last}"
+        ])
+        header_range, known_range, new_range = (
+            response.get("valueRanges", []) + [{}, {}, {}])[:3]
+
+        if (header_range.get("values") or [[]])[0] != headers:
+            self._evidencias_headers = None
+            return None
+        positions = [headers.index(column) for column in wanted]
+
+        def project(row):
+            # La API omite las celdas vacías al final de cada fila
+            return [row[p] if p < len(row) else '' for p in positions]
+
+        if project((known_range.get("values") or [[]])[0]) != [
+                str(value) for value in last_row
+        ]:
+            return None
+        return pd.DataFrame(
+            [project(row) for row in new_range.get("values", [])],
+            columns=wanted)
+
+    def add_evidencias(self, evidencias):
+        if not evidencias:
+            return
+        rows = [evidencia_row(evidencia) for evidencia in evidencias]
+        self._worksheet("evidencias").append_rows(rows)
+
+    def delete_evidencias(self, evidencias_data):
+        worksheet = self._worksheet("evidencias")
+        all_records = worksheet.get_all_records()
+
+        # Buscar la fila de cada evidencia sin repetir filas ya elegidas
+        # (las filas empiezan en 1 y hay encabezado)
+        rows_to_delete = {
+            position + 2
+            for position in match_rows(all_records, evidencias_data)
+            if position is not None
+        }
+
+        if rows_to_delete:
+            # Eliminar de abajo hacia arriba en una sola llamada a la API
+            requests = [{
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": worksheet.id,
+                        "dimension": "ROWS",
+                        "startIndex": row_num - 1,
+                        "endIndex": row_num
+                    }
+                }
+            } for row_num in sorted(rows_to_delete, reverse=True)]
+            worksheet.spreadsheet.batch_update({"requests": requests})
+            self.rewrites += 1
+
+        return len(rows_to_delete)
+
+    def update_evidencias(self, updates):
+        from gspread.utils import rowcol_to_a1
+
+        worksheet = self._worksheet("evidencias")
+        all_records = worksheet.get_all_records()
+        headers = worksheet.row_values(1)
+
+        # Buscar la fila de cada evidencia sin repetir filas ya elegidas,
+        # con un solo índice de la hoja para todas las actualizaciones
+        positions = match_rows(all_records,
+                               [evidencia_data for evidencia_data, _ in updates])
+        updated_rows = set()
+        cells = []
+        for position, (_, changes) in zip(positions, updates):
+            if position is None:
+                continue
+            row_num = position + 2  # Las filas empiezan en 1 y hay encabezado
+            updated_rows.add(row_num)
+            cells.extend({
+                "range": rowcol_to_a1(row_num, headers.index(column) + 1),
+                "values": [[value]]
+            } for column, value in changes.items() if column in headers)
+
+        if cells:
+            # Todas las celdas en una sola llamada a la API
+            worksheet.batch_update(cells)
+            self.rewrites += 1
+        return len(updated_rows)
+
+    def replace_all(self, users_df, evidencias_df):
+        for name, df, columns in (("usuarios", users_df, USUARIOS_COLUMNS),
+                                  ("evidencias", evidencias_df,
+                                   EVIDENCIAS_COLUMNS)):
+            if df is None:
+                continue
+            columns = [c for c in columns if c in df.columns] or list(
+                df.columns)
+            values = [columns] + df[columns].fillna('').astype(
+                str).values.tolist()
+            worksheet = self._worksheet(name)
+            worksheet.clear()
+            worksheet.update(values, "A1")
+        self.rewrites += 1
+
+    def update_password(self, correo, new_password):
+        worksheet = self._worksheet("usuarios")
+        all_records = worksheet.get_all_records()
+
+        # Encontrar la fila del usuario
+        for i, record in enumerate(all_records):
+            if str(record['correo']).lower() == correo.lower():
+                row_num = i + 2  # +2 porque las filas empiezan en 1 y hay encabezado
+
+                # Verificar si existe la columna contraseña
+                headers = worksheet.row_values(1)
+                if 'contraseña' not in headers:
+                    # Agregar columna contraseña si no existe
+                    worksheet.update_cell(1, len(headers) + 1, 'contraseña')
+                    col_num = len(headers) + 1
+                else:
+                    col_num = headers.index('contraseña') + 1
+
+                # Actualizar contraseña
+                worksheet.update_cell(row_num, col_num, new_password)
+                return True
+
+        return False
+
+
+class SQLiteMetadataStore(MetadataStore):
+    """Repositorio sobre una base de datos SQLite embebida"""
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            correo TEXT PRIMARY KEY COLLATE NOCASE,
+            programa TEXT NOT NULL DEFAULT '',
+            rol TEXT NOT NULL DEFAULT '',
+            "contraseña" TEXT
+        );
+        CREATE TABLE IF NOT EXISTS evidencias (
+            id INTEGER PRIMARY KEY,
+            programa TEXT NOT NULL DEFAULT '',
+            subido_por TEXT NOT NULL DEFAULT '',
+            url_cloudinary TEXT NOT NULL DEFAULT '',
+            fecha_hora TEXT NOT NULL DEFAULT '',
+            criterio TEXT NOT NULL DEFAULT '',
+            dimension TEXT NOT NULL DEFAULT '',
+            nombre_archivo TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_evidencias_programa_criterio
+            ON evidencias (programa, criterio);
+        CREATE INDEX IF NOT EXISTS idx_evidencias_fecha_hora
+            ON evidencias (fecha_hora);
+        CREATE INDEX IF NOT EXISTS idx_evidencias_subido_por
+            ON evidencias (subido_por);
+        CREATE INDEX IF NOT EXISTS idx_evidencias_url
+            ON evidencias (url_cloudinary);
+    """
+
+    # Versión 1: los valores de evidencias se guardan sin espacios en los
+    # extremos, para comparar con = y usar los índices
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+            if conn.execute("PRAGMA user_version").fetchone()[0] < \
+                    self.SCHEMA_VERSION:
+                # Bases creadas antes de recortar al insertar: una sola vez
+                conn.execute("UPDATE evidencias SET " + ", ".join(
+                    f"{column} = TRIM({column})"
+                    for column in EVIDENCIAS_COLUMNS))
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _connection(self):
+        """Retorna la conexión del hilo actual (una por hilo de Streamlit)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_users(self):
+        import pandas as pd
+
+        return pd.read_sql_query(
+            'SELECT correo, programa, rol, "contraseña" FROM usuarios '
+            'ORDER BY rowid', self._connection())
+
+    def get_evidencias(self, programa=None, columns=None):
+        import pandas as pd
+
+        selected = EVIDENCIAS_COLUMNS if columns is None else [
+            column for column in columns if column in EVIDENCIAS_COLUMNS
+        ]
+        if not selected:
+            return pd.DataFrame()
+        sql = f"SELECT {', '.join(selected)} FROM evidencias"
+        params = ()
+        if programa is not None:
+            # Usa el índice por programa
+            sql += " WHERE programa = ?"
+            params = (programa, )
+        return pd.read_sql_query(sql + " ORDER BY id",
+                                 self._connection(),
+                                 params=params)
+
+    def add_evidencias(self, evidencias):
+        if not evidencias:
+            return
+        rows = [[str(value).strip() for value in evidencia_row(evidencia)]
+                for evidencia in evidencias]
+        placeholders = ", ".join("?" for _ in EVIDENCIAS_COLUMNS)
+        with self._connection() as conn:
+            conn.executemany(
+                f"INSERT INTO evidencias ({', '.join(EVIDENCIAS_COLUMNS)}) "
+                f"VALUES ({placeholders})", rows)
+
+    def delete_evidencias(self, evidencias_data):
+        deleted = 0
+        with self._connection() as conn:
+            for evidencia_data in evidencias_data:
+                columns = [
+                    key for key in evidencia_data
+                    if key in EVIDENCIAS_COLUMNS
+                ]
+                if not columns:
+                    continue
+                where = " AND ".join(f"{column} = ?" for column in columns)
+                params = [str(evidencia_data[column]).strip()
+                          for column in columns]
+                cursor = conn.execute(
+                    "DELETE FROM evidencias WHERE id = (SELECT id FROM "
+                    f"evidencias WHERE {where} ORDER BY id LIMIT 1)", params)
+                deleted += cursor.rowcount
+        return deleted
+
+    def update_evidencias(self, updates):
+        updated = 0
+        with self._connection() as conn:
+            for evidencia_data, changes in updates:
+                columns = [
+                    key for key in evidencia_data
+                    if key in EVIDENCIAS_COLUMNS
+                ]
+                assignments = [
+                    column for column in changes if column in EVIDENCIAS_COLUMNS
+                ]
+                if not columns or not assignments:
+                    continue
+                where = " AND ".join(f"{column} = ?" for column in columns)
+                params = [str(changes[column]).strip()
+                          for column in assignments] + [
+                    str(evidencia_data[column]).strip() for column in columns
+                ]
+                cursor = conn.execute(
+                    f"UPDATE evidencias SET "
+                    f"{', '.join(f'{column} = ?' for column in assignments)} "
+                    "WHERE id = (SELECT id FROM evidencias WHERE "
+                    f"{where} ORDER BY id LIMIT 1)", params)
+                updated += cursor.rowcount
+        return updated
+
+    def replace_all(self, users_df, evidencias_df):
+        # Toda la carga ocurre en una sola transacción
+        with self._connection() as conn:
+            if users_df is not None:
+                conn.execute("DELETE FROM usuarios")
+                users = users_df.reindex(columns=USUARIOS_COLUMNS).fillna('')
+                conn.executemany(
+                    'INSERT OR REPLACE INTO usuarios (correo, programa, rol, '
+                    '"contraseña") VALUES (?, ?, ?, ?)',
+                    users.astype(str).itertuples(index=False, name=None))
+            if evidencias_df is not None:
+                conn.execute("DELETE FROM evidencias")
+                evidencias = evidencias_df.reindex(
+                    columns=EVIDENCIAS_COLUMNS).fillna('')
+                placeholders = ", ".join("?" for _ in EVIDENCIAS_COLUMNS)
+                conn.executemany(
+                    f"INSERT INTO evidencias ({', '.join(EVIDENCIAS_COLUMNS)}) "
+                    f"VALUES ({placeholders})",
+                    evidencias.astype(str).apply(
+                        lambda column: column.str.strip()).itertuples(
+                            index=False, name=None))
+
+    def update_password(self, correo, new_password):
+        with self._connection() as conn:
+            cursor = conn.execute(
+                'UPDATE usuarios SET "contraseña" = ? WHERE correo = ?',
+                (new_password, correo))
+        return cursor.rowcount > 0
+
+
+# Función para crear el repositorio configurado
+def create_metadata_store(sheets_client=None, config=None):
+    """Crea el repositorio indicado por METADATA_BACKEND (sheets o sqlite)"""
+    config = os.environ if config is None else config
+    backend_name = config.get("METADATA_BACKEND", "sheets").strip().lower()
+
+    if backend_name == "sqlite":
+        return SQLiteMetadataStore(config.get("SQLITE_PATH", "evidencias.db"))
+
+    if backend_name == "sheets":
+        if sheets_client is None:
+            raise MetadataError("No hay cliente de Google Sheets disponible")
+        return SheetsMetadataStore(sheets_client)
+
+    raise MetadataError(f"Repositorio de metadatos desconocido: {backend_name}")
+
+
+# Función para migrar los datos de Google Sheets a SQLite
+def migrate_to_sqlite(source, target):
+    """Copia usuarios y evidencias del repositorio origen a SQLite en bloque"""
+    users_df = source.get_users()
+    evidencias_df = source.get_evidencias()
+    target.replace_all(users_df, evidencias_df)
+    return len(users_df), len(evidencias_df)
@@ -0,0 +1,263 @@
+"""Vistas previas (miniaturas) de las evidencias.
+
+Al subir una imagen o un PDF se genera una miniatura JPEG pequeña que se
+guarda junto al objeto original, con el sufijo ``PREVIEW_SUFFIX``. Las
+miniaturas leídas del almacenamiento se conservan en una caché LRU en disco
+acotada por tamaño, de modo que revisar un criterio no obliga a descargar los
+archivos completos.
+
+Pillow es obligatorio para generar miniaturas; para la primera página de los
+PDF se usa pypdfium2 si está instalado y, si no, la imagen más grande incrustada
+en esa página (vía pypdf).
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PREVIEW_SUFFIX = ".preview.jpg"
+PREVIEW_SIZE = (320, 320)
+PREVIEW_QUALITY = 80
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Tiempo durante el cual se recuerda que un objeto no tiene vista previa
+MISSING_TTL = 600
+
+
+# Función para obtener la ruta de la vista previa de un objeto
+def preview_path(path):
+    """Retorna la ruta de la miniatura asociada a la ruta del objeto"""
+    return path + PREVIEW_SUFFIX
+
+
+# Función para saber si una ruta corresponde a una vista previa
+def is_preview_path(path):
+    """Indica si la ruta es la miniatura de otro objeto"""
+    return path.endswith(PREVIEW_SUFFIX)
+
+
+# Función para obtener la ruta del objeto original de una vista previa
+def original_path(path):
+    """Retorna la ruta del objeto del que proviene la miniatura"""
+    return path[:-len(PREVIEW_SUFFIX)]
+
+
+def _render_pdf_first_page(fileobj):
+    """Retorna la primera página del PDF como imagen de Pillow, o None"""
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(fileobj)
+        try:
+            if len(pdf) == 0:
+                return None
+            page = pdf[0]
+            # Escala para que el lado mayor quede cerca del tamaño final
+            width, height = page.get_size()
+            scale = max(PREVIEW_SIZE) / max(width, height, 1) * 2
+            return page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    reader = PdfReader(fileobj)
+    if not reader.pages:
+        return None
+    images = [image.image for image in reader.pages[0].images]
+    images = [image for image in images if image is not None]
+    if not images:
+        return None
+    return max(images, key=lambda image: image.width * image.height)
+
+
+# Función para generar la miniatura de un archivo
+def generate_preview(fileobj, filename):
+    """Genera una miniatura JPEG de una imagen o de la primera página de un PDF.
+
+    Retorna los bytes de la miniatura, o None si el tipo de archivo no tiene
+    vista previa o no se pudo generar.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in IMAGE_EXTENSIONS + (".pdf", ):
+        return None
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        fileobj.seek(0)
+        if extension == ".pdf":
+            image = _render_pdf_first_page(fileobj)
+            if image is None:
+                return None
+        else:
+            image = Image.open(fileobj)
+            # En JPEG, draft decodifica directamente a una escala reducida
+            image.draft("RGB", PREVIEW_SIZE)
+        image.thumbnail(PREVIEW_SIZE)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=PREVIEW_QUALITY, optimize=True)
+        return out.getvalue()
+    except Exception:
+        # Un archivo dañado no debe impedir la subida
+        return None
+    finally:
+        fileobj.seek(0)
+
+
+# Función para generar y guardar la miniatura junto al objeto
+def store_preview(storage_backend, path, fileobj, filename, cache=None):
+    """Genera la miniatura del archivo y la sube junto al objeto; retorna los bytes"""
+    data = generate_preview(fileobj, filename)
+    if data is None:
+        return None
+    storage_backend.put(preview_path(path),
+                        io.BytesIO(data),
+                        content_type="image/jpeg")
+    if cache is not None:
+        cache.put(storage_backend.name, preview_path(path), data)
+    return data
+
+
+class PreviewCache:
+    """Caché LRU de miniaturas en disco, acotada por tamaño total"""
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # archivo -> tamaño, del más antiguo al más reciente
+        self._total = 0
+        self._missing = {}  # (backend, ruta) -> instante hasta el que se omite
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Reconstruir el orden LRU a partir de la fecha de último acceso
+        found = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".jpg"):
+                continue
+            try:
+                info = os.stat(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                continue
+            found.append((info.st_atime, filename, info.st_size))
+        for _, filename, size in sorted(found):
+            self._entries[filename] = size
+            self._total += size
+        self._evict()
+
+    @staticmethod
+    def _filename(backend_name, path):
+        digest = hashlib.sha1(f"{backend_name}:{path}".encode("utf-8"))
+        return digest.hexdigest() + ".jpg"
+
+    def get(self, backend_name, path):
+        """Retorna los bytes en caché de la miniatura, o None"""
+        filename = self._filename(backend_name, path)
+        with self._lock:
+            if filename not in self._entries:
+                return None
+            self._entries.move_to_end(filename)
+        try:
+            with open(os.path.join(self.directory, filename), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop(filename, 0)
+            return None
+
+    def put(self, backend_name, path, data):
+        """Guarda la miniatura en la caché y descarta las menos usadas"""
+        filename = self._filename(backend_name, path)
+        target = os.path.join(self.directory, filename)
+        temp_path = f"{target}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, target)
+        with self._lock:
+            self._total -= self._entries.pop(filename, 0)
+            self._entries[filename] = len(data)
+            self._total += len(data)
+            self._missing.pop((backend_name, path), None)
+            self._evict()
+
+    def discard(self, backend_name, path):
+        """Elimina la miniatura de la caché (por ejemplo, al borrar el objeto)"""
+        filename = self._filename(backend_name, path)
+        with self._lock:
+            self._total -= self._entries.pop(filename, 0)
+        try:
+            os.remove(os.path.join(self.directory, filename))
+        except FileNotFoundError:
+            pass
+
+    def mark_missing(self, backend_name, path):
+        """Recuerda por un tiempo que el objeto no tiene miniatura"""
+        with self._lock:
+            self._missing[(backend_name, path)] = time.monotonic() + MISSING_TTL
+
+    def is_missing(self, backend_name, path):
+        """Indica si se sabe que el objeto no tiene miniatura"""
+        with self._lock:
+            until = self._missing.get((backend_name, path))
+            if until is None:
+                return False
+            if until < time.monotonic():
+                del self._missing[(backend_name, path)]
+                return False
+            return True
+
+    def _evict(self):
+        """Descarta las miniaturas menos usadas hasta respetar el límite"""
+        while self._total > self.max_bytes and self._entries:
+            filename, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except FileNotFoundError:
+                pass
+
+
+# Función para obtener las miniaturas de varios objetos
+def get_previews(storage_backend, paths, cache, workers=8):
+    """Retorna {ruta del objeto: bytes de la miniatura} para los que la tienen"""
+    previews = {}
+    pending = []
+    for path in dict.fromkeys(paths):
+        target = preview_path(path)
+        data = cache.get(storage_backend.name, target)
+        if data is not None:
+            previews[path] = data
+        elif not cache.is_missing(storage_backend.name, target):
+            pending.append(path)
+
+    def fetch(path):
+        target = preview_path(path)
+        try:
+            data = b"".join(storage_backend.open_read(target))
+        except Exception:
+            # Objetos subidos antes de las vistas previas no tienen miniatura
+            cache.mark_missing(storage_backend.name, target)
+            return path, None
+        cache.put(storage_backend.name, target, data)
+        return path, data
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            for path, data in executor.map(fetch, pending):
+                if data is not None:
+                    previews[path] = data
+    return previews
@@ -0,0 +1,319 @@
+"""Reconciliación entre el almacenamiento de archivos y la tabla de evidencias.
+
+Como la subida del archivo y el registro de la evidencia son dos pasos no
+transaccionales, pueden quedar objetos sin fila (huérfanos) o filas cuyo
+archivo ya no existe (colgantes). Este módulo los detecta listando el
+almacenamiento en paralelo por prefijo de programa y cruzando ambos lados con
+conjuntos hash, y opcionalmente los corrige por lotes.
+
+Si la tabla se pierde o se daña, ``rebuild_evidencias`` la regenera solo desde
+el almacenamiento: cada objeto lleva en sus metadatos los datos de su
+evidencia (ver ``evidence_metadata``). Para los objetos subidos antes de eso,
+la clasificación se deduce de la ruta.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from criterios import find_criterio, find_dimension
+from metadata_store import EVIDENCIAS_COLUMNS
+from previews import is_preview_path, original_path
+from storage_backend import clean_path_component
+from time_index import LEGACY_FECHA_HORA_FORMAT, parse_fecha_hora
+
+# Prefijo de fecha que build_object_path antepone al nombre del archivo
+PATH_TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+# Objetos más recientes que esto se ignoran: su fila puede estar en camino
+DEFAULT_MIN_AGE = timedelta(hours=1)
+
+RECONCILE_COLUMNS = ['programa', 'url_cloudinary', 'fecha_hora', 'nombre_archivo']
+
+
+@dataclass
+class ReconciliationReport:
+    """Resultado de una reconciliación"""
+    orphan_objects: list = field(default_factory=list)
+    dangling_rows: list = field(default_factory=list)
+    total_objects: int = 0
+    total_rows: int = 0
+    elapsed: float = 0.0
+
+    def summary(self):
+        """Retorna un resumen legible del reporte"""
+        return (f"{self.total_objects} objeto(s) y {self.total_rows} fila(s) "
+                f"revisados en {self.elapsed:.1f} s: "
+                f"{len(self.orphan_objects)} objeto(s) huérfano(s), "
+                f"{len(self.dangling_rows)} fila(s) sin archivo")
+
+
+# Función para listar objetos de varios prefijos en paralelo
+def list_object_names(storage_backend, prefixes, workers=8, min_age=None):
+    """Retorna (rutas, rutas recientes) de los objetos bajo los prefijos.
+
+    Los objetos modificados hace menos de min_age quedan en el segundo
+    conjunto: su fila puede estar en camino, así que no deben tratarse como
+    huérfanos, pero sí existen.
+    """
+    cutoff = datetime.now(timezone.utc) - min_age if min_age else None
+
+    def list_prefix(prefix):
+        names = set()
+        recent = set()
+        # list() itera página por página sin materializar el listado completo
+        for stored in storage_backend.list(prefix):
+            if cutoff and stored.updated and stored.updated > cutoff:
+                recent.add(stored.name)
+            else:
+                names.add(stored.name)
+        return names, recent
+
+    object_names = set()
+    recent_names = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for names, recent in executor.map(list_prefix, prefixes):
+            object_names |= names
+            recent_names |= recent
+    return object_names, recent_names
+
+
+# Función para reconciliar almacenamiento y evidencias
+def reconcile(store,
+              storage_backend,
+              programas=None,
+              workers=8,
+              min_age=DEFAULT_MIN_AGE):
+    """Detecta objetos huérfanos y filas colgantes por programa"""
+    start = time.perf_counter()
+    # Solo las columnas necesarias para cruzar y eliminar filas colgantes
+    evidencias_df = store.get_evidencias(columns=RECONCILE_COLUMNS)
+
+    if programas is None:
+        programas = set()
+        if 'programa' in evidencias_df.columns:
+            programas.update(evidencias_df['programa'].astype(str))
+        users_df = store.get_users()
+        if 'programa' in users_df.columns:
+            programas.update(users_df['programa'].astype(str))
+    prefixes = sorted({clean_path_component(p) + "/" for p in programas if p})
+
+    object_names, recent_names = list_object_names(storage_backend, prefixes,
+                                                   workers, min_age)
+
+    # Resolver cada URL distinta una sola vez
+    urls = evidencias_df.get('url_cloudinary')
+    urls = [] if urls is None else urls.fillna('').astype(str).tolist()
+    path_by_url = {url: storage_backend.path_from_url(url) for url in set(urls)}
+
+    referenced = set()
+    dangling_positions = []
+    prefix_tuple = tuple(prefixes)
+    for position, url in enumerate(urls):
+        path = path_by_url.get(url)
+        if not path:
+            continue
+        referenced.add(path)
+        # Solo es colgante si su prefijo fue listado y el objeto no apareció
+        # (ni siquiera entre los recientes, que solo se omiten como huérfanos)
+        if path.startswith(prefix_tuple) and path not in object_names and \
+                path not in recent_names:
+            dangling_positions.append(position)
+
+    # Las miniaturas pertenecen a su objeto original: solo son huérfanas si
+    # el original tampoco está referenciado
+    orphan_objects = [
+        name for name in object_names - referenced
+        if not (is_preview_path(name) and original_path(name) in referenced)
+    ]
+
+    report = ReconciliationReport(
+        orphan_objects=sorted(orphan_objects),
+        dangling_rows=evidencias_df.iloc[dangling_positions].fillna('').astype(
+            str).to_dict('records') if dangling_positions else [],
+        total_objects=len(object_names),
+        total_rows=len(evidencias_df))
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+# Función para corregir los problemas encontrados
+def apply_fixes(report, store, storage_backend, batch_size=100,
+                progress=None):
+    """Elimina objetos huérfanos y filas colgantes por lotes"""
+    deleted_objects = 0
+    for i in range(0, len(report.orphan_objects), batch_size):
+        batch = report.orphan_objects[i:i + batch_size]
+        deleted_objects += sum(storage_backend.delete_many(batch).values())
+        if progress:
+            progress(f"{deleted_objects} objeto(s) huérfano(s) eliminados")
+
+    deleted_rows = 0
+    for i in range(0, len(report.dangling_rows), batch_size):
+        batch = report.dangling_rows[i:i + batch_size]
+        deleted_rows += store.delete_evidencias(batch)
+        if progress:
+            progress(f"{deleted_rows} fila(s) sin archivo eliminadas")
+
+    return deleted_objects, deleted_rows
+
+
+@dataclass
+class RebuildResult:
+    """Tabla de evidencias reconstruida desde el almacenamiento"""
+    evidencias_df: object = None
+    from_metadata: int = 0
+    from_path: int = 0
+    unresolved: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def summary(self):
+        """Retorna un resumen legible de la reconstrucción"""
+        return (f"{len(self.evidencias_df)} evidencia(s) reconstruidas en "
+                f"{self.elapsed:.1f} s: {self.from_metadata} desde metadatos, "
+                f"{self.from_path} deducidas de la ruta, "
+                f"{len(self.unresolved)} objeto(s) sin clasificar")
+
+
+# Función para deducir la evidencia de un objeto a partir de su ruta
+def evidencia_from_path(name, programas_by_folder):
+    """Retorna la fila deducida de programa/dimensión/criterio/<fecha>_archivo
+    (o de programa/<fecha>_archivo, sin clasificar), o None"""
+    parts = name.split("/")
+    if len(parts) == 4:
+        folder, dimension_name, criterio_name, file_name = parts
+        dimension = find_dimension(dimension_name)
+        criterio = find_criterio(dimension, criterio_name) if dimension else None
+        if not criterio:
+            return None
+    elif len(parts) == 2:
+        # build_object_path omite dimensión y criterio si vienen vacíos
+        folder, file_name = parts
+        dimension = criterio = ''
+    else:
+        return None
+
+    fecha_hora = ''
+    stamp, _, original_name = file_name.partition("_")
+    time_part, _, rest = original_name.partition("_")
+    try:
+        fecha_hora = datetime.strptime(f"{stamp}_{time_part}",
+                                       PATH_TIMESTAMP_FORMAT).strftime(
+                                           LEGACY_FECHA_HORA_FORMAT)
+        file_name = rest
+    except ValueError:
+        pass
+
+    return {
+        'programa': programas_by_folder.get(folder, folder),
+        'subido_por': '',
+        'fecha_hora': fecha_hora,
+        'criterio': criterio,
+        'dimension': dimension,
+        # Los espacios del nombre original se guardaron como guiones bajos
+        'nombre_archivo': file_name
+    }
+
+
+# Función para reconstruir la tabla de evidencias desde el almacenamiento
+def rebuild_evidencias(storage_backend,
+                       programas=None,
+                       workers=8,
+                       known_programas=None):
+    """Lista los objetos por prefijo de programa en paralelo y arma la tabla.
+
+    Sin programas se listan primero las carpetas de primer nivel del
+    almacenamiento (con los objetos sueltos en la raíz) y luego cada carpeta
+    en paralelo; known_programas da los nombres de programa de las carpetas
+    de los objetos sin metadatos.
+    """
+    import pandas as pd
+
+    start = time.perf_counter()
+    programas_by_folder = {
+        clean_path_component(p): p
+        for p in (programas or known_programas or []) if p
+    }
+    if programas:
+        prefixes = sorted(clean_path_component(p) + "/" for p in programas if p)
+        root_objects = []
+    else:
+        prefixes, root_objects = storage_backend.list_level("")
+
+    def rebuild_objects(stored_objects):
+        rows, from_metadata, unresolved = [], 0, []
+        # list() itera página por página; solo se guardan las filas
+        for stored in stored_objects:
+            if is_preview_path(stored.name) or os.path.basename(
+                    stored.name).startswith("."):
+                continue
+            metadata = stored.metadata or {}
+            if metadata.get('evidencia_id'):
+                row = {column: metadata.get(column, '')
+                       for column in EVIDENCIAS_COLUMNS}
+                from_metadata += 1
+            else:
+                row = evidencia_from_path(stored.name, programas_by_folder)
+                if row is None:
+                    unresolved.append(stored.name)
+                    continue
+            row['url_cloudinary'] = storage_backend.object_url(stored.name)
+            rows.append(row)
+        return rows, from_metadata, unresolved
+
+    result = RebuildResult()
+    rows = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parts = executor.map(
+            lambda prefix: rebuild_objects(storage_backend.list(prefix)),
+            prefixes)
+        for prefix_rows, from_metadata, unresolved in [
+                rebuild_objects(root_objects), *parts]:
+            rows.extend(prefix_rows)
+            result.from_metadata += from_metadata
+            result.from_path += len(prefix_rows) - from_metadata
+            result.unresolved.extend(unresolved)
+
+    result.evidencias_df = _sorted_by_fecha(
+        pd.DataFrame(rows, columns=EVIDENCIAS_COLUMNS))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def _sorted_by_fecha(evidencias_df):
+    """Mismo orden en que se habrían agregado las filas (sin fecha primero)"""
+    import pandas as pd
+
+    if evidencias_df.empty:
+        return evidencias_df
+    fechas = pd.DatetimeIndex(parse_fecha_hora(evidencias_df['fecha_hora']))
+    return evidencias_df.iloc[fechas.asi8.argsort(
+        kind='stable')].reset_index(drop=True)
+
+
+# Función para combinar una reconstrucción con la tabla actual
+def merge_rebuilt(evidencias_df,
+                  rebuilt_df,
+                  storage_backend,
+                  programas=None,
+                  unresolved=()):
+    """Reemplaza en la tabla actual las filas que la reconstrucción cubre.
+
+    Se conservan tal como están las filas de otros programas (si se indican
+    programas), las que apuntan a objetos sin clasificar (unresolved) y las
+    cuya URL no corresponde al backend (enlaces externos u otro bucket): la
+    reconstrucción no las puede regenerar.
+    """
+    import pandas as pd
+
+    current = evidencias_df.reindex(columns=EVIDENCIAS_COLUMNS).fillna('')
+    urls = current['url_cloudinary'].astype(str)
+    path_by_url = {url: storage_backend.path_from_url(url) for url in set(urls)}
+    paths = urls.map(path_by_url)
+    keep = paths.isna() | paths.eq('') | paths.isin(set(unresolved))
+    if programas:
+        keep |= ~current['programa'].astype(str).isin(set(programas))
+    return _sorted_by_fecha(
+        pd.concat([current[keep.to_numpy()], rebuilt_df[EVIDENCIAS_COLUMNS]],
+                  ignore_index=True))
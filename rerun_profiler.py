@@ -0,0 +1,200 @@
+"""Perfilador por muestreo de las ejecuciones del script de Streamlit.
+
+Mientras se ejecuta el script, un hilo toma cada pocos milisegundos la pila
+del hilo de la sesión (``sys._current_frames``) y cuenta las pilas repetidas.
+El costo no depende de cuántas funciones se llamen, a diferencia de cProfile.
+Las muestras de varias ejecuciones se suman en un perfil que se guarda en
+disco como JSON y en formato de pilas colapsadas (``.folded``), compatible
+con flamegraph.pl y speedscope, para compararlo entre versiones.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+SAMPLE_INTERVAL = 0.005
+PROFILE_EXTENSION = ".json"
+FOLDED_EXTENSION = ".folded"
+
+
+def _frame_label(code):
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Muestrea la pila de un hilo hasta que se detiene.
+
+    Las pilas se recortan desde el primer cuadro de ``root_file`` (el script
+    de la aplicación) para omitir la maquinaria de Streamlit.
+    """
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL, root_file=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.root_file = root_file
+        self.stacks = Counter()
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run,
+                                        name="perfilador",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Detiene el muestreo y retorna las pilas colapsadas con su conteo"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self._start
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            if self.root_file:
+                for position, code in enumerate(codes):
+                    if code.co_filename == self.root_file:
+                        codes = codes[position:]
+                        break
+            self.stacks[";".join(_frame_label(code) for code in codes)] += 1
+
+
+class RerunProfile:
+    """Muestras acumuladas de las próximas ``runs`` ejecuciones del script"""
+
+    def __init__(self, runs, interval=SAMPLE_INTERVAL):
+        self.runs = runs
+        self.interval = interval
+        self.stacks = Counter()
+        self.durations = []
+
+    @property
+    def remaining(self):
+        return self.runs - len(self.durations)
+
+    def add(self, stacks, duration):
+        self.stacks.update(stacks)
+        self.durations.append(duration)
+
+
+# Función para obtener las funciones que más tiempo consumen
+def hot_spots(stacks, limit=15):
+    """Retorna las funciones con su porcentaje de tiempo propio y total"""
+    total = sum(stacks.values())
+    if not total:
+        return []
+    own = Counter()
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        # Una función recursiva cuenta una sola vez por muestra
+        for frame in set(frames):
+            inclusive[frame] += count
+    return [{
+        'funcion': frame,
+        'propio_pct': 100 * own[frame] / total,
+        'total_pct': 100 * count / total
+    } for frame, count in sorted(inclusive.items(),
+                                 key=lambda item: (-own[item[0]], -item[1]))
+            [:limit]]
+
+
+# Función para construir el desglose tipo flame graph
+def flame_rows(stacks, max_depth=8, min_share=0.02):
+    """Retorna filas (profundidad, función, fracción) del árbol de llamadas"""
+    total = sum(stacks.values())
+    if not total:
+        return []
+    tree = {}
+    for stack, count in stacks.items():
+        node = tree
+        for frame in stack.split(";")[:max_depth]:
+            child = node.setdefault(frame, [0, {}])
+            child[0] += count
+            node = child[1]
+
+    rows = []
+
+    def walk(node, depth):
+        for frame, (count, children) in sorted(node.items(),
+                                               key=lambda item: -item[1][0]):
+            if count / total < min_share:
+                continue
+            rows.append((depth, frame, count / total))
+            walk(children, depth + 1)
+
+    walk(tree, 0)
+    return rows
+
+
+# Función para guardar un perfil en disco
+def save_profile(directory, profile, label):
+    """Guarda el perfil como JSON y pilas colapsadas; retorna la ruta del JSON"""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    base = os.path.join(directory, f"{stamp}_{label}")
+    with open(base + PROFILE_EXTENSION, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                'fecha': datetime.now(timezone.utc).isoformat(),
+                'etiqueta': label,
+                'version': os.getenv("APP_VERSION", ""),
+                'intervalo_s': profile.interval,
+                'ejecuciones_s': profile.durations,
+                'muestras': sum(profile.stacks.values()),
+                'pilas': dict(profile.stacks.most_common()),
+            },
+            f,
+            ensure_ascii=False,
+            indent=1)
+    with open(base + FOLDED_EXTENSION, "w", encoding="utf-8") as f:
+        for stack, count in profile.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return base + PROFILE_EXTENSION
+
+
+# Función para leer un perfil guardado
+def load_profile(path):
+    """Retorna el contenido del perfil con sus pilas como Counter"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    data['pilas'] = Counter(data['pilas'])
+    return data
+
+
+# Función para comparar dos perfiles guardados
+def compare_profiles(before, after, limit=20):
+    """Retorna las funciones cuya fracción de tiempo total más cambió"""
+    before_spots = {
+        spot['funcion']: spot['total_pct']
+        for spot in hot_spots(before['pilas'], limit=None)
+    }
+    after_spots = {
+        spot['funcion']: spot['total_pct']
+        for spot in hot_spots(after['pilas'], limit=None)
+    }
+    rows = [{
+        'funcion': frame,
+        'antes_pct': before_spots.get(frame, 0.0),
+        'despues_pct': after_spots.get(frame, 0.0),
+        'diferencia_pct': after_spots.get(frame, 0.0) - before_spots.get(frame, 0.0)
+    } for frame in set(before_spots) | set(after_spots)]
+    rows.sort(key=lambda row: -abs(row['diferencia_pct']))
+    return rows[:limit]
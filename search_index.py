@@ -0,0 +1,341 @@
+"""Índice de búsqueda de texto completo sobre las evidencias (SQLite FTS5).
+
+El índice guarda, por URL de evidencia, el nombre del archivo, quién lo subió,
+el criterio y el texto extraído de documentos PDF, DOCX, XLSX y PPTX. La
+copia del archivo a disco y la extracción corren en segundo plano (un hilo y un
+pool de procesos) al momento de la subida, de modo que no retrasan la
+respuesta al usuario.
+"""
+import os
+import re
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Máximo de caracteres de contenido que se indexan por documento
+MAX_CONTENT_CHARS = 200000
+
+# Documentos indexados hace menos que esto no se dan de baja en sync: su fila
+# puede no haber llegado todavía a la tabla leída (caché o registro diferido)
+RECENT_GRACE_SECONDS = 15 * 60
+
+_XML_TAG = re.compile(r"<[^>]+>")
+_SLIDE_NAME = re.compile(r"ppt/slides/slide\d+\.xml$")
+
+
+# Función para extraer texto de los XML de un documento de Office
+def _extract_office_xml(path, member_filter):
+    """Concatena el texto de los XML internos que cumplen el filtro"""
+    parts = []
+    with zipfile.ZipFile(path) as archive:
+        for name in sorted(archive.namelist()):
+            if member_filter(name):
+                xml = archive.read(name).decode("utf-8", errors="ignore")
+                parts.append(_XML_TAG.sub(" ", xml))
+    return " ".join(parts)
+
+
+# Función para extraer el texto de un archivo de evidencia
+def extract_text(path, filename):
+    """Extrae el texto de un PDF, DOCX, XLSX o PPTX; retorna '' si no aplica"""
+    extension = os.path.splitext(filename)[1].lower()
+    try:
+        if extension == ".pdf":
+            try:
+                from pypdf import PdfReader
+            except ImportError:
+                return ""
+            reader = PdfReader(path)
+            text = []
+            size = 0
+            for page in reader.pages:
+                page_text = page.extract_text() or ""
+                text.append(page_text)
+                size += len(page_text)
+                if size >= MAX_CONTENT_CHARS:
+                    break
+            content = " ".join(text)
+        elif extension == ".docx":
+            content = _extract_office_xml(
+                path, lambda name: name == "word/document.xml")
+        elif extension == ".xlsx":
+            content = _extract_office_xml(
+                path, lambda name: name == "xl/sharedStrings.xml")
+        elif extension == ".pptx":
+            content = _extract_office_xml(path, _SLIDE_NAME.match)
+        else:
+            return ""
+    except Exception:
+        # Un archivo dañado no debe impedir indexar sus metadatos
+        return ""
+    return " ".join(content.split())[:MAX_CONTENT_CHARS]
+
+
+# Función que corre en los procesos del pool de extracción
+def _extract_and_cleanup(path, filename):
+    """Extrae el texto del archivo temporal y luego lo elimina"""
+    try:
+        return extract_text(path, filename)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Función para convertir el texto del usuario en una consulta FTS5
+def build_match_query(text):
+    """Convierte el texto en una consulta FTS5 segura (prefijo por término)"""
+    terms = re.findall(r"\w+", text, flags=re.UNICODE)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class SearchIndex:
+    """Índice invertido SQLite FTS5 de evidencias"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documentos (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            programa TEXT NOT NULL DEFAULT '',
+            nombre_archivo TEXT NOT NULL DEFAULT '',
+            subido_por TEXT NOT NULL DEFAULT '',
+            criterio TEXT NOT NULL DEFAULT '',
+            fecha_hora TEXT NOT NULL DEFAULT '',
+            contenido TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_documentos_programa
+            ON documentos (programa);
+        CREATE VIRTUAL TABLE IF NOT EXISTS documentos_fts USING fts5(
+            nombre_archivo, subido_por, criterio, contenido,
+            content='documentos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS documentos_ai AFTER INSERT ON documentos
+        BEGIN
+            INSERT INTO documentos_fts (rowid, nombre_archivo, subido_por,
+                                        criterio, contenido)
+            VALUES (new.id, new.nombre_archivo, new.subido_por,
+                    new.criterio, new.contenido);
+        END;
+        CREATE TRIGGER IF NOT EXISTS documentos_ad AFTER DELETE ON documentos
+        BEGIN
+            INSERT INTO documentos_fts (documentos_fts, rowid, nombre_archivo,
+                                        subido_por, criterio, contenido)
+            VALUES ('delete', old.id, old.nombre_archivo, old.subido_por,
+                    old.criterio, old.contenido);
+        END;
+        CREATE TRIGGER IF NOT EXISTS documentos_au AFTER UPDATE ON documentos
+        BEGIN
+            INSERT INTO documentos_fts (documentos_fts, rowid, nombre_archivo,
+                                        subido_por, criterio, contenido)
+            VALUES ('delete', old.id, old.nombre_archivo, old.subido_por,
+                    old.criterio, old.contenido);
+            INSERT INTO documentos_fts (rowid, nombre_archivo, subido_por,
+                                        criterio, contenido)
+            VALUES (new.id, new.nombre_archivo, new.subido_por,
+                    new.criterio, new.contenido);
+        END;
+    """
+
+    METADATA_COLUMNS = [
+        'programa', 'nombre_archivo', 'subido_por', 'criterio', 'fecha_hora'
+    ]
+
+    def __init__(self, path, workers=2):
+        self.path = path
+        self.workers = workers
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Copia las subidas a disco y espera su extracción fuera del script
+        self._copier = ThreadPoolExecutor(max_workers=workers,
+                                          thread_name_prefix="indice-subidas")
+        self._synced_signatures = {}
+        # URL -> momento en que se indexó desde este proceso
+        self._recent = {}
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connection(self):
+        """Retorna la conexión del hilo actual"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _pool(self):
+        """Crea el pool de procesos de extracción al primer uso"""
+        with self._executor_lock:
+            if self._executor is None:
+                import multiprocessing
+
+                # spawn evita heredar los hilos del servidor al crear procesos
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def upsert(self, url, fields, contenido=None):
+        """Inserta o actualiza un documento; conserva el contenido si no se indica"""
+        self._recent[url] = time.monotonic()
+        values = [str(fields.get(column, '')) for column in self.METADATA_COLUMNS]
+        with self._write_lock, self._connection() as conn:
+            conn.execute(
+                "INSERT INTO documentos (url, programa, nombre_archivo, "
+                "subido_por, criterio, fecha_hora, contenido) "
+                "VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, '')) "
+                "ON CONFLICT(url) DO UPDATE SET programa = excluded.programa, "
+                "nombre_archivo = excluded.nombre_archivo, "
+                "subido_por = excluded.subido_por, "
+                "criterio = excluded.criterio, "
+                "fecha_hora = excluded.fecha_hora, "
+                "contenido = COALESCE(?, documentos.contenido)",
+                [url] + values + [contenido, contenido])
+
+    def index_upload(self, url, fileobj, filename, fields):
+        """Indexa los metadatos ya y extrae el contenido en segundo plano"""
+        self.upsert(url, fields)
+
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in (".pdf", ".docx", ".xlsx", ".pptx"):
+            return None
+
+        return self._copier.submit(self._copy_and_extract, url, fileobj,
+                                   filename, extension)
+
+    def _copy_and_extract(self, url, fileobj, filename, extension):
+        """Copia la subida a un archivo temporal, extrae su texto y lo guarda"""
+        # El archivo se pasa al proceso por disco para no copiar los bytes
+        # a través del pipe del pool
+        fd, temp_path = tempfile.mkstemp(suffix=extension)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                getbuffer = getattr(fileobj, "getbuffer", None)
+                if getbuffer:
+                    # Sin mover la posición que usa el script
+                    out.write(getbuffer())
+                else:
+                    fileobj.seek(0)
+                    while True:
+                        chunk = fileobj.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+        contenido = self._pool().submit(_extract_and_cleanup, temp_path,
+                                        filename).result()
+        if contenido:
+            with self._write_lock, self._connection() as conn:
+                conn.execute(
+                    "UPDATE documentos SET contenido = ? WHERE url = ?",
+                    (contenido, url))
+        return contenido
+
+    def _recently_indexed(self):
+        """URLs indexadas desde este proceso dentro del período de gracia"""
+        cutoff = time.monotonic() - RECENT_GRACE_SECONDS
+        for url, indexed_at in list(self._recent.items()):
+            if indexed_at < cutoff:
+                self._recent.pop(url, None)
+        return set(self._recent)
+
+    def sync(self, evidencias_df, programa=None, keep_urls=()):
+        """Alinea el índice con la tabla de evidencias (altas y bajas).
+
+        Con la misma lectura (attrs['lectura']) no se vuelve a revisar la
+        tabla. Si se indica programa, el DataFrame contiene solo ese programa y las
+        bajas se limitan a sus documentos. No se dan de baja las URLs de
+        keep_urls (por ejemplo, las que esperan en el registro diferido) ni
+        las indexadas recientemente, aunque todavía no estén en la tabla.
+        """
+        import pandas as pd
+
+        if 'url_cloudinary' not in evidencias_df.columns:
+            return
+
+        lectura = evidencias_df.attrs.get('lectura')
+        if lectura is not None:
+            # La lectura identifica la tabla sin recorrer la columna de URLs
+            signature = (lectura, len(evidencias_df))
+            if self._synced_signatures.get(programa) == signature:
+                return
+        urls = evidencias_df['url_cloudinary'].fillna('').astype(str)
+        if lectura is None:
+            # Huella de toda la columna: detecta también cambios intermedios
+            signature = hashlib.sha1(
+                pd.util.hash_pandas_object(urls, index=False).values.tobytes()
+            ).hexdigest()
+            if self._synced_signatures.get(programa) == signature:
+                return
+
+        if programa is None:
+            cursor = self._connection().execute("SELECT url FROM documentos")
+        else:
+            cursor = self._connection().execute(
+                "SELECT url FROM documentos WHERE programa = ?", (programa, ))
+        indexed = {row[0] for row in cursor}
+        current = set(urls) - {''}
+
+        missing = evidencias_df[urls.isin(current - indexed).values]
+        removed = indexed - current
+        protected = removed & (set(keep_urls) | self._recently_indexed())
+        removed -= protected
+        with self._write_lock, self._connection() as conn:
+            if removed:
+                conn.executemany("DELETE FROM documentos WHERE url = ?",
+                                 [(url, ) for url in removed])
+            if not missing.empty:
+                rows = missing.reindex(columns=['url_cloudinary'] +
+                                       self.METADATA_COLUMNS).fillna(
+                                           '').astype(str)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO documentos (url, programa, "
+                    "nombre_archivo, subido_por, criterio, fecha_hora) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows.itertuples(index=False, name=None))
+        if not protected:
+            # Con documentos protegidos se vuelve a revisar en la próxima
+            # llamada, para darlos de baja si nunca llegan a la tabla
+            self._synced_signatures[programa] = signature
+
+    def search(self, text, programa=None, limit=50):
+        """Busca evidencias por texto; retorna una lista de diccionarios"""
+        match_query = build_match_query(text)
+        if not match_query:
+            return []
+
+        # Los términos encontrados se marcan con « » (texto plano, sin Markdown,
+        # porque el fragmento se muestra en una tabla)
+        sql = ("SELECT d.url, d.programa, d.nombre_archivo, d.subido_por, "
+               "d.criterio, d.fecha_hora, "
+               "snippet(documentos_fts, 3, '«', '»', '…', 12) "
+               "FROM documentos_fts JOIN documentos d "
+               "ON d.id = documentos_fts.rowid "
+               "WHERE documentos_fts MATCH ?")
+        params = [match_query]
+        if programa is not None:
+            sql += " AND d.programa = ?"
+            params.append(programa)
+        sql += " ORDER BY bm25(documentos_fts, 10.0, 2.0, 2.0, 1.0) LIMIT ?"
+        params.append(limit)
+
+        columns = [
+            'url_cloudinary', 'programa', 'nombre_archivo', 'subido_por',
+            'criterio', 'fecha_hora', 'fragmento'
+        ]
+        return [
+            dict(zip(columns, row))
+            for row in self._connection().execute(sql, params)
+        ]
@@ -0,0 +1,118 @@
+"""Acciones pendientes de confirmación de cada sesión.
+
+Reemplaza las claves sueltas por fila en ``st.session_state`` (una por cada
+confirmación o selección) por una sola estructura acotada: cada acción guarda
+su tipo, los identificadores de las evidencias afectadas y su vencimiento. Las
+filas completas no se guardan; se recuperan de la tabla actual al confirmar.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+EVIDENCIA_ID_COLUMN = "evidencia_id"
+
+# Tipos de acción
+ELIMINAR = "eliminar"
+ELIMINAR_SELECCION = "eliminar_seleccion"
+CORREGIR = "corregir"
+
+
+# Campos que identifican una evidencia (la tabla no tiene columna de ID)
+ID_FIELDS = ('programa', 'url_cloudinary', 'fecha_hora', 'nombre_archivo')
+
+
+def _hash_fields(values):
+    return hashlib.sha1("|".join(values).encode("utf-8")).hexdigest()[:16]
+
+
+# Función para calcular el identificador estable de una evidencia
+def evidence_id(row):
+    """Retorna un identificador corto derivado de los campos de la evidencia"""
+    return _hash_fields(str(row.get(column, '')).strip() for column in ID_FIELDS)
+
+
+# Función para agregar la columna de identificadores a las evidencias
+def with_evidence_ids(evidencias_df):
+    """Retorna una copia de las evidencias con la columna evidencia_id"""
+    if EVIDENCIA_ID_COLUMN in evidencias_df.columns:
+        return evidencias_df
+    columns = [
+        evidencias_df[column].fillna('').astype(str).str.strip().tolist()
+        if column in evidencias_df.columns else [''] * len(evidencias_df)
+        for column in ID_FIELDS
+    ]
+    ids = [_hash_fields(values) for values in zip(*columns)]
+    return evidencias_df.assign(**{EVIDENCIA_ID_COLUMN: ids})
+
+
+# Función para obtener las filas de las evidencias indicadas
+def evidence_records(evidencias_df, ids):
+    """Retorna las evidencias (diccionarios) cuyos identificadores se indican"""
+    selected = evidencias_df[evidencias_df[EVIDENCIA_ID_COLUMN].isin(ids)]
+    return selected.drop(columns=[EVIDENCIA_ID_COLUMN]).fillna('').astype(
+        str).to_dict('records')
+
+
+@dataclass(frozen=True)
+class PendingAction:
+    """Acción que espera confirmación del usuario"""
+    kind: str
+    evidence_ids: tuple
+    expires_at: float
+
+
+class PendingActions:
+    """Acciones pendientes de una sesión, con vencimiento y tamaño máximo"""
+
+    def __init__(self, ttl=900, max_entries=50):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._actions = OrderedDict()  # (tipo, clave) -> PendingAction
+
+    def request(self, kind, key, evidence_ids):
+        """Registra una acción pendiente; reemplaza la anterior de la misma clave"""
+        now = time.monotonic()
+        self._actions.pop((kind, key), None)
+        self._actions[(kind, key)] = PendingAction(kind, tuple(evidence_ids),
+                                                   now + self.ttl)
+        self._evict(now)
+
+    def get(self, kind, key):
+        """Retorna la acción pendiente vigente, o None"""
+        action = self._actions.get((kind, key))
+        if action is None:
+            return None
+        if action.expires_at < time.monotonic():
+            del self._actions[(kind, key)]
+            return None
+        return action
+
+    def pop(self, kind, key):
+        """Retira la acción pendiente (al confirmar o cancelar) y la retorna"""
+        action = self._actions.pop((kind, key), None)
+        if action is None or action.expires_at < time.monotonic():
+            return None
+        return action
+
+    def pending_keys(self, kind):
+        """Retorna las claves con acciones vigentes del tipo indicado"""
+        now = time.monotonic()
+        return {
+            key
+            for (action_kind, key), action in self._actions.items()
+            if action_kind == kind and action.expires_at >= now
+        }
+
+    def __len__(self):
+        return len(self._actions)
+
+    def _evict(self, now):
+        """Descarta las acciones vencidas y, si no basta, las más antiguas"""
+        for action_key in [
+                action_key for action_key, action in self._actions.items()
+                if action.expires_at < now
+        ]:
+            del self._actions[action_key]
+        while len(self._actions) > self.max_entries:
+            self._actions.popitem(last=False)
@@ -0,0 +1,155 @@
+"""Instantáneas en disco de las tablas de usuarios y evidencias.
+
+Cada lectura completa de una tabla se guarda como archivo Arrow IPC (columnar,
+sin compresión para poder mapearlo en memoria) con un sello de versión. Tras
+un reinicio del servidor, el primer acceso se sirve desde la instantánea y la
+tabla se vuelve a leer del repositorio en segundo plano; si cambió, se guarda
+la nueva versión y se avisa para invalidar las cachés.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+SNAPSHOT_EXTENSION = ".arrow"
+
+# Instantáneas más antiguas que esto no se sirven en un arranque en frío
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+
+# Función para calcular la versión del contenido de una tabla
+def content_version(df):
+    """Retorna un sello corto que cambia si cambia el contenido de la tabla"""
+    import pandas as pd
+
+    digest = hashlib.sha1(",".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(
+        pd.util.hash_pandas_object(df.astype(str), index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+class SnapshotStore:
+    """Directorio de instantáneas Arrow con sello de versión"""
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + SNAPSHOT_EXTENSION)
+
+    def save(self, name, df):
+        """Guarda la tabla de forma atómica y retorna su versión"""
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        version = content_version(df)
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Columnas con tipos mezclados (por ejemplo, editadas a mano en la
+            # hoja): se guardan como texto
+            table = pa.Table.from_pandas(df.fillna('').astype(str),
+                                         preserve_index=False)
+        table = table.replace_schema_metadata({
+            "snapshot":
+            json.dumps({
+                "version": version,
+                "guardado": datetime.now(timezone.utc).isoformat()
+            })
+        })
+
+        path = self._path(name)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        # Sin compresión para que la lectura pueda mapear el archivo
+        feather.write_feather(table, temp_path, compression="uncompressed")
+        # Puede contener datos sensibles (por ejemplo, usuarios)
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, path)
+        return version
+
+    def load(self, name):
+        """Retorna (DataFrame, info) de la instantánea, o (None, None)"""
+        import pyarrow as pa
+
+        path = self._path(name)
+        try:
+            with pa.memory_map(path, "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+                info = json.loads(
+                    (table.schema.metadata or {}).get(b"snapshot", b"{}"))
+                info["edad"] = time.time() - os.path.getmtime(path)
+                return table.to_pandas(), info
+        except (FileNotFoundError, pa.ArrowInvalid, ValueError):
+            return None, None
+
+
+class WarmStartCache:
+    """Sirve la última instantánea en el primer acceso de cada tabla.
+
+    ``read(name, fetch_full)`` retorna la instantánea si es el primer acceso
+    del proceso y existe una suficientemente reciente; en ese caso relee la
+    tabla con ``fetch_full`` en segundo plano y, si la versión cambió, la
+    guarda y llama a ``on_refresh(name)``. En los demás accesos lee la tabla y
+    guarda la instantánea. Las lecturas parciales (un programa, algunas
+    columnas) indican ``fetch`` para leer solo esa parte y ``view`` para
+    obtenerla desde la instantánea.
+    """
+
+    def __init__(self, snapshots, max_age=DEFAULT_MAX_AGE, on_refresh=None):
+        self.snapshots = snapshots
+        self.max_age = max_age
+        self.on_refresh = on_refresh
+        self.last_error = None
+        self._served = set()
+        # Última tabla guardada por nombre (una lectura que reutiliza la
+        # misma tabla no vuelve a escribirla)
+        self._saved = {}
+        self._lock = threading.Lock()
+
+    def read(self, name, fetch_full, fetch=None, view=None):
+        """Retorna la tabla, desde la instantánea en el primer acceso si es posible"""
+        with self._lock:
+            first_access = name not in self._served
+            self._served.add(name)
+
+        if first_access:
+            df, info = self.snapshots.load(name)
+            if df is not None and info["edad"] <= self.max_age:
+                threading.Thread(target=self._refresh,
+                                 args=(name, fetch_full, info.get("version")),
+                                 name=f"instantanea-{name}",
+                                 daemon=True).start()
+                return view(df) if view else df
+
+        if fetch is not None:
+            return fetch()
+        df = fetch_full()
+        self._save_quietly(name, df)
+        return df
+
+    def _refresh(self, name, fetch_full, served_version):
+        """Relee la tabla y la guarda si cambió respecto de la servida"""
+        try:
+            df = fetch_full()
+            if self.snapshots.save(name, df) != served_version and \
+                    self.on_refresh:
+                self.on_refresh(name)
+            self.last_error = None
+        except Exception as e:
+            # Sin conexión con el repositorio: la próxima lectura reintenta
+            self.last_error = str(e)
+            with self._lock:
+                self._served.discard(name)
+
+    def _save_quietly(self, name, df):
+        if self._saved.get(name) is df:
+            return
+        try:
+            self.snapshots.save(name, df)
+            self._saved[name] = df
+        except Exception as e:
+            # La instantánea es una optimización; no debe romper la lectura
+            self.last_error = str(e)
@@ -0,0 +1,163 @@
+"""Exportación en streaming de tablas de evidencias a CSV y XLSX.
+
+Las filas llegan en bloques de DataFrame (ver ``FilteredView.chunks``), de
+modo que nunca se arma una segunda copia completa: cada bloque se convierte a
+texto, se entrega y se descarta. El XLSX se escribe con
+``zipfile`` sobre un destino sin seek (las entradas llevan descriptor de datos
+al final), con celdas de texto en línea, así que tampoco requiere openpyxl ni
+un archivo temporal.
+"""
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+XLSX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+# Caracteres de control que XML 1.0 no admite
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+{sheets}</Types>"""
+
+_SHEET_CONTENT_TYPE = ('<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                       'ContentType="application/vnd.openxmlformats-'
+                       'officedocument.spreadsheetml.worksheet+xml"/>\n')
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets>{sheets}</sheets>
+</workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+{sheets}</Relationships>"""
+
+_SHEET_HEADER = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                 '<worksheet xmlns="http://schemas.openxmlformats.org/'
+                 'spreadsheetml/2006/main"><sheetData>')
+_SHEET_FOOTER = '</sheetData></worksheet>'
+
+
+# Función para exportar a CSV en streaming
+def iter_csv(columns, chunks):
+    """Genera el CSV (UTF-8 con BOM, para que Excel respete los acentos) en bloques de bytes"""
+    import csv
+    import io
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    for chunk_df in chunks:
+        yield chunk_df.to_csv(index=False, header=False).encode("utf-8")
+
+
+class _ChunkSink:
+    """Destino sin seek para zipfile que acumula lo escrito hasta drenarlo"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _column_letter(position):
+    letters = ""
+    position += 1
+    while position:
+        position, remainder = divmod(position - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _cell(reference, value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    if value is None:
+        value = ""
+    text = escape(_INVALID_XML.sub("", str(value)))
+    return (f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">'
+            f'{text}</t></is></c>')
+
+
+def _rows_xml(rows, first_row, letters):
+    parts = []
+    for offset, row in enumerate(rows):
+        number = first_row + offset
+        cells = "".join(
+            _cell(f"{letter}{number}", value)
+            for letter, value in zip(letters, row))
+        parts.append(f'<row r="{number}">{cells}</row>')
+    return "".join(parts).encode("utf-8")
+
+
+# Función para exportar a XLSX en streaming
+def iter_xlsx(sheets):
+    """Genera un libro XLSX en bloques de bytes.
+
+    sheets es una lista de (nombre, columnas, bloques de DataFrame); cada
+    hoja se escribe a medida que se consumen sus bloques.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            _CONTENT_TYPES.format(sheets="".join(
+                _SHEET_CONTENT_TYPE.format(n=n)
+                for n in range(1, len(sheets) + 1))))
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr(
+            "xl/workbook.xml",
+            _WORKBOOK.format(sheets="".join(
+                f'<sheet name="{escape(name[:31])}" sheetId="{n}" r:id="rId{n}"/>'
+                for n, (name, _, _) in enumerate(sheets, 1))))
+        archive.writestr(
+            "xl/_rels/workbook.xml.rels",
+            _WORKBOOK_RELS.format(sheets="".join(
+                f'<Relationship Id="rId{n}" Type="http://schemas.openxml'
+                'formats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{n}.xml"/>\n'
+                for n in range(1, len(sheets) + 1))))
+        yield sink.drain()
+
+        for n, (_, columns, chunks) in enumerate(sheets, 1):
+            letters = [_column_letter(i) for i in range(len(columns))]
+            with archive.open(f"xl/worksheets/sheet{n}.xml",
+                              "w",
+                              force_zip64=True) as part:
+                part.write(_SHEET_HEADER.encode("utf-8"))
+                part.write(_rows_xml([columns], 1, letters))
+                next_row = 2
+                for chunk_df in chunks:
+                    # Valores faltantes (NaN, NA) como celdas vacías
+                    rows = chunk_df.astype(object).where(
+                        chunk_df.notna(), None).itertuples(index=False,
+                                                           name=None)
+                    part.write(_rows_xml(rows, next_row, letters))
+                    next_row += len(chunk_df)
+                    data = sink.drain()
+                    if data:
+                        yield data
+                part.write(_SHEET_FOOTER.encode("utf-8"))
+    yield sink.drain()
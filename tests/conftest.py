@@ -0,0 +1,46 @@
+"""Configuración común de las pruebas.
+
+Los módulos de la aplicación están en la raíz del repositorio (sin paquete),
+así que se agrega al path como en ``benchmarks/``.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from criterios import CRITERIOS_ACREDITACION  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def app_timezone(monkeypatch):
+    """Zona horaria fija para que las fechas locales no dependan del equipo"""
+    monkeypatch.setenv("APP_TIMEZONE", "America/Santiago")
+
+
+@pytest.fixture
+def criterio_oficial():
+    """Retorna (dimensión, criterio) válidos de los criterios de acreditación"""
+    dimension, criterios = next(iter(CRITERIOS_ACREDITACION.items()))
+    return dimension, next(iter(criterios))
+
+
+def evidencia(programa="Programa A",
+              fecha_hora="2026-03-02 10:00:00-0300",
+              url="local://a.pdf",
+              dimension="",
+              criterio="",
+              subido_por="autor@u.cl",
+              nombre_archivo="a.pdf"):
+    """Retorna el diccionario de una evidencia con valores por defecto"""
+    return {
+        'programa': programa,
+        'subido_por': subido_por,
+        'url_cloudinary': url,
+        'fecha_hora': fecha_hora,
+        'criterio': criterio,
+        'dimension': dimension,
+        'nombre_archivo': nombre_archivo,
+    }
@@ -0,0 +1,75 @@
+import pandas as pd
+
+from activity_rollups import ActivityRollups
+from time_index import with_time_index
+
+from conftest import evidencia
+
+
+def _table(rows):
+    return with_time_index(pd.DataFrame(rows))
+
+
+ROWS = [
+    evidencia(programa="A", fecha_hora="2026-03-02 10:00:00-0300", criterio="C1"),
+    evidencia(programa="B", fecha_hora="2026-03-02 11:00:00-0300", criterio="C1"),
+    evidencia(programa="A", fecha_hora="2026-03-04 09:00:00-0300", criterio="C2"),
+]
+
+
+def test_series_counts_per_day_with_empty_days():
+    rollups = ActivityRollups()
+    rollups.sync(_table(ROWS))
+    series = rollups.series('programa')
+    assert series.index.name == 'dia'
+    assert series['A'].tolist() == [1, 0, 1]
+    assert series['B'].tolist() == [1, 0, 0]
+    assert rollups.series('programa', programa="B")['B'].sum() == 1
+
+
+def test_incremental_sync_matches_a_full_build():
+    incremental = ActivityRollups()
+    incremental.sync(_table(ROWS[:2]))
+    incremental.sync(_table(ROWS))
+    full = ActivityRollups()
+    full.sync(_table(ROWS))
+
+    assert incremental.rebuilds == 0
+    pd.testing.assert_frame_equal(incremental.series('programa'),
+                                  full.series('programa'))
+
+
+def test_rows_changed_outside_the_app_trigger_a_rebuild():
+    rollups = ActivityRollups()
+    rollups.sync(_table(ROWS))
+    rollups.sync(_table(ROWS[1:]))
+    assert rollups.rebuilds == 1
+    assert rollups.series('programa')['A'].sum() == 1
+
+
+def test_remove_discounts_deleted_rows():
+    rollups = ActivityRollups()
+    rollups.sync(_table(ROWS))
+    rollups.remove([ROWS[2]])
+    rollups.sync(_table(ROWS[:2]))
+    assert rollups.rebuilds == 0
+    assert rollups.series('programa')['A'].sum() == 1
+
+
+def test_weekly_series_and_coverage_forecast():
+    rollups = ActivityRollups()
+    rollups.sync(_table(ROWS))
+    weekly = rollups.series('programa', freq='W')
+    assert weekly.index.name == 'semana'
+    assert weekly.to_numpy().sum() == 3
+
+    forecast = rollups.coverage_forecast(today="2026-03-05").set_index(
+        'programa')
+    assert forecast.loc["A", 'criterios_cubiertos'] == 2
+    assert forecast.loc["B", 'criterios_cubiertos'] == 1
+
+
+def test_table_without_time_index_is_ignored():
+    rollups = ActivityRollups()
+    rollups.sync(pd.DataFrame(ROWS))
+    assert rollups.series().empty
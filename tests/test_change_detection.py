@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from change_detection import IncrementalTable
+from metadata_store import EVIDENCIAS_COLUMNS
+
+
+class FakeStore:
+    """Repositorio en memoria con sello de versión y lectura de agregados"""
+
+    rewrites = 0
+
+    def __init__(self, rows):
+        self.rows = [list(row) for row in rows]
+        self.version = 1
+        self.full_reads = 0
+
+    def append(self, row):
+        self.rows.append(list(row))
+        self.version += 1
+
+    def evidencias_version(self):
+        return self.version
+
+    def get_evidencias(self, programa=None, columns=None):
+        self.full_reads += 1
+        return pd.DataFrame(self.rows, columns=EVIDENCIAS_COLUMNS)
+
+    def get_evidencias_after(self, known_rows, last_row):
+        if known_rows > len(self.rows) or (
+                known_rows and self.rows[known_rows - 1] != last_row):
+            return None
+        return pd.DataFrame(self.rows[known_rows:], columns=EVIDENCIAS_COLUMNS)
+
+
+def _row(name):
+    return ["A", "autor@u.cl", f"local://{name}", "2026-03-02 10:00:00-0300",
+            "C1", "D1", name]
+
+
+@pytest.fixture
+def store():
+    return FakeStore([_row("a.pdf"), _row("b.pdf")])
+
+
+def test_unchanged_version_reuses_the_table(store):
+    table = IncrementalTable(store)
+    first = table.read()
+    lectura = table.lectura
+    assert table.read() is first
+    assert table.lectura == lectura
+    assert table.reads == {'completas': 1, 'sin_cambios': 1}
+
+
+def test_appended_rows_are_read_incrementally(store):
+    table = IncrementalTable(store)
+    table.read()
+    lectura = table.lectura
+    store.append(_row("c.pdf"))
+
+    df = table.read()
+    assert df['nombre_archivo'].tolist() == ["a.pdf", "b.pdf", "c.pdf"]
+    assert table.lectura != lectura
+    assert store.full_reads == 1
+    assert table.reads['agregadas'] == 1
+
+
+def test_changed_last_row_falls_back_to_a_full_read(store):
+    table = IncrementalTable(store)
+    table.read()
+    store.rows[-1] = _row("reemplazada.pdf")
+    store.version += 1
+
+    df = table.read()
+    assert df['nombre_archivo'].tolist() == ["a.pdf", "reemplazada.pdf"]
+    assert store.full_reads == 2
+
+
+def test_own_rewrites_force_a_full_read(store):
+    table = IncrementalTable(store)
+    table.read()
+    del store.rows[0]
+    store.rewrites += 1  # Atributo de instancia: solo este repositorio
+
+    assert table.read()['nombre_archivo'].tolist() == ["b.pdf"]
+    assert store.full_reads == 2
+
+
+def test_full_read_interval_bounds_staleness(store):
+    table = IncrementalTable(store, full_read_interval=0)
+    table.read()
+    table.read()
+    assert table.reads == {'completas': 2}
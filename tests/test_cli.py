@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+import cli
+from metadata_store import SQLiteMetadataStore
+from storage_backend import LocalStorageBackend
+
+from conftest import evidencia
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    monkeypatch.setenv("METADATA_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "evidencias.db"))
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_STORAGE_DIR", str(tmp_path / "objetos"))
+    store = SQLiteMetadataStore(str(tmp_path / "evidencias.db"))
+    backend = LocalStorageBackend(str(tmp_path / "objetos"))
+    return store, backend
+
+
+def test_reconstruir_refuses_to_replace_with_unresolved_objects(entorno):
+    store, backend = entorno
+    url = backend.put("A/20260301_090000_a.pdf", io.BytesIO(b"a"))
+    backend.put("A/otra/raro.pdf", io.BytesIO(b"b"))
+    store.add_evidencias([
+        evidencia(programa="A", url=backend.object_url("A/otra/raro.pdf"),
+                  nombre_archivo="raro"),
+        evidencia(url="https://otro.sitio/externo.pdf",
+                  nombre_archivo="externo"),
+    ])
+
+    assert cli.main(["reconstruir", "--reemplazar"]) == 1
+    assert len(store.get_evidencias()) == 2
+
+    assert cli.main(["reconstruir", "--reemplazar", "--forzar"]) == 0
+    df = store.get_evidencias()
+    assert sorted(df['nombre_archivo']) == ["a.pdf", "externo", "raro"]
+    assert url in set(df['url_cloudinary'])
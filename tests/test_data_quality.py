@@ -0,0 +1,74 @@
+import pandas as pd
+
+from data_quality import check_evidencias, missing_link_records, name_fix_updates
+from time_index import with_time_index
+
+from conftest import evidencia
+
+
+def _table(criterio_oficial):
+    dimension, criterio = criterio_oficial
+    return pd.DataFrame([
+        evidencia(dimension=dimension, criterio=criterio, url="local://ok"),
+        # Nombre de carpeta limpiado: reconocible y corregible
+        evidencia(dimension=dimension.replace(".", "_"), criterio=criterio,
+                  url="local://carpeta"),
+        evidencia(dimension="inventada", criterio="inventado",
+                  url="local://desconocida"),
+        evidencia(dimension=dimension, criterio=criterio, url=""),
+        evidencia(dimension=dimension, criterio=criterio, url="local://fecha",
+                  fecha_hora="ayer"),
+        evidencia(dimension=dimension, criterio=criterio, url="local://autor",
+                  subido_por="intruso@u.cl"),
+    ])
+
+
+def test_each_issue_points_to_its_rows(criterio_oficial):
+    users = pd.DataFrame({'correo': ["AUTOR@u.cl"]})
+    report = check_evidencias(_table(criterio_oficial), users)
+
+    assert report.issues['dimension_desconocida'].tolist() == [1, 2]
+    assert report.issues['criterio_desconocido'].tolist() == [2]
+    assert report.issues['sin_enlace'].tolist() == [3]
+    assert report.issues['fecha_ilegible'].tolist() == [4]
+    assert report.issues['autor_desconocido'].tolist() == [5]
+    assert report.offending_rows == 5
+    assert report.total_rows == 6
+
+
+def test_time_indexed_table_reports_the_same_dates(criterio_oficial):
+    df = _table(criterio_oficial)
+    indexed = with_time_index(df)
+    report = check_evidencias(indexed)
+    # La fila ilegible queda primera en la tabla ordenada
+    assert report.issues['fecha_ilegible'].tolist() == [0]
+    assert 'autor_desconocido' not in report.issues
+
+
+def test_name_fixes_use_the_official_names(criterio_oficial):
+    dimension, criterio = criterio_oficial
+    df = _table(criterio_oficial)
+    report = check_evidencias(df)
+    updates = name_fix_updates(df, report)
+    assert [(record['url_cloudinary'], changes)
+            for record, changes in updates] == [
+                ("local://carpeta", {'dimension': dimension,
+                                     'criterio': criterio})
+            ]
+    summary = report.summary().set_index('problema')
+    assert summary.loc["Dimensión que no existe en los criterios"].tolist() \
+        == [2, 1]
+
+
+def test_missing_link_records_are_plain_text(criterio_oficial):
+    df = _table(criterio_oficial)
+    records = missing_link_records(df, check_evidencias(df))
+    assert len(records) == 1
+    assert records[0]['url_cloudinary'] == ""
+    assert all(isinstance(value, str) for value in records[0].values())
+
+
+def test_empty_report_has_no_offending_rows():
+    report = check_evidencias(pd.DataFrame(columns=['programa']))
+    assert report.offending_rows == 0
+    assert report.summary()['filas'].sum() == 0
@@ -0,0 +1,140 @@
+import io
+import urllib.error
+import urllib.request
+
+import pytest
+
+from download_server import (DownloadRegistry, DownloadServer, FileTickets,
+                             can_read, parse_range)
+from storage_backend import LocalStorageBackend
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=95-200", (95, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=100-", False),
+    ("bytes=10-5", False),
+    ("bytes=-0", False),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+def test_tickets_roundtrip_and_reject_tampering():
+    tickets = FileTickets("secreto")
+    ticket = tickets.issue("Programa_A/a.pdf", "Programa.A", "usuario", 60)
+    data = tickets.verify(ticket)
+    assert data["ruta"] == "Programa_A/a.pdf"
+
+    payload, signature = ticket.split(".")
+    assert tickets.verify(payload[:-2] + "xx." + signature) is None
+    assert tickets.verify("no-es-un-ticket") is None
+    assert FileTickets("otro").verify(ticket) is None
+    assert FileTickets("secreto").verify(ticket) == data
+
+
+def test_expired_tickets_are_rejected():
+    tickets = FileTickets()
+    assert tickets.verify(tickets.issue("a.pdf", "A", "admin", -1)) is None
+
+
+def test_can_read_compares_the_stored_programa():
+    assert can_read({"rol": "admin", "programa": ""}, None)
+    assert can_read({"rol": "usuario", "programa": "Programa.A"},
+                    "Programa.A ")
+    # Mismo nombre de carpeta, distinto programa
+    assert not can_read({"rol": "usuario", "programa": "Programa A"},
+                        "Programa.A")
+    assert not can_read({"rol": "usuario", "programa": ""}, "")
+    assert not can_read({"rol": "usuario", "programa": "Programa.A"}, None)
+
+
+@pytest.fixture
+def server(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    backend.put("Programa_A/a.pdf", io.BytesIO(bytes(range(100))),
+                "application/pdf", metadata={"programa": "Programa.A"})
+    # Objeto anterior a los metadatos: el programa sale de la fila
+    backend.put("Programa_A/antiguo.pdf", io.BytesIO(b"%PDF"),
+                "application/pdf")
+    server = DownloadServer(
+        0,
+        storage_backend=backend,
+        programa_of={"Programa_A/antiguo.pdf": "Programa A"}.get).start()
+    yield server
+    server.stop()
+
+
+def test_server_streams_ranges_of_authorized_files(server):
+    url = server.file_url("Programa_A/a.pdf", "Programa.A", "usuario", 60)
+    with urllib.request.urlopen(url) as response:
+        assert response.read() == bytes(range(100))
+
+    request = urllib.request.Request(url, headers={"Range": "bytes=10-19"})
+    with urllib.request.urlopen(request) as response:
+        assert response.status == 206
+        assert response.headers["Content-Range"] == "bytes 10-19/100"
+        assert response.read() == bytes(range(10, 20))
+
+
+def test_server_rejects_other_programas(server):
+    for path, programa in (("Programa_A/a.pdf", "Programa A"),
+                           ("Programa_A/antiguo.pdf", "Programa.A"),
+                           ("Programa_A/no_existe.pdf", "Programa.A")):
+        url = server.file_url(path, programa, "usuario", 60)
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url)
+        assert error.value.code == 403
+
+    url = server.file_url("Programa_A/antiguo.pdf", "Programa A", "usuario",
+                          60)
+    with urllib.request.urlopen(url) as response:
+        assert response.read() == b"%PDF"
+
+
+def test_registry_reuses_and_evicts_entries_by_filters():
+    registry = DownloadRegistry(max_entries=2)
+    spec = {"filtros": {"programa": "A"}, "formato": "CSV"}
+    key = registry.register(spec, "a.csv", "text/csv")
+    assert registry.register(dict(spec), "b.csv", "text/csv") == key
+    assert len(registry) == 1
+
+    registry.register({"filtros": {"programa": "B"}}, "b.csv", "text/csv")
+    registry.register({"filtros": {"programa": "C"}}, "c.csv", "text/csv")
+    assert len(registry) == 2
+    assert registry.lookup(key) is None
+
+
+def test_server_rebuilds_exports_from_their_filters():
+    specs = []
+
+    def producer(spec):
+        specs.append(spec)
+        return iter([b"programa\n", spec["filtros"]["programa"].encode()])
+
+    server = DownloadServer(0, export_producer=producer).start()
+    try:
+        spec = {"filtros": {"programa": "A"}, "formato": "CSV"}
+        url = server.export_url(spec, "a.csv", "text/csv", "a@x.cl", "admin")
+        with urllib.request.urlopen(url) as response:
+            assert response.read() == b"programa\nA"
+        assert specs == [spec]
+
+        # Solo los administradores y solo con tickets de exportación
+        for forbidden in (
+                server.export_url(spec, "a.csv", "text/csv", "u@x.cl",
+                                  "usuario"),
+                url.replace("/exportar/", "/archivo/"),
+                url[:-4] + "xxxx"):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(forbidden)
+            assert error.value.code == 403
+    finally:
+        server.stop()
@@ -0,0 +1,79 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from evidence_filters import EvidenceFilterIndex
+from time_index import between_dates, with_time_index
+
+
+@pytest.fixture
+def index():
+    df = pd.DataFrame({
+        'programa': ["A", "B", "A", "A", "B"],
+        'dimension': ["D1", "D1", "D2", "D1", "D2"],
+        'criterio': ["C1", "C2", "C3", "C1", "C3"],
+        'fecha_hora': [
+            "2026-03-01 10:00:00-0300", "2026-03-02 10:00:00-0300",
+            "2026-03-03 10:00:00-0300", "2026-03-04 10:00:00-0300", ""
+        ],
+        'nombre_archivo': ["a1", "b1", "a2", "a3", "b2"],
+    })
+    return EvidenceFilterIndex(with_time_index(df))
+
+
+def _reference(df, programa=None, dimension=None, criterio=None,
+               desde=None, hasta=None):
+    if desde is not None:
+        df = between_dates(df, desde, hasta)
+    for column, value in (('programa', programa), ('dimension', dimension),
+                          ('criterio', criterio)):
+        if value is not None:
+            df = df[df[column] == value]
+    return df
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {'programa': "A"},
+    {'programa': "A", 'dimension': "D1"},
+    {'programa': "B", 'criterio': "C3"},
+    {'fecha_desde': date(2026, 3, 2), 'fecha_hasta': date(2026, 3, 3)},
+    {'programa': "A", 'fecha_desde': date(2026, 3, 2),
+     'fecha_hasta': date(2026, 3, 4)},
+    {'programa': "inexistente"},
+])
+def test_apply_matches_the_boolean_mask_chain(index, filters):
+    vista = index.apply(**filters)
+    expected = _reference(index.evidencias_df,
+                          filters.get('programa'), filters.get('dimension'),
+                          filters.get('criterio'), filters.get('fecha_desde'),
+                          filters.get('fecha_hasta'))
+    assert len(vista) == len(expected)
+    assert vista.rows()['nombre_archivo'].tolist() == \
+        expected['nombre_archivo'].tolist()
+
+
+def test_counts_match_value_counts(index):
+    vista = index.apply(dimension="D1")
+    assert vista.counts('programa').to_dict() == {"A": 2, "B": 1}
+
+
+def test_options_follow_the_other_filters(index):
+    assert index.options('criterio', programa="A") == ["C1", "C3"]
+    assert index.options('criterio', programa="nadie") == []
+
+
+def test_chunks_cover_the_view_in_order(index):
+    vista = index.apply(programa="A")
+    chunks = list(vista.chunks(['nombre_archivo'], chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks)['nombre_archivo'].tolist() == ["a1", "a2", "a3"]
+
+
+def test_coverage_counts_each_combination(index):
+    coverage = index.apply().coverage()
+    row = coverage[(coverage['programa'] == "A") &
+                   (coverage['criterio'] == "C1")]
+    assert row['evidencias'].tolist() == [2]
+    assert coverage['evidencias'].sum() == 5
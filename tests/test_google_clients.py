@@ -0,0 +1,70 @@
+import pytest
+
+import google_clients
+from google_clients import GoogleClients
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """Reemplaza la creación real de credenciales y clientes"""
+    created = []
+
+    def fake(kind):
+
+        def create(*args):
+            created.append(kind)
+            return object()
+
+        return create
+
+    monkeypatch.setattr(google_clients, "create_credentials",
+                        fake("credenciales"))
+    monkeypatch.setattr(google_clients, "create_sheets_client",
+                        fake("sheets"))
+    monkeypatch.setattr(google_clients, "create_storage_client",
+                        fake("storage"))
+    return created
+
+
+CONFIG = {"GOOGLE_SHEETS_CREDENTIALS": "{}"}
+
+
+def test_prewarm_fills_the_shared_clients(created):
+    clients = GoogleClients()
+    thread = clients.prewarm(CONFIG)
+    thread.join(5)
+    assert created == ["credenciales", "sheets", "storage"]
+
+    # Las llamadas de la sesión reutilizan lo creado
+    sheets = clients.sheets_client()
+    assert clients.sheets_client() is sheets
+    clients.storage_client()
+    assert created == ["credenciales", "sheets", "storage"]
+    assert clients.prewarm(CONFIG) is thread
+
+
+def test_prewarm_only_builds_the_configured_clients(created):
+    clients = GoogleClients()
+    clients.prewarm(dict(CONFIG, METADATA_BACKEND="sqlite")).join(5)
+    assert created == ["credenciales", "storage"]
+    assert GoogleClients().prewarm({"METADATA_BACKEND": "sqlite",
+                                    "STORAGE_BACKEND": "local",
+                                    **CONFIG}) is None
+    assert GoogleClients().prewarm({}) is None
+
+
+def test_failures_are_not_cached(created, monkeypatch):
+    clients = GoogleClients()
+
+    def broken():
+        raise RuntimeError("sin red")
+
+    monkeypatch.setattr(google_clients, "create_credentials", broken)
+    clients.prewarm(CONFIG).join(5)
+    assert clients.last_error == "sin red"
+    with pytest.raises(RuntimeError):
+        clients.sheets_client()
+
+    monkeypatch.setattr(google_clients, "create_credentials",
+                        lambda: "credenciales")
+    assert clients.credentials() == "credenciales"
@@ -0,0 +1,156 @@
+import random
+
+import pytest
+
+from metadata_store import (EVIDENCIAS_COLUMNS, SheetsMetadataStore,
+                            SQLiteMetadataStore, match_rows)
+
+from conftest import evidencia
+
+
+def _brute_force(records, evidencias_data):
+    """Búsqueda lineal de referencia: primera fila no elegida que coincide"""
+    chosen = set()
+    positions = []
+    for evidencia_data in evidencias_data:
+        position = next(
+            (i for i, record in enumerate(records) if i not in chosen and all(
+                str(record.get(key, '')).strip() == str(value).strip()
+                for key, value in evidencia_data.items())), None)
+        if position is not None:
+            chosen.add(position)
+        positions.append(position)
+    return positions
+
+
+def test_match_rows_agrees_with_a_linear_scan():
+    rng = random.Random(7)
+    records = [{
+        'programa': rng.choice(["A", "B", " A "]),
+        'url_cloudinary': f"local://{rng.randrange(20)}",
+        'criterio': rng.choice(["C1", "C2"]),
+    } for _ in range(300)]
+    queries = []
+    for _ in range(200):
+        record = rng.choice(records)
+        fields = rng.sample(sorted(record), rng.randint(1, 3))
+        queries.append({field: record[field] for field in fields})
+    queries.append({'programa': "no existe"})
+
+    assert match_rows(records, queries) == _brute_force(records, queries)
+
+
+def test_match_rows_picks_each_duplicate_once():
+    records = [{'url_cloudinary': "x"}, {'url_cloudinary': "x"}]
+    assert match_rows(records, [{'url_cloudinary': "x"}] * 3) == [0, 1, None]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteMetadataStore(str(tmp_path / "evidencias.db"))
+
+
+def test_sqlite_update_and_delete_touch_one_row_each(store):
+    store.add_evidencias([
+        evidencia(url="local://a", criterio="viejo"),
+        evidencia(url="local://a", criterio="viejo"),
+        evidencia(url="local://b"),
+    ])
+
+    assert store.update_evidencias([({'url_cloudinary': " local://a "},
+                                     {'criterio': "nuevo"})]) == 1
+    assert store.get_evidencias()['criterio'].tolist() == [
+        "nuevo", "viejo", ""
+    ]
+
+    assert store.delete_evidencias([{'url_cloudinary': "local://a"},
+                                    {'url_cloudinary': "local://c"}]) == 1
+    assert store.get_evidencias()['criterio'].tolist() == ["viejo", ""]
+
+
+def test_sqlite_values_are_trimmed_and_lookups_use_the_index(store):
+    store.add_evidencias([evidencia(url=" local://a ")])
+    assert store.get_evidencias()['url_cloudinary'].tolist() == ["local://a"]
+
+    plan = store._connection().execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM evidencias "
+        "WHERE url_cloudinary = ?", ("local://a", )).fetchall()
+    assert "idx_evidencias_url" in str(plan)
+    assert store.delete_evidencias([{'url_cloudinary': "local://a "}]) == 1
+
+
+def test_sqlite_trims_databases_created_before_trimming(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "antigua.db")
+    SQLiteMetadataStore(path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO evidencias (url_cloudinary) VALUES (' local://a ')")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+    conn.close()
+
+    store = SQLiteMetadataStore(path)
+    assert store.update_evidencias([({'url_cloudinary': "local://a"},
+                                     {'criterio': " C1 "})]) == 1
+    assert store.get_evidencias()[['url_cloudinary', 'criterio']].values.tolist(
+    ) == [["local://a", "C1"]]
+
+
+def test_sqlite_projection_and_programa_filter(store):
+    store.add_evidencias([evidencia(programa="A"), evidencia(programa="B")])
+    df = store.get_evidencias(programa="B", columns=['programa', 'otra'])
+    assert list(df.columns) == ['programa']
+    assert df['programa'].tolist() == ["B"]
+
+
+class FakeSpreadsheet:
+    """Pestaña de evidencias en memoria con la API de valores de Sheets"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.ranges = []
+
+    def values_get(self, range_name):
+        return {"values": [self.rows[0]]}
+
+    def values_batch_get(self, ranges, params=None):
+        assert params == {"majorDimension": "COLUMNS"}
+        self.ranges.extend(ranges)
+        value_ranges = []
+        for range_name in ranges:
+            letter = range_name.split("!")[1].split("1:")[0]
+            position = ord(letter) - ord("A")
+            column = [row[position] if position < len(row) else ''
+                      for row in self.rows]
+            # La API omite las celdas vacías del final
+            while column and column[-1] == '':
+                column.pop()
+            value_ranges.append({"values": [column]})
+        return {"valueRanges": value_ranges}
+
+
+class FakeSheetsClient:
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open(self, name):
+        return self.spreadsheet
+
+
+def test_sheets_programa_read_keeps_values_of_any_type():
+    rows = [EVIDENCIAS_COLUMNS]
+    for programa, archivo in (("A", "informe.pdf"), ("B", "otro.pdf"),
+                              ("A", "2024"), ("A", "")):
+        row = evidencia(programa=programa, nombre_archivo=archivo)
+        rows.append([row[column] for column in EVIDENCIAS_COLUMNS])
+    spreadsheet = FakeSpreadsheet(rows)
+    store = SheetsMetadataStore(FakeSheetsClient(spreadsheet))
+
+    df = store.get_evidencias(programa="A", columns=['nombre_archivo'])
+    # Los valores de un tipo minoritario (un número entre textos) no se
+    # pierden y solo se leen las columnas necesarias
+    assert df['nombre_archivo'].tolist() == ["informe.pdf", "2024", ""]
+    assert list(df.columns) == ['nombre_archivo']
+    assert len(spreadsheet.ranges) == 2
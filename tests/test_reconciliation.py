@@ -0,0 +1,179 @@
+import io
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from metadata_store import EVIDENCIAS_COLUMNS, SQLiteMetadataStore
+from reconciliation import (apply_fixes, merge_rebuilt, rebuild_evidencias,
+                            reconcile)
+from storage_backend import (LocalStorageBackend, build_object_path,
+                             evidence_metadata)
+
+from conftest import evidencia
+
+DOS_HORAS = 2 * 60 * 60
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return LocalStorageBackend(str(tmp_path / "objetos"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteMetadataStore(str(tmp_path / "evidencias.db"))
+
+
+def _put(backend, path, age=0, metadata=None):
+    """Sube un objeto y retrasa su fecha de modificación age segundos"""
+    url = backend.put(path, io.BytesIO(b"%PDF-1.4 contenido %%EOF"),
+                      "application/pdf", metadata)
+    if age:
+        old = time.time() - age
+        os.utime(backend._full_path(path), (old, old))
+    return url
+
+
+def test_recent_object_with_its_row_is_not_dangling(backend, store):
+    # Regresión: los objetos recientes se omitían del listado y su fila se
+    # reportaba como colgante (y apply_fixes la eliminaba)
+    url = _put(backend, "Programa A/reciente.pdf")
+    store.add_evidencia(evidencia(url=url))
+
+    report = reconcile(store, backend)
+    assert report.dangling_rows == []
+    assert report.orphan_objects == []
+
+
+def test_recent_object_without_row_is_not_orphan(backend, store):
+    store.add_evidencia(evidencia(url=_put(backend, "Programa A/viejo.pdf",
+                                           age=DOS_HORAS)))
+    _put(backend, "Programa A/en_camino.pdf")
+
+    assert reconcile(store, backend).orphan_objects == []
+
+
+def test_old_orphans_and_dangling_rows_are_reported_and_fixed(backend, store):
+    kept = _put(backend, "Programa A/con_fila.pdf", age=DOS_HORAS)
+    _put(backend, "Programa A/huerfano.pdf", age=DOS_HORAS)
+    store.add_evidencias([
+        evidencia(url=kept),
+        evidencia(url=backend.object_url("Programa A/borrado.pdf")),
+        # Otro prefijo no listado: no se puede saber si falta
+        evidencia(url=backend.object_url("otro/archivo.pdf")),
+    ])
+
+    report = reconcile(store, backend, programas=["Programa A"])
+    assert report.orphan_objects == ["Programa A/huerfano.pdf"]
+    assert [row['url_cloudinary'] for row in report.dangling_rows] == [
+        backend.object_url("Programa A/borrado.pdf")
+    ]
+
+    apply_fixes(report, store, backend)
+    assert backend.stat("Programa A/huerfano.pdf") is None
+    remaining = reconcile(store, backend, programas=["Programa A"])
+    assert remaining.orphan_objects == [] and remaining.dangling_rows == []
+    assert len(store.get_evidencias()) == 2
+
+
+def test_rebuild_uses_metadata_then_path(backend, criterio_oficial):
+    dimension, criterio = criterio_oficial
+    con_metadatos = build_object_path("Programa A", "informe final.pdf",
+                                      dimension, criterio, "20260302_100000")
+    _put(backend, con_metadatos, metadata=evidence_metadata(
+        "Programa A", dimension, criterio, "autor@u.cl", "informe final.pdf",
+        "2026-03-02 10:00:00-0300", "id-1"))
+    desde_ruta = build_object_path("Programa B", "acta.pdf", dimension,
+                                   criterio, "20260301_090000")
+    _put(backend, desde_ruta)
+    # Ruta antigua sin dimensión ni criterio
+    _put(backend, "Programa B/20260228_080000_legado.pdf")
+    _put(backend, "Programa B/otra/sin_clasificar.pdf")
+    _put(backend, "suelto.pdf")
+
+    result = rebuild_evidencias(backend,
+                                known_programas=["Programa A", "Programa B"])
+    assert (result.from_metadata, result.from_path) == (1, 2)
+    assert sorted(result.unresolved) == [
+        "Programa B/otra/sin_clasificar.pdf", "suelto.pdf"
+    ]
+
+    df = result.evidencias_df
+    assert list(df.columns) == EVIDENCIAS_COLUMNS
+    # Ordenadas por fecha, como se habrían agregado
+    assert df['nombre_archivo'].tolist() == [
+        "legado.pdf", "acta.pdf", "informe final.pdf"
+    ]
+    assert df['programa'].tolist() == ["Programa B", "Programa B", "Programa A"]
+    assert df['criterio'].tolist() == ["", criterio, criterio]
+    assert df['url_cloudinary'].tolist()[1:] == [
+        backend.object_url(desde_ruta), backend.object_url(con_metadatos)
+    ]
+
+
+class CountingBackend(LocalStorageBackend):
+    """Backend local que anota los prefijos listados"""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.listed = []
+
+    def list(self, prefix=""):
+        self.listed.append(prefix)
+        return super().list(prefix)
+
+
+def test_full_rebuild_lists_each_top_level_folder(tmp_path):
+    backend = CountingBackend(str(tmp_path))
+    for programa in ("A", "B", "C"):
+        _put(backend, f"{programa}/x.pdf", metadata={'evidencia_id': programa,
+                                                     'programa': programa})
+
+    result = rebuild_evidencias(backend)
+    assert sorted(backend.listed) == ["A/", "B/", "C/"]
+    assert sorted(result.evidencias_df['programa']) == ["A", "B", "C"]
+
+
+def test_rebuild_of_one_programa_lists_only_its_prefix(backend):
+    _put(backend, "Programa A/a.pdf", metadata={'evidencia_id': "1",
+                                                 'programa': "Programa A"})
+    _put(backend, "Programa B/b.pdf", metadata={'evidencia_id': "2",
+                                                 'programa': "Programa B"})
+
+    result = rebuild_evidencias(backend, programas=["Programa A"])
+    assert result.evidencias_df['programa'].tolist() == ["Programa A"]
+
+
+def test_merge_rebuilt_keeps_other_programas(backend):
+    current = pd.DataFrame([
+        evidencia(programa="A", url="local://A/viejo", nombre_archivo="viejo"),
+        evidencia(programa="B", url="local://B/b",
+                  fecha_hora="2026-03-01 10:00:00-0300", nombre_archivo="b"),
+    ])
+    rebuilt = pd.DataFrame([
+        evidencia(programa="A", url="local://A/nuevo",
+                  fecha_hora="2026-03-03 10:00:00-0300", nombre_archivo="nuevo"),
+    ], columns=EVIDENCIAS_COLUMNS)
+
+    merged = merge_rebuilt(current, rebuilt, backend, programas=["A"])
+    assert merged['nombre_archivo'].tolist() == ["b", "nuevo"]
+
+
+def test_merge_rebuilt_keeps_rows_it_cannot_regenerate(backend):
+    current = pd.DataFrame([
+        evidencia(url="local://A/borrado", nombre_archivo="borrado"),
+        evidencia(url="https://otro.sitio/externo.pdf",
+                  nombre_archivo="externo"),
+        evidencia(url="", nombre_archivo="sin enlace"),
+        evidencia(url="local://A/otra/raro.pdf", nombre_archivo="raro"),
+    ])
+    rebuilt = pd.DataFrame([evidencia(url="local://A/a.pdf")],
+                           columns=EVIDENCIAS_COLUMNS)
+
+    merged = merge_rebuilt(current, rebuilt, backend,
+                           unresolved=["A/otra/raro.pdf"])
+    assert sorted(merged['nombre_archivo']) == [
+        "a.pdf", "externo", "raro", "sin enlace"
+    ]
@@ -0,0 +1,100 @@
+import time
+
+import pandas as pd
+import pytest
+
+import search_index
+from search_index import SearchIndex, build_match_query
+
+from conftest import evidencia
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SearchIndex(str(tmp_path / "indice.db"))
+
+
+def _urls(index):
+    return {
+        row[0]
+        for row in index._connection().execute("SELECT url FROM documentos")
+    }
+
+
+def test_sync_adds_rows_and_search_finds_them(index):
+    index.sync(pd.DataFrame([
+        evidencia(url="local://a", nombre_archivo="informe_anual.pdf"),
+        evidencia(url="local://b", nombre_archivo="acta.pdf",
+                  programa="Programa B"),
+    ]))
+    results = index.search("informe")
+    assert [r['url_cloudinary'] for r in results] == ["local://a"]
+    assert index.search("informe", programa="Programa B") == []
+
+
+def test_sync_keeps_pending_and_recent_documents(index):
+    for url in ("local://pendiente", "local://viejo", "local://reciente"):
+        index.upsert(url, evidencia())
+    # Solo uno sigue dentro del período de gracia
+    expired = time.monotonic() - search_index.RECENT_GRACE_SECONDS - 1
+    index._recent["local://pendiente"] = expired
+    index._recent["local://viejo"] = expired
+
+    table = pd.DataFrame([evidencia(url="local://a")])
+    index.sync(table, keep_urls=["local://pendiente"])
+    assert _urls(index) == {"local://a", "local://pendiente",
+                            "local://reciente"}
+
+    # Con documentos protegidos la misma tabla se vuelve a revisar
+    index.sync(table)
+    assert _urls(index) == {"local://a", "local://reciente"}
+
+
+def test_sync_detects_changes_in_the_middle_of_the_table(index):
+    rows = [evidencia(url=f"local://{i}") for i in range(3)]
+    index.sync(pd.DataFrame(rows))
+    rows[1] = evidencia(url="local://reemplazo")
+    index.sync(pd.DataFrame(rows))
+    assert _urls(index) == {"local://0", "local://reemplazo", "local://2"}
+
+
+def test_build_match_query_quotes_terms():
+    assert build_match_query("") == ""
+    assert build_match_query('informe "anual" OR') == \
+        '"informe"* "anual"* "OR"*'
+
+
+def test_sync_skips_a_table_already_synced_for_its_lectura(index):
+    table = pd.DataFrame([evidencia(url="local://a")])
+    table.attrs['lectura'] = "lectura-1"
+    index.sync(table)
+    index._connection().execute("DELETE FROM documentos")
+    index.sync(table)
+    assert _urls(index) == set()
+
+    table.attrs['lectura'] = "lectura-2"
+    index.sync(table)
+    assert _urls(index) == {"local://a"}
+
+
+def test_index_upload_extracts_content_in_the_background(index):
+    import io
+    import zipfile
+
+    docx = io.BytesIO()
+    with zipfile.ZipFile(docx, "w") as archive:
+        archive.writestr("word/document.xml",
+                         "<w:t>Plan de mejora continua del programa</w:t>")
+    docx.seek(3)
+    future = index.index_upload("local://plan.docx", docx, "plan.docx",
+                                evidencia(nombre_archivo="plan.docx"))
+    try:
+        assert future.result(timeout=60) == \
+            "Plan de mejora continua del programa"
+    finally:
+        index._pool().shutdown()
+    assert docx.tell() == 3
+
+    [result] = index.search("mejora")
+    assert result['fragmento'] == \
+        "Plan de «mejora» continua del programa"
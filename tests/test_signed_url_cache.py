@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from main import SignedUrlCache
+from storage_backend import LocalStorageBackend
+
+
+class CountingSigner:
+
+    def __init__(self):
+        self.paths = []
+
+    def __call__(self, path, expiration):
+        self.paths.append(path)
+        return f"https://firmada/{path}?n={len(self.paths)}"
+
+
+def test_each_object_is_signed_once_while_valid(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    cache = SignedUrlCache()
+    signer = CountingSigner()
+    urls = [backend.object_url("A/a.pdf"), backend.object_url("A/b.pdf"),
+            backend.object_url("A/a.pdf")]
+
+    first = cache.get_many(backend, urls, signer=signer)
+    assert first[0] == first[2]
+    assert first[0].startswith("https://firmada/A/a.pdf?")
+    assert cache.get_many(backend, urls, signer=signer) == first
+    assert sorted(signer.paths) == ["A/a.pdf", "A/b.pdf"]
+
+
+def test_foreign_urls_are_returned_as_is(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    signer = CountingSigner()
+    assert SignedUrlCache().get_many(
+        backend, ["https://otro.sitio/a.pdf", ""],
+        signer=signer) == ["https://otro.sitio/a.pdf", ""]
+    assert signer.paths == []
+
+
+def test_entries_expire_before_the_url(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    # Margen igual a la vigencia: las entradas nacen vencidas
+    cache = SignedUrlCache(expiration=timedelta(minutes=10),
+                           refresh_margin=timedelta(minutes=10))
+    signer = CountingSigner()
+    url = backend.object_url("A/a.pdf")
+    cache.get_many(backend, [url], signer=signer)
+    cache.get_many(backend, [url], signer=signer)
+    assert signer.paths == ["A/a.pdf", "A/a.pdf"]
+
+
+def test_scopes_and_eviction(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    cache = SignedUrlCache(max_entries=4)
+    signer = CountingSigner()
+    url = backend.object_url("A/a.pdf")
+    cache.get_many(backend, [url], signer=signer, scope="uno")
+    cache.get_many(backend, [url], signer=signer, scope="dos")
+    assert len(signer.paths) == 2
+
+    cache.get_many(backend, [backend.object_url(f"A/{i}.pdf")
+                             for i in range(2)], signer=signer)
+    assert len(cache._entries) == 4
+    # Al llenarse se descartan las más antiguas hasta la mitad
+    cache.get_many(backend, [backend.object_url("A/nueva.pdf")], signer=signer)
+    assert len(cache._entries) == 3
+    assert ("local", "uno", "A/a.pdf") not in cache._entries
@@ -0,0 +1,77 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from snapshot import SnapshotStore, WarmStartCache, content_version
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    return SnapshotStore(str(tmp_path / "instantaneas"))
+
+
+DF = pd.DataFrame({'programa': ["A", "B"], 'criterio': ["C1", "C2"]})
+
+
+def test_content_version_follows_the_content():
+    assert content_version(DF) == content_version(DF.copy())
+    changed = DF.copy()
+    changed.loc[1, 'criterio'] = "C3"
+    assert content_version(changed) != content_version(DF)
+    assert content_version(DF.rename(columns={'criterio': 'c'})) != \
+        content_version(DF)
+
+
+def test_save_and_load_roundtrip(snapshots):
+    version = snapshots.save("evidencias", DF)
+    df, info = snapshots.load("evidencias")
+    pd.testing.assert_frame_equal(df, DF, check_dtype=False)
+    assert info["version"] == version
+    assert info["edad"] >= 0
+    assert snapshots.load("usuarios") == (None, None)
+
+
+def test_mixed_types_are_saved_as_text(snapshots):
+    snapshots.save("mixta", pd.DataFrame({'valor': [1, "dos", None]}))
+    df, _ = snapshots.load("mixta")
+    assert df['valor'].tolist() == ["1", "dos", ""]
+
+
+def test_first_access_serves_the_snapshot_and_refreshes(snapshots):
+    snapshots.save("evidencias", DF)
+    fresh = pd.concat([DF, DF], ignore_index=True)
+    refreshed = []
+    cache = WarmStartCache(snapshots, on_refresh=refreshed.append)
+
+    served = cache.read("evidencias", lambda: fresh)
+    assert len(served) == 2
+    deadline = time.monotonic() + 5
+    while not refreshed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert refreshed == ["evidencias"]
+    assert len(snapshots.load("evidencias")[0]) == 4
+
+    # Los siguientes accesos leen el repositorio
+    assert len(cache.read("evidencias", lambda: fresh)) == 4
+
+
+def test_old_snapshots_are_not_served(snapshots):
+    snapshots.save("evidencias", DF)
+    old = time.time() - 3600
+    os.utime(snapshots._path("evidencias"), (old, old))
+    cache = WarmStartCache(snapshots, max_age=60)
+    assert cache.read("evidencias", lambda: DF.iloc[:1]).equals(DF.iloc[:1])
+
+
+def test_same_table_is_saved_once(snapshots, monkeypatch):
+    cache = WarmStartCache(snapshots)
+    saves = []
+    original = snapshots.save
+    monkeypatch.setattr(snapshots, "save",
+                        lambda name, df: saves.append(name) or original(
+                            name, df))
+    cache.read("evidencias", lambda: DF)
+    cache.read("evidencias", lambda: DF)
+    assert saves == ["evidencias"]
@@ -0,0 +1,112 @@
+import io
+
+import pytest
+from google.api_core.exceptions import NotFound
+
+from storage_backend import (GCSStorageBackend, LocalStorageBackend,
+                             StorageError, _ProgressReader, build_object_path)
+
+
+class FakeBucket:
+    """Bucket en memoria que cuenta las eliminaciones"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def delete_blob(self, path):
+        self.client.deletes.append(path)
+        if path not in self.client.objects:
+            raise NotFound(path)
+        self.client.objects.discard(path)
+
+
+class FakeClient:
+
+    def __init__(self, objects):
+        self.objects = set(objects)
+        self.deletes = []
+
+    def bucket(self, name):
+        return FakeBucket(self)
+
+
+def test_delete_many_reports_which_objects_existed():
+    # Regresión: se reportaba True para todas las rutas
+    client = FakeClient({"a", "c"})
+    backend = GCSStorageBackend(client, "bucket")
+
+    paths = [f"x{i}" for i in range(40)] + ["a", "b", "c"]
+    results = backend.delete_many(paths)
+    assert list(results) == paths
+    assert (results["a"], results["b"], results["c"]) == (True, False, True)
+    assert sorted(client.deletes) == sorted(paths)
+    assert client.objects == set()
+    assert backend.delete_many([]) == {}
+
+
+def test_chunk_size_is_a_multiple_of_256_kib():
+    backend = GCSStorageBackend(FakeClient(()), "bucket",
+                                chunk_size=1000 * 1024)
+    assert backend.chunk_size == 768 * 1024
+    assert GCSStorageBackend(FakeClient(()), "bucket",
+                             chunk_size=1).chunk_size == 256 * 1024
+
+
+def test_progress_reader_reports_the_position():
+    calls = []
+    reader = _ProgressReader(io.BytesIO(b"x" * 10), 10,
+                             lambda sent, total: calls.append((sent, total)))
+    reader.read(4)
+    reader.seek(0)  # Reintento de la librería
+    reader.read()
+    assert calls == [(4, 10), (10, 10)]
+    assert reader.tell() == 10
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStorageBackend(str(tmp_path))
+
+
+def test_local_put_stat_list_and_read(local):
+    path = build_object_path("Programa.A", "mi archivo.pdf",
+                             timestamp="20260302_100000")
+    assert path == "Programa_A/20260302_100000_mi_archivo.pdf"
+    progress = []
+    url = local.put(path, io.BytesIO(b"0123456789"), "application/pdf",
+                    {"evidencia_id": "1"},
+                    progress=lambda sent, total: progress.append(sent))
+    assert local.path_from_url(url) == path
+    assert progress[-1] == 10
+
+    stored = local.stat(path)
+    assert (stored.size, stored.content_type, stored.metadata) == (
+        10, "application/pdf", {"evidencia_id": "1"})
+    assert [s.name for s in local.list("Programa_A/")] == [path]
+    assert list(local.list("Otro/")) == []
+    assert b"".join(local.open_read(path, 2, 5, chunk_size=3)) == b"2345"
+
+
+def test_local_delete_many_and_invalid_paths(local):
+    local.put("A/a.pdf", io.BytesIO(b"a"))
+    assert local.delete_many(["A/a.pdf", "A/b.pdf"]) == {
+        "A/a.pdf": True,
+        "A/b.pdf": False
+    }
+    with pytest.raises(StorageError):
+        local.put("../fuera.pdf", io.BytesIO(b"a"))
+    with pytest.raises(StorageError):
+        local.put(".meta/x.json", io.BytesIO(b"a"))
+
+
+def test_local_list_level_splits_folders_and_objects(local):
+    for path in ("suelto.pdf", "A/a.pdf", "A/x/b.pdf", "B/c.pdf"):
+        local.put(path, io.BytesIO(b"x"))
+
+    folders, objects = local.list_level("")
+    assert folders == ["A/", "B/"]
+    assert [o.name for o in objects] == ["suelto.pdf"]
+    folders, objects = local.list_level("A/")
+    assert folders == ["A/x/"]
+    assert [o.name for o in objects] == ["A/a.pdf"]
+    assert local.list_level("Z/") == ([], [])
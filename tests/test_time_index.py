@@ -0,0 +1,65 @@
+from datetime import date
+
+import pandas as pd
+
+from time_index import (TIME_INDEX_NAME, between_dates, count_since,
+                        date_bounds, parse_fecha_hora, with_time_index)
+
+
+def test_parse_fecha_hora_handles_offsets_legacy_and_garbage():
+    parsed = parse_fecha_hora(
+        pd.Series([
+            "2026-03-02 10:00:00-0300", "2026-03-02 10:00:00", "", "no es fecha"
+        ]))
+    assert parsed[0] == pd.Timestamp("2026-03-02 13:00:00", tz="UTC")
+    # Sin desfase se interpreta en APP_TIMEZONE (UTC-3 en marzo)
+    assert parsed[1] == pd.Timestamp("2026-03-02 13:00:00", tz="UTC")
+    assert parsed[2:].isna().all()
+
+
+def test_with_time_index_sorts_and_puts_missing_dates_first():
+    df = pd.DataFrame({
+        'fecha_hora': ["2026-03-03 09:00:00-0300", "", "2026-03-01 09:00:00-0300"],
+        'nombre_archivo': ["c", "sin fecha", "a"],
+    })
+    indexed = with_time_index(df)
+    assert indexed.index.name == TIME_INDEX_NAME
+    assert indexed['nombre_archivo'].tolist() == ["sin fecha", "a", "c"]
+
+
+def test_date_bounds_include_both_local_days():
+    df = with_time_index(
+        pd.DataFrame({
+            'fecha_hora': [
+                "2026-03-01 23:59:59-0300", "2026-03-02 00:00:00-0300",
+                "2026-03-03 23:59:59-0300", "2026-03-04 00:00:00-0300"
+            ]
+        }))
+    assert date_bounds(df, date(2026, 3, 2), date(2026, 3, 3)) == (1, 3)
+    assert len(between_dates(df, date(2026, 3, 2), date(2026, 3, 3))) == 2
+
+
+def test_count_since_ignores_rows_without_date():
+    df = with_time_index(
+        pd.DataFrame({
+            'fecha_hora': ["", "2026-03-01 10:00:00-0300", "2026-03-05 10:00:00-0300"]
+        }))
+    assert count_since(df, pd.Timestamp("2026-03-02", tz="UTC")) == 1
+
+
+def test_without_fecha_hora_the_table_is_returned_as_is():
+    df = pd.DataFrame({'programa': ["A"]})
+    assert with_time_index(df) is df
+    assert count_since(df, pd.Timestamp("2026-01-01", tz="UTC")) == 0
+
+
+def test_legacy_dates_in_the_repeated_hour_use_standard_time():
+    # En Santiago, el 2026-04-04 a las 24:00 se vuelve a las 23:00 (UTC-4)
+    fechas = pd.Series(["2026-04-04 23:30:00", "2026-04-04 22:30:00"])
+    parsed = parse_fecha_hora(fechas)
+    assert parsed[0] == pd.Timestamp("2026-04-05 03:30:00", tz="UTC")
+    assert parsed[1] == pd.Timestamp("2026-04-05 01:30:00", tz="UTC")
+
+    # Ambas quedan dentro del día local consultado
+    df = with_time_index(pd.DataFrame({'fecha_hora': fechas}))
+    assert date_bounds(df, date(2026, 4, 4), date(2026, 4, 4)) == (0, 2)
@@ -0,0 +1,61 @@
+import io
+
+from upload_validation import max_size_mb, validate_upload, validate_uploads
+
+PDF = b"%PDF-1.4\n" + b"x" * 100 + b"\n%%EOF\n"
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+def _file(name, content):
+    fileobj = io.BytesIO(content)
+    fileobj.name = name
+    return fileobj
+
+
+def test_valid_file_gets_size_and_hash():
+    result = validate_upload(_file("a.pdf", PDF), "a.pdf")
+    assert result.valido
+    assert result.tamaño == len(PDF)
+    assert len(result.sha256) == 64
+
+
+def test_content_must_match_the_extension():
+    result = validate_upload(_file("a.pdf", PNG), "a.pdf")
+    assert not result.valido
+    assert "no corresponde" in result.motivo
+    assert validate_upload(_file("imagen.PNG", PNG), "imagen.PNG").valido
+
+
+def test_unknown_extension_empty_file_and_incomplete_pdf():
+    assert "no permitido" in validate_upload(_file("a.exe", PDF),
+                                             "a.exe").motivo
+    assert "vacío" in validate_upload(_file("a.pdf", b""), "a.pdf").motivo
+    assert "incompleto" in validate_upload(_file("a.pdf", PDF[:50]),
+                                           "a.pdf").motivo
+
+
+def test_size_limits_come_from_the_configuration():
+    assert max_size_mb("pdf", {}) == 200
+    assert max_size_mb("pdf", {"MAX_SIZE_MB": "50"}) == 50
+    assert max_size_mb("pdf", {"MAX_SIZE_MB": "50",
+                               "MAX_SIZE_MB_PDF": "0.0001"}) == 0.0001
+
+    config = {"MAX_SIZE_MB_PDF": "0.0001"}  # Unos 100 bytes
+    result = validate_upload(_file("a.pdf", PDF), "a.pdf", config=config)
+    assert not result.valido
+    assert "0.0001 MB" in result.motivo
+    assert validate_upload(_file("b.png", PNG), "b.png", config=config).valido
+
+
+def test_validation_rewinds_the_file():
+    fileobj = _file("a.pdf", PDF)
+    validate_upload(fileobj, "a.pdf", chunk_size=7)
+    assert fileobj.tell() == 0
+
+
+def test_duplicates_within_a_group_are_rejected():
+    results = validate_uploads(
+        [_file("a.pdf", PDF), _file("copia.pdf", PDF), _file("b.png", PNG)],
+        config={})
+    assert [r.valido for r in results] == [True, False, True]
+    assert results[1].motivo == "contenido idéntico a a.pdf"
@@ -0,0 +1,124 @@
+import json
+
+import pandas as pd
+import pytest
+
+from metadata_store import SQLiteMetadataStore
+from write_behind import RegistrationJournal
+
+from conftest import evidencia
+
+
+class FailingStore:
+    """Repositorio que rechaza todas las escrituras"""
+
+    def get_evidencias(self, programa=None, columns=None):
+        return pd.DataFrame(columns=['url_cloudinary'])
+
+    def add_evidencias(self, evidencias):
+        raise RuntimeError("cuota excedida")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteMetadataStore(str(tmp_path / "evidencias.db"))
+
+
+def _journal(path, store, **options):
+    # Un intervalo largo deja el vaciado en manos de la prueba
+    options.setdefault('flush_interval', 3600)
+    return RegistrationJournal(str(path), store, **options)
+
+
+def test_flush_writes_pending_in_one_batch(tmp_path, store):
+    journal = _journal(tmp_path / "diario.jsonl", store)
+    try:
+        for i in range(3):
+            journal.submit(evidencia(url=f"local://{i}.pdf"))
+        assert len(journal.pending()) == 3
+
+        assert journal.flush() == 3
+        assert journal.flush() == 0
+    finally:
+        journal.close()
+    assert journal.pending() == []
+    assert store.get_evidencias()['url_cloudinary'].tolist() == [
+        "local://0.pdf", "local://1.pdf", "local://2.pdf"
+    ]
+
+
+def test_failed_flush_keeps_entries_for_the_next_start(tmp_path, store):
+    path = tmp_path / "diario.jsonl"
+    journal = _journal(path, FailingStore())
+    journal.submit(evidencia(url="local://a.pdf"))
+    with pytest.raises(RuntimeError):
+        journal.flush()
+    journal.close()
+
+    # Al reiniciar se recupera la entrada y se registra
+    journal = _journal(path, store)
+    try:
+        assert [e['url_cloudinary'] for e in journal.pending()] == [
+            "local://a.pdf"
+        ]
+        journal.flush()
+    finally:
+        journal.close()
+    assert len(store.get_evidencias()) == 1
+
+
+def test_replay_skips_done_entries_and_already_registered_ones(tmp_path, store):
+    path = tmp_path / "diario.jsonl"
+    store.add_evidencia(evidencia(url="local://ya.pdf"))
+    lines = [
+        {"op": "add", "id": "1", "evidencia": evidencia(url="local://hecha.pdf")},
+        {"op": "add", "id": "2", "evidencia": evidencia(url="local://ya.pdf")},
+        {"op": "add", "id": "3", "evidencia": evidencia(url="local://nueva.pdf")},
+        {"op": "done", "ids": ["1"]},
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+        f.write('{"op": "add", "id": "4", "evid')  # Caída a mitad de línea
+
+    journal = _journal(path, store)
+    try:
+        assert [e['url_cloudinary'] for e in journal.pending()] == [
+            "local://nueva.pdf"
+        ]
+        # El diario queda compactado con solo lo pendiente
+        with open(path, encoding="utf-8") as f:
+            assert [json.loads(line)["id"] for line in f] == ["3"]
+    finally:
+        journal.close()
+
+
+def test_close_drains_the_queue(tmp_path, store):
+    journal = _journal(tmp_path / "diario.jsonl", store)
+    journal.submit(evidencia(url="local://a.pdf"))
+    journal.close()
+    assert journal.pending() == []
+    assert len(store.get_evidencias()) == 1
+
+
+def test_cancel_before_flush_keeps_deleted_evidencia_out(tmp_path, store):
+    path = tmp_path / "diario.jsonl"
+    journal = _journal(path, FailingStore())
+    journal.submit(evidencia(url="local://a.pdf"))
+    journal.submit(evidencia(url="local://b.pdf"))
+    assert journal.cancel("local://a.pdf") == 1
+    assert journal.cancel("local://a.pdf") == 0
+    assert [e['url_cloudinary'] for e in journal.pending()] == [
+        "local://b.pdf"
+    ]
+    journal.close()
+
+    # La cancelación queda en el diario y sobrevive al reinicio
+    journal = _journal(path, store)
+    try:
+        assert journal.flush() == 1
+    finally:
+        journal.close()
+    assert store.get_evidencias()['url_cloudinary'].tolist() == [
+        "local://b.pdf"
+    ]
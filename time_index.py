@@ -0,0 +1,153 @@
+"""Fechas de las evidencias e índice temporal ordenado.
+
+Las evidencias nuevas guardan ``fecha_hora`` con su desfase horario
+(``%Y-%m-%d %H:%M:%S%z``); las antiguas, sin desfase, se interpretan en la
+zona ``APP_TIMEZONE``. Al leer la tabla, las fechas se convierten una sola vez
+a UTC y la tabla queda ordenada con un ``DatetimeIndex``, de modo que los
+filtros por rango de fechas se resuelven con búsqueda binaria.
+"""
+import os
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+FECHA_HORA_FORMAT = "%Y-%m-%d %H:%M:%S%z"
+LEGACY_FECHA_HORA_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_TIMEZONE = "America/Santiago"
+TIME_INDEX_NAME = "fecha_utc"
+
+_HAS_OFFSET = r"(?:[+-]\d{2}:?\d{2}|Z)$"
+
+
+# Función para obtener la zona horaria de la aplicación
+def app_timezone():
+    """Retorna la zona horaria configurada en APP_TIMEZONE"""
+    return ZoneInfo(os.getenv("APP_TIMEZONE", DEFAULT_TIMEZONE))
+
+
+# Función para obtener la fecha y hora actual con desfase horario
+def now_fecha_hora():
+    """Retorna la fecha y hora actual en el formato que se guarda en la tabla"""
+    return datetime.now(app_timezone()).strftime(FECHA_HORA_FORMAT)
+
+
+def _parse(values, fmt, **kwargs):
+    import pandas as pd
+
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce', **kwargs)
+    # Valores con otro formato (por ejemplo, editados a mano en la hoja)
+    retry = parsed.isna() & values.ne('')
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry],
+                                       format='mixed',
+                                       errors='coerce',
+                                       **kwargs)
+    return parsed
+
+
+# Función para convertir la columna fecha_hora a UTC
+def parse_fecha_hora(fechas, tz=None):
+    """Convierte la serie de fechas (con o sin desfase) a datetime64 en UTC.
+
+    Una fecha sin desfase en la hora repetida al volver al horario estándar
+    se interpreta en horario estándar (la segunda pasada).
+    """
+    import numpy as np
+    import pandas as pd
+
+    tz = tz or app_timezone()
+    values = fechas.fillna('').astype(str).str.strip()
+    result = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns, UTC]")
+
+    has_offset = values.str.contains(_HAS_OFFSET, regex=True)
+    if has_offset.any():
+        result[has_offset] = _parse(values[has_offset],
+                                    FECHA_HORA_FORMAT,
+                                    utc=True)
+    legacy = ~has_offset & values.ne('')
+    if legacy.any():
+        naive = _parse(values[legacy], LEGACY_FECHA_HORA_FORMAT)
+        result[legacy] = naive.dt.tz_localize(
+            tz,
+            ambiguous=np.zeros(len(naive), dtype=bool),
+            nonexistent='shift_forward').dt.tz_convert('UTC')
+    return result
+
+
+# Función para ordenar las evidencias por fecha con un índice temporal
+def with_time_index(evidencias_df):
+    """Retorna las evidencias ordenadas por fecha con un DatetimeIndex en UTC.
+
+    Las filas sin fecha válida (NaT) quedan al comienzo y nunca caen dentro
+    de un rango consultado.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if 'fecha_hora' not in evidencias_df.columns:
+        return evidencias_df
+
+    fechas = pd.DatetimeIndex(parse_fecha_hora(
+        evidencias_df['fecha_hora'])).as_unit('ns')
+    order = np.argsort(fechas.asi8, kind="stable")
+    indexed = evidencias_df.iloc[order]
+    indexed.index = fechas[order].rename(TIME_INDEX_NAME)
+    return indexed
+
+
+def _to_utc_nanos(moment):
+    import pandas as pd
+
+    timestamp = pd.Timestamp(moment)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize(app_timezone())
+    return timestamp.tz_convert('UTC').value
+
+
+def _bounds(evidencias_df, start=None, end=None):
+    """Posiciones [inicio, fin) de las filas con start <= fecha < end"""
+    nanos = evidencias_df.index.asi8
+    lo = 0 if start is None else int(
+        nanos.searchsorted(_to_utc_nanos(start), side='left'))
+    hi = len(nanos) if end is None else int(
+        nanos.searchsorted(_to_utc_nanos(end), side='left'))
+    return lo, max(lo, hi)
+
+
+# Función para filtrar evidencias por rango de fechas
+def between(evidencias_df, start=None, end=None):
+    """Retorna las evidencias con start <= fecha < end (búsqueda binaria)"""
+    if evidencias_df.index.name != TIME_INDEX_NAME:
+        return evidencias_df
+    lo, hi = _bounds(evidencias_df, start, end)
+    return evidencias_df.iloc[lo:hi]
+
+
+# Función para obtener las posiciones de un rango de días
+def date_bounds(evidencias_df, fecha_desde, fecha_hasta):
+    """Retorna las posiciones [inicio, fin) de las evidencias entre dos días locales"""
+    if evidencias_df.index.name != TIME_INDEX_NAME:
+        return 0, len(evidencias_df)
+    tz = app_timezone()
+    start = datetime.combine(fecha_desde, dt_time.min, tzinfo=tz)
+    end = datetime.combine(fecha_hasta + timedelta(days=1),
+                           dt_time.min,
+                           tzinfo=tz)
+    return _bounds(evidencias_df, start, end)
+
+
+# Función para filtrar evidencias por rango de días
+def between_dates(evidencias_df, fecha_desde, fecha_hasta):
+    """Retorna las evidencias entre dos días locales, ambos incluidos"""
+    if evidencias_df.index.name != TIME_INDEX_NAME:
+        return evidencias_df
+    lo, hi = date_bounds(evidencias_df, fecha_desde, fecha_hasta)
+    return evidencias_df.iloc[lo:hi]
+
+
+# Función para contar evidencias desde una fecha
+def count_since(evidencias_df, start):
+    """Cuenta las evidencias con fecha posterior o igual a start"""
+    if evidencias_df.index.name != TIME_INDEX_NAME:
+        return 0
+    lo, hi = _bounds(evidencias_df, start, None)
+    return hi - lo
@@ -0,0 +1,127 @@
+"""Validación de archivos antes de subirlos.
+
+En una sola lectura de cada archivo se calcula su SHA-256, se comprueba que
+los primeros bytes (número mágico) correspondan a la extensión declarada y se
+aplica el tamaño máximo del tipo. Los archivos rechazados no llegan al
+almacenamiento ni a la base de datos.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+
+VALIDATION_CHUNK_SIZE = 1024 * 1024
+
+_OLE2 = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # Office 97-2003
+_ZIP = b"PK\x03\x04"  # Office Open XML
+
+# Firmas válidas por extensión
+MAGIC_NUMBERS = {
+    'pdf': (b"%PDF-", ),
+    'jpg': (b"\xff\xd8\xff", ),
+    'jpeg': (b"\xff\xd8\xff", ),
+    'png': (b"\x89PNG\r\n\x1a\n", ),
+    'doc': (_OLE2, ),
+    'xls': (_OLE2, ),
+    'ppt': (_OLE2, ),
+    'docx': (_ZIP, ),
+    'xlsx': (_ZIP, ),
+    'pptx': (_ZIP, ),
+}
+
+# Tamaño máximo por defecto, en MB: el mismo límite de st.file_uploader
+# (server.maxUploadSize), para no rechazar lo que la aplicación ya acepta
+DEFAULT_MAX_SIZE_MB = 200
+
+# Un PDF completo termina con %%EOF (se busca en los últimos bytes)
+_PDF_TAIL_SIZE = 2048
+
+
+# Función para obtener el tamaño máximo de un tipo de archivo
+def max_size_mb(extension, config=None):
+    """Retorna el tamaño máximo en MB para la extensión según la configuración.
+
+    MAX_SIZE_MB_<EXTENSIÓN> (por ejemplo MAX_SIZE_MB_PDF) tiene prioridad
+    sobre MAX_SIZE_MB; sin ninguna de las dos se usa DEFAULT_MAX_SIZE_MB.
+    """
+    config = os.environ if config is None else config
+    value = config.get(f"MAX_SIZE_MB_{extension.upper()}") or config.get(
+        "MAX_SIZE_MB")
+    return float(value) if value else DEFAULT_MAX_SIZE_MB
+
+
+@dataclass
+class ValidationResult:
+    """Resultado de validar un archivo"""
+    nombre: str
+    valido: bool
+    motivo: str = ""
+    tamaño: int = 0
+    sha256: str = ""
+
+
+# Función para validar un archivo en una sola lectura
+def validate_upload(fileobj,
+                    filename,
+                    chunk_size=VALIDATION_CHUNK_SIZE,
+                    config=None):
+    """Valida tipo, firma y tamaño del archivo y calcula su SHA-256"""
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    if extension not in MAGIC_NUMBERS:
+        return ValidationResult(filename, False,
+                                f"tipo de archivo no permitido (.{extension})")
+
+    limit_mb = max_size_mb(extension, config)
+    max_size = limit_mb * 1024 * 1024
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    tail = b""
+
+    fileobj.seek(0)
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            if not head:
+                head = chunk[:16]
+                if not head.startswith(MAGIC_NUMBERS[extension]):
+                    return ValidationResult(
+                        filename, False,
+                        f"el contenido no corresponde a un archivo .{extension}",
+                        size)
+            size += len(chunk)
+            if size > max_size:
+                return ValidationResult(
+                    filename, False,
+                    f"supera el máximo de {limit_mb:g} MB para .{extension}",
+                    size)
+            digest.update(chunk)
+            # Solo el final del bloque: no se copia el bloque completo
+            tail = (tail + chunk[-_PDF_TAIL_SIZE:])[-_PDF_TAIL_SIZE:]
+    finally:
+        fileobj.seek(0)
+
+    if size == 0:
+        return ValidationResult(filename, False, "el archivo está vacío")
+    if extension == 'pdf' and b"%%EOF" not in tail:
+        return ValidationResult(filename, False,
+                                "el PDF está incompleto o dañado", size)
+    return ValidationResult(filename, True, tamaño=size,
+                            sha256=digest.hexdigest())
+
+
+# Función para validar un grupo de archivos
+def validate_uploads(files, config=None):
+    """Valida los archivos y rechaza los repetidos dentro del mismo grupo"""
+    results = []
+    seen = {}
+    for fileobj in files:
+        result = validate_upload(fileobj, fileobj.name, config=config)
+        if result.valido and result.sha256 in seen:
+            result.valido = False
+            result.motivo = f"contenido idéntico a {seen[result.sha256]}"
+        elif result.valido:
+            seen[result.sha256] = fileobj.name
+        results.append(result)
+    return results
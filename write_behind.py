@@ -0,0 +1,209 @@
+"""Registro diferido (write-behind) de evidencias.
+
+Las evidencias se anotan primero en un diario local append-only (JSONL con
+fsync) y se responde de inmediato; un hilo en segundo plano las escribe en el
+repositorio de metadatos por lotes, cuando se junta ``batch_size`` o pasa
+``flush_interval``. Los fallos se reintentan con espera exponencial y, tras
+una caída del proceso, las entradas sin confirmar se vuelven a enviar al
+iniciar (omitiendo las que ya estaban registradas). Al eliminar una evidencia
+que aún no llega al repositorio, ``cancel`` la descarta del diario para que el
+hilo no la vuelva a escribir después de borrada.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class RegistrationJournal:
+    """Cola durable de evidencias pendientes de registrar"""
+
+    def __init__(self,
+                 path,
+                 store,
+                 batch_size=50,
+                 flush_interval=2.0,
+                 max_retry_delay=60.0,
+                 on_flush=None):
+        self.path = path
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.on_flush = on_flush
+        self.last_error = None
+        self._pending = {}  # id -> evidencia, en orden de llegada
+        self._condition = threading.Condition()
+        self._file_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+
+        self._replay()
+        self._thread = threading.Thread(target=self._run,
+                                        name="registro-diferido",
+                                        daemon=True)
+        self._thread.start()
+
+    def _replay(self):
+        """Recupera las entradas no confirmadas del diario"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Línea incompleta por una caída
+                if entry.get("op") == "add":
+                    self._pending[entry["id"]] = entry["evidencia"]
+                elif entry.get("op") in ("done", "cancel"):
+                    for entry_id in entry["ids"]:
+                        self._pending.pop(entry_id, None)
+
+        if self._pending:
+            # La caída pudo ocurrir después de escribir en el repositorio y
+            # antes de confirmar en el diario: no registrar dos veces
+            try:
+                existing = self.store.get_evidencias(
+                    columns=['url_cloudinary'])
+            except Exception:
+                existing = None
+            if existing is not None and 'url_cloudinary' in existing.columns:
+                registered = set(existing['url_cloudinary'].astype(str))
+                done = [
+                    entry_id for entry_id, evidencia in self._pending.items()
+                    if evidencia.get('url_cloudinary') in registered
+                ]
+                for entry_id in done:
+                    del self._pending[entry_id]
+        self._rewrite()
+
+    def _append(self, entries):
+        """Agrega entradas al diario y las persiste (con _file_lock tomado)"""
+        with open(self.path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self):
+        """Compacta el diario dejando solo las entradas pendientes"""
+        temp_path = self.path + ".tmp"
+        # El lock del archivo evita perder una entrada anotada entre la
+        # lectura de los pendientes y el reemplazo del diario
+        with self._file_lock:
+            with self._condition:
+                pending = list(self._pending.items())
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for entry_id, evidencia in pending:
+                    f.write(
+                        json.dumps({
+                            "op": "add",
+                            "id": entry_id,
+                            "evidencia": evidencia
+                        },
+                                   ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+
+    def submit(self, evidencia):
+        """Anota la evidencia en el diario y retorna su identificador"""
+        entry_id = uuid.uuid4().hex
+        with self._file_lock:
+            self._append([{
+                "op": "add",
+                "id": entry_id,
+                "evidencia": evidencia
+            }])
+            with self._condition:
+                self._pending[entry_id] = evidencia
+                if len(self._pending) >= self.batch_size:
+                    self._condition.notify()
+        return entry_id
+
+    def cancel(self, url):
+        """Descarta las evidencias pendientes con la URL indicada y retorna cuántas eran.
+
+        Espera el lote en curso: al retornar, cada evidencia con esa URL o ya
+        está en el repositorio o no llegará a él.
+        """
+        with self._flush_lock:
+            with self._file_lock:
+                with self._condition:
+                    ids = [
+                        entry_id
+                        for entry_id, evidencia in self._pending.items()
+                        if evidencia.get('url_cloudinary') == url
+                    ]
+                if not ids:
+                    return 0
+                self._append([{"op": "cancel", "ids": ids}])
+                with self._condition:
+                    for entry_id in ids:
+                        self._pending.pop(entry_id, None)
+        return len(ids)
+
+    def pending(self):
+        """Retorna las evidencias que aún no llegan al repositorio"""
+        with self._condition:
+            return list(self._pending.values())
+
+    def flush(self):
+        """Escribe en el repositorio las evidencias pendientes (un lote por llamada)"""
+        with self._flush_lock:
+            with self._condition:
+                batch = list(self._pending.items())[:self.batch_size]
+            if not batch:
+                return 0
+
+            self.store.add_evidencias([evidencia for _, evidencia in batch])
+            with self._file_lock:
+                self._append([{
+                    "op": "done",
+                    "ids": [entry_id for entry_id, _ in batch]
+                }])
+                with self._condition:
+                    for entry_id, _ in batch:
+                        self._pending.pop(entry_id, None)
+                    empty = not self._pending
+            if empty:
+                self._rewrite()
+        if self.on_flush:
+            self.on_flush()
+        return len(batch)
+
+    def _run(self):
+        retry_delay = None  # Espera tras un fallo; None si no hay fallos
+        while True:
+            with self._condition:
+                if retry_delay:
+                    # Tras un fallo se espera el plazo completo aunque lleguen
+                    # nuevas evidencias
+                    deadline = time.monotonic() + retry_delay
+                    while not self._stopped and time.monotonic() < deadline:
+                        self._condition.wait(deadline - time.monotonic())
+                elif not self._stopped and len(
+                        self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                # Al detenerse tras un fallo, lo pendiente queda en el diario
+                if self._stopped and (retry_delay or not self._pending):
+                    return
+            try:
+                while self.flush() >= self.batch_size:
+                    pass
+                self.last_error = None
+                retry_delay = None
+            except Exception as e:
+                # Repositorio lento o con límite de cuota: reintentar más tarde
+                self.last_error = str(e)
+                retry_delay = min((retry_delay or self.flush_interval) * 2,
+                                  self.max_retry_delay)
+
+    def close(self, timeout=10.0):
+        """Intenta vaciar la cola y detiene el hilo"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout)